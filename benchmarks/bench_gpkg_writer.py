@@ -0,0 +1,67 @@
+"""
+Confronto tra la scrittura GeoPackage tramite pyogrio (GDAL) e il writer nativo sqlite3.
+
+I layer vengono parsati e uniti una sola volta; per ogni motore si misura il solo
+tempo di scrittura, la dimensione del file e si verifica che GDAL rilegga lo stesso
+numero di feature.
+
+    python benchmarks/bench_gpkg_writer.py --fogli 50
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import pyogrio
+
+sys.path.insert(0, os.path.dirname(__file__))
+from synthetic import write_dataset  # noqa: E402
+
+from cxf2gis.core import CXFProject  # noqa: E402
+from cxf2gis.exporters.geopackage.base import GPKGExporter  # noqa: E402
+
+CONFIGURATIONS = [
+    ("pyogrio", {"engine": "pyogrio"}),
+    ("native", {"engine": "native"}),
+    ("native senza rtree", {"engine": "native", "spatial_index": False}),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fogli", type=int, default=10, help="Number of synthetic sheets")
+    parser.add_argument("--target-epsg", default="EPSG:6875")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        write_dataset(os.path.join(tmp, "cxf"), n_fogli=args.fogli)
+        project = CXFProject(args.target_epsg)
+        project.add_directory(os.path.join(tmp, "cxf"), "EPSG:3003")
+        project.parse()
+        layers = list(GPKGExporter(os.path.join(tmp, "unused.gpkg"))._merge_sources(project.sources, args.target_epsg))
+        n_features = sum(len(gdf) for _, gdf in layers)
+        print(f"{len(layers)} layer, {n_features} feature\n")
+
+        print(f"{'motore':<22}{'scrittura (s)':>15}{'feature/s':>12}{'file (KB)':>12}{'rilette':>10}")
+        for label, options in CONFIGURATIONS:
+            output = os.path.join(tmp, f"out_{label.replace(' ', '_')}.gpkg")
+            exporter = GPKGExporter(output, **options)
+
+            start = time.perf_counter()
+            for table_name, gdf in layers:
+                exporter.write_layer(table_name, gdf)
+            elapsed = time.perf_counter() - start
+
+            read_back = sum(
+                pyogrio.read_info(output, layer=table_name, force_feature_count=True)["features"]
+                for table_name, _ in layers
+            )
+            print(
+                f"{label:<22}{elapsed:>15.3f}{n_features / elapsed:>12.0f}"
+                f"{os.path.getsize(output) / 1024:>12.0f}{read_back:>10}"
+            )
+
+
+if __name__ == "__main__":
+    main()
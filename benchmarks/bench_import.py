@@ -0,0 +1,50 @@
+"""
+Tempo di avvio: import dei moduli principali e help della CLI, ciascuno in un
+interprete nuovo (miglior tempo su più ripetizioni). Per ogni voce elenca anche
+quali dipendenze pesanti risultano caricate.
+
+    python benchmarks/bench_import.py --repeat 5
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+HEAVY_MODULES = ["numpy", "pandas", "geopandas", "shapely", "pyproj", "sqlalchemy", "sqlmodel", "requests"]
+
+TARGETS = [
+    ("import cxf2gis", "import cxf2gis"),
+    ("import cxf2gis.cli", "import cxf2gis.cli"),
+    ("cxf2gis -h", "import sys; sys.argv = ['cxf2gis', '-h']\nfrom cxf2gis.cli import main\ntry:\n    main()\nexcept SystemExit:\n    pass"),
+    ("import cxf2gis.core", "import cxf2gis.core"),
+]
+
+REPORT = "\nimport sys, json\nprint(json.dumps([m for m in {modules!r} if m in sys.modules]))"
+
+
+def run(code):
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-c", code + REPORT.format(modules=HEAVY_MODULES)],
+        capture_output=True, text=True, check=True
+    )
+    elapsed = time.perf_counter() - start
+    return elapsed, json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per target (the best one is reported)")
+    args = parser.parse_args()
+
+    baseline, _ = min(run("pass") for _ in range(args.repeat))
+    print(f"interprete vuoto: {baseline * 1000:.0f} ms\n")
+    print(f"{'comando':<24}{'tempo (ms)':>12}{'netto (ms)':>12}  dipendenze pesanti caricate")
+    for label, code in TARGETS:
+        elapsed, loaded = min(run(code) for _ in range(args.repeat))
+        print(f"{label:<24}{elapsed * 1000:>12.0f}{(elapsed - baseline) * 1000:>12.0f}  {', '.join(loaded) or '-'}")
+
+
+if __name__ == "__main__":
+    main()
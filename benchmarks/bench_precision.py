@@ -0,0 +1,70 @@
+"""
+Effetto della riduzione di precisione delle coordinate sull'export GeoPackage.
+
+Per ogni configurazione misura il tempo di merge + scrittura, la dimensione del
+file e la dimensione dopo compressione gzip (indicativa di quanto guadagnano
+storage compressi come il TOAST di PostgreSQL o gli archivi di distribuzione).
+
+    python benchmarks/bench_precision.py --fogli 20
+"""
+import argparse
+import gzip
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import shapely
+
+sys.path.insert(0, os.path.dirname(__file__))
+from synthetic import write_dataset  # noqa: E402
+
+from cxf2gis.core import CXFProject  # noqa: E402
+from cxf2gis.exporters.geopackage.base import GPKGExporter  # noqa: E402
+
+CONFIGURATIONS = [
+    ("full float64", {}),
+    ("1 cm", {"precision": 0.01}),
+    ("1 cm + repeated points", {"precision": 0.01, "drop_repeated_points": True}),
+]
+
+
+def gzip_size(path):
+    with open(path, "rb") as f:
+        return len(gzip.compress(f.read(), compresslevel=6))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fogli", type=int, default=10, help="Number of synthetic sheets")
+    parser.add_argument("--target-epsg", default="EPSG:6875")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        write_dataset(os.path.join(tmp, "cxf"), n_fogli=args.fogli)
+
+        print(f"{'configurazione':<26}{'scrittura (s)':>15}{'file (KB)':>12}{'gzip (KB)':>12}{'vertici':>12}")
+        for label, options in CONFIGURATIONS:
+            project = CXFProject(args.target_epsg)
+            project.add_directory(os.path.join(tmp, "cxf"), "EPSG:3003")
+            project.parse()
+
+            output = os.path.join(tmp, f"out_{len(os.listdir(tmp))}.gpkg")
+            exporter = GPKGExporter(output).configure(**options)
+
+            start = time.perf_counter()
+            vertices = 0
+            for table_name, gdf in exporter._merge_sources(project.sources, args.target_epsg):
+                vertices += int(shapely.count_coordinates(np.asarray(gdf.geometry.values)))
+                exporter.write_layer(table_name, gdf)
+            elapsed = time.perf_counter() - start
+
+            print(
+                f"{label:<26}{elapsed:>15.3f}{os.path.getsize(output) / 1024:>12.0f}"
+                f"{gzip_size(output) / 1024:>12.0f}{vertices:>12}"
+            )
+
+
+if __name__ == "__main__":
+    main()
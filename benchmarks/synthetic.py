@@ -0,0 +1,63 @@
+"""
+Generatore di file CXF/SUP sintetici per i benchmark.
+
+Ogni foglio è una griglia di particelle con bordi irregolari (vertici intermedi
+con coordinate al millimetro) e alcuni vertici consecutivi ripetuti, come
+capita nelle consegne reali; per ogni particella viene scritto anche il TESTO.
+"""
+import math
+import os
+import random
+
+
+def _ring(x, y, step, vertices_per_side, rng):
+    corners = [(x, y), (x + step, y), (x + step, y + step), (x, y + step)]
+    ring = []
+    for (x0, y0), (x1, y1) in zip(corners, corners[1:] + corners[:1]):
+        for k in range(vertices_per_side):
+            t = k / vertices_per_side
+            # Piccola deformazione perpendicolare, nulla sugli spigoli per non creare sovrapposizioni
+            wobble = math.sin(t * math.pi) * rng.uniform(-0.2, 0.2)
+            px = x0 + (x1 - x0) * t + (0 if x0 != x1 else wobble)
+            py = y0 + (y1 - y0) * t + (0 if y0 != y1 else wobble)
+            ring.append((round(px, 3), round(py, 3)))
+            if rng.random() < 0.05:
+                ring.append(ring[-1])  # Vertice ripetuto
+    ring.append(ring[0])
+    return ring
+
+
+def write_foglio(path, nx=20, ny=20, x0=1500000.0, y0=5000000.0, step=50.0, vertices_per_side=10, seed=0):
+    """Scrive un file CXF (e il relativo SUP) con nx * ny particelle."""
+    rng = random.Random(seed)
+    out = []
+    for i in range(nx):
+        for j in range(ny):
+            x, y = x0 + i * step, y0 + j * step
+            codice = str(i * ny + j + 1)
+            ring = _ring(x, y, step, vertices_per_side, rng)
+            out += ["BORDO", codice, "1", "0", f"{x + step / 2:.3f}", f"{y + step / 2:.3f}", "0", "0", "0", str(len(ring))]
+            for px, py in ring:
+                out += [f"{px:.3f}", f"{py:.3f}"]
+            out += ["TESTO", codice, "1", "0", f"{x + step / 2:.3f}", f"{y + step / 2:.3f}", "0", "0"]
+    out += ["LINEA", "1", "2", f"{x0:.3f}", f"{y0:.3f}", f"{x0 + nx * step:.3f}", f"{y0:.3f}"]
+    out += ["EOF"]
+
+    with open(path, "w", encoding="latin-1") as f:
+        f.write("\n".join(out) + "\n")
+    with open(os.path.splitext(path)[0] + ".SUP", "w", encoding="latin-1") as f:
+        for k in range(1, nx * ny + 1):
+            f.write(f"{k} {step * step:.0f}\n")
+
+
+def write_dataset(folder, n_fogli=10, comune="C660", **kwargs):
+    """Scrive n_fogli fogli affiancati in `folder` e ne restituisce i percorsi."""
+    os.makedirs(folder, exist_ok=True)
+    nx = kwargs.get("nx", 20)
+    step = kwargs.get("step", 50.0)
+    paths = []
+    for n in range(1, n_fogli + 1):
+        path = os.path.join(folder, f"{comune}A{n:04d}00.cxf")
+        write_foglio(path, x0=1500000.0 + (n - 1) * nx * step, seed=n, **kwargs)
+        paths.append(path)
+    return paths
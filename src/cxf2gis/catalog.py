@@ -0,0 +1,50 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+
+# Nome del layer catalogo: una riga per file CXF esportato
+CATALOG_LAYER = 'fogli'
+
+# Colonne indicizzate del catalogo (oltre all'indice spaziale)
+CATALOG_INDEX = ['comune', 'foglio']
+
+
+def summarize_layers(meta, file_path, layers, crs, parse_time):
+    """
+    Riepilogo di un foglio pronto per la scrittura: chiave catastale, numero di feature
+    per layer, somma di area grafica e nominale delle particelle, CRS di origine, tempo
+    di parsing ed envelope di tutte le geometrie (nel CRS di origine).
+    Usa solo grandezze già disponibili sui layer (len, total_bounds, somme di colonna).
+    """
+    summary = {key: meta[key] for key in ('comune', 'sezione', 'foglio', 'allegato')}
+    summary['file_nome'] = Path(file_path).name
+    for layer_name, gdf in layers.items():
+        summary[f"n_{layer_name.lower()}"] = 0 if gdf is None else len(gdf)
+
+    bordo = layers.get('BORDO')
+    summary['area_grafica'] = 0.0 if bordo is None else float(bordo['area_grafica'].sum())
+    summary['area_nominale'] = 0.0 if bordo is None else float(bordo['area_nominale'].sum())
+    summary['crs_origine'] = str(crs)
+    summary['tempo_parsing'] = round(parse_time, 3)
+
+    bounds = np.array([gdf.total_bounds for gdf in layers.values() if gdf is not None and not gdf.empty])
+    summary['geometry'] = shapely.box(
+        bounds[:, 0].min(), bounds[:, 1].min(), bounds[:, 2].max(), bounds[:, 3].max()
+    ) if len(bounds) else None
+    return summary
+
+
+def catalog_layer(summaries, target_epsg):
+    """
+    Layer catalogo dai riepiloghi delle sorgenti: le righe sono raggruppate per CRS
+    di origine e riproiettate in blocco (un'operazione per CRS, non per foglio).
+    """
+    frame = pd.DataFrame(summaries)
+    parts = [
+        gpd.GeoDataFrame(group, geometry='geometry', crs=crs).to_crs(target_epsg)
+        for crs, group in frame.groupby('crs_origine', sort=False)
+    ]
+    return pd.concat(parts).loc[frame.index].reset_index(drop=True)
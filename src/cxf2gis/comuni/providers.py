@@ -1,4 +1,4 @@
-import requests, json
+import json
 
 class ComuneProvider:
     def fetch(self):
@@ -8,6 +8,8 @@ class ContriniProvider(ComuneProvider):
     URL = "https://raw.githubusercontent.com/matteocontrini/comuni-json/refs/heads/master/comuni.json"
     
     def fetch(self):
+        import requests  # Importato solo al download, non all'avvio
+
         response = requests.get(self.URL)
         response.raise_for_status()
         return response.json()
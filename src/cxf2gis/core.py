@@ -1,10 +1,20 @@
 from pathlib import Path
 import asyncio
+from collections import Counter
 from concurrent.futures import ProcessPoolExecutor
-from .models import CXFSource
-from .exporters.base import BaseExporter
+from .models import CXFSource, parse_layers
+from .discovery import discover, in_shard
+from .validation import validate_layers
+from .dedup import find_duplicates
+from .diff import diff_layers, empty_layer
+from .journal import RunJournal
+from .scheduler import MemoryScheduler
+import pandas as pd
+from .exporters.base import BaseExporter, merge_layers
+from .index import CXFIndex
+from .features import iter_features
 from .exporters.projtools.prgcloud import ProjDictLike
-from typing import Union
+from typing import Tuple, Union
 
 class CXFProject:
     def __init__(self, target_epsg):
@@ -14,41 +24,150 @@ class CXFProject:
         """
         self.target_epsg = target_epsg
         self.sources = []
+        self._index = None
+        # Statistiche cumulative dell'esecuzione (geometrie riparate, ecc.)
+        self.stats = Counter()
 
-    def add_source(self, file_path: str, input_crs: Union[str, ProjDictLike], extra_info: bool=False):
+    def add_source(self, file_path: str, input_crs: Union[str, ProjDictLike], extra_info: bool=False, sup_path: str=None):
         """
         Aggiunge un file richiedendo obbligatoriamente il CRS.
         input_crs può essere un codice EPSG o una stringa Proj4 per i sistemi Cassini.
+        Un ProjDictLike (es. PRGCloud) viene interrogato solo al parsing del file.
         """
         if not input_crs:
             raise ValueError(f"Dichiarazione CRS obbligatoria per: {file_path}")
-        elif isinstance(input_crs, ProjDictLike):
-            crs = input_crs[Path(file_path).stem]['proj4']
-        else:
-            crs = input_crs
-        
+
         # L'istanza riceve sia il CRS sorgente che quello di destinazione
-        source = CXFSource(file_path, crs, extra_info=extra_info)
+        source = CXFSource(file_path, input_crs, extra_info=extra_info, sup_path=sup_path)
         self.sources.append(source)
+        self._index = None  # L'indice non è più allineato alle sorgenti
 
-    def add_directory(self, folder_path: Path, input_crs: Union[str, ProjDictLike], recursive=False, extra_info=False):
+    def add_directory(self, folder_path: Path, input_crs: Union[str, ProjDictLike], recursive=False, extra_info=False,
+                      max_workers: int = 16, shard: Tuple[int, int] = None):
         """
-        Carica tutti i file .cxf da un percorso con CRS dichiarato.
+        Carica tutti i file .cxf (anche .CXF) da un percorso con CRS dichiarato.
+        La scansione è parallela e le consegne identiche byte per byte vengono scartate.
+        Con shard=(i, n) vengono caricati solo i comuni assegnati allo shard i di n
+        (ripartizione deterministica per comune, vedi discovery.shard_of).
         """
-        p = Path(folder_path)
-        pattern = "**/*.cxf" if recursive else "*.cxf"
-        
-        for file in p.glob(pattern):
-            self.add_source(str(file), input_crs, extra_info=extra_info)
+        if not input_crs:
+            raise ValueError(f"Dichiarazione CRS obbligatoria per: {folder_path}")
+
+        for descriptor in discover(folder_path, recursive=recursive, max_workers=max_workers):
+            if descriptor.duplicate_of:
+                self.stats['file_duplicati'] += 1
+                continue
+            if shard is not None and not in_shard(descriptor, *shard):
+                continue
+            self.add_source(descriptor.path, input_crs, extra_info=extra_info, sup_path=descriptor.sup_path)
+
+        if self.stats['file_duplicati']:
+            print(f"Ignorati {self.stats['file_duplicati']} file CXF identici a consegne già presenti.")
 
     add_sources = add_directory  # Alias per compatibilità
 
     async def load_all(self, max_workers: int = 4):
         """Gestione asincrona del parsing parallelo."""
+        sources = [s for s in self.sources if not s.parsed]
+        for source in sources:
+            source._resolve_crs()
         loop = asyncio.get_running_loop()
         with ProcessPoolExecutor(max_workers=max_workers) as pool:
-            tasks = [loop.run_in_executor(pool, s.parse) for s in self.sources]
-            await asyncio.gather(*tasks)
+            tasks = [loop.run_in_executor(pool, parse_layers, s) for s in sources]
+            # I layer parsati nei worker vanno riportati sulle sorgenti del progetto
+            for source, (layers, parse_time) in zip(sources, await asyncio.gather(*tasks)):
+                source.set_parse_result(layers, parse_time)
+        self._index = None
+
+    def parse(self, sources=None, max_workers: int = None):
+        """
+        Esegue il parsing delle sorgenti indicate (default: tutte) non ancora parsate.
+        Con max_workers > 1 il parsing avviene in un pool di processi.
+        """
+        sources = [s for s in (self.sources if sources is None else sources) if not s.parsed]
+        if max_workers and max_workers > 1 and len(sources) > 1:
+            # Il CRS (eventualmente da PRGCloud) si risolve qui: ai worker arriva già come stringa
+            for source in sources:
+                source._resolve_crs()
+            with ProcessPoolExecutor(max_workers=min(max_workers, len(sources))) as pool:
+                for source, (layers, parse_time) in zip(sources, pool.map(parse_layers, sources)):
+                    source.set_parse_result(layers, parse_time)
+        else:
+            for source in sources:
+                source.parse()
+        self._index = None
+
+    def _parsed(self, sources):
+        return [s for s in (self.sources if sources is None else sources) if s.parsed]
+
+    def validate_geometries(self, max_workers: int = 4, sources=None):
+        """
+        Verifica e ripara le geometrie delle sorgenti parsate (default: tutte), in parallelo tra sorgenti.
+        Ai processi worker vengono inviati solo i layer; il risultato viene riassegnato alle sorgenti.
+        """
+        sources = self._parsed(sources)
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            results = pool.map(validate_layers, [s.layers for s in sources])
+            for source, (layers, report, stats) in zip(sources, results):
+                source.set_validation_result(layers, report, stats)
+                self.stats.update(stats)
+        self._index = None
+        return self.stats
+
+    def associate_labels(self, sources=None):
+        """
+        Scrive su TESTO e SIMBOLO la particella che li contiene e sul BORDO il numero
+        di testi e simboli, per ciascuna sorgente parsata (default: tutte).
+        """
+        for source in self._parsed(sources):
+            self.stats.update(source.associate_labels())
+        self._index = None
+        return self.stats
+
+    def deduplicate(self, rule: str = 'first', min_overlap: float = 0.5, sources=None):
+        """
+        Rimuove dal layer BORDO le particelle presenti in più sorgenti (fogli e allegati
+        sovrapposti), conservandone una secondo `rule` (vedi dedup.DEDUP_RULES).
+        Il confronto avviene nel CRS del progetto, la rimozione sulle singole sorgenti.
+        """
+        sources = [s for s in self._parsed(sources) if s.layers.get('BORDO') is not None]
+        parts = []
+        for i, source in enumerate(sources):
+            gdf = source.layers['BORDO']
+            if gdf.crs != self.target_epsg:
+                gdf = gdf.to_crs(self.target_epsg)
+            parts.append(gdf.assign(_sorgente=i, _riga=gdf.index))
+        if not parts:
+            return 0
+
+        merged = pd.concat(parts, ignore_index=True)
+        drop = find_duplicates(merged, '_sorgente', rule=rule, min_overlap=min_overlap)
+
+        dropped = merged.loc[drop, ['_sorgente', '_riga']]
+        for i, rows in dropped.groupby('_sorgente')['_riga']:
+            source = sources[i]
+            source.layers['BORDO'] = source.layers['BORDO'].drop(index=rows.to_numpy())
+
+        self.stats['particelle_duplicate'] += int(drop.sum())
+        self._index = None
+        return int(drop.sum())
+
+    def diff(self, previous: "CXFProject", precision: float = None):
+        """
+        Confronta il layer BORDO del progetto con quello di una consegna precedente,
+        entrambi nel CRS del progetto (vedi diff.diff_layers).
+        Le sorgenti non ancora parsate di entrambi i progetti vengono parsate qui.
+        :return: (layers, stats) con i soli layer delle particelle variate.
+        """
+        bordo = []
+        for project in (previous, self):
+            project.parse()
+            # Solo il BORDO viene unito e riproiettato: gli altri layer non servono al confronto
+            layers = dict(merge_layers(project._parsed(None), self.target_epsg, layers=['bordo']))
+            bordo.append(layers.get('bordo', empty_layer(self.target_epsg)))
+        layers, stats = diff_layers(*bordo, precision=precision)
+        self.stats.update(stats)
+        return layers, stats
 
     def __iter__(self):
         """Permette di ciclare direttamente sulle sorgenti del progetto: for src in project:"""
@@ -57,6 +176,101 @@ class CXFProject:
             if source.layers:
                 yield source
 
-    def export(self, exporter: BaseExporter, target_epsg: str):
-        """L'esportatore ora riceve l'intero progetto (self)"""
-        exporter.export(self, target_epsg)
\ No newline at end of file
+    def iter_features(self, layers=None, target_crs=None, batch_size: int = 10_000):
+        """
+        Iterazione in streaming delle feature del progetto: ogni file viene letto solo
+        quando serve e le feature arrivano in lotti di FeatureRecord (chiave + WKB),
+        senza GeoDataFrame (vedi features.iter_features).
+        Di default le geometrie sono nel CRS del progetto.
+        """
+        yield from iter_features(
+            self.sources, layers=layers, target_crs=target_crs or self.target_epsg, batch_size=batch_size
+        )
+
+    def export(self, exporter: BaseExporter, target_epsg: str, journal: RunJournal = None,
+               batch_size: int = None, prepare=None, scheduler: MemoryScheduler = None):
+        """
+        L'esportatore ora riceve l'intero progetto (self).
+
+        Con journal, batch_size o scheduler l'esportazione avviene a lotti: ogni lotto
+        viene preparato (prepare(sources): parsing e stadi opzionali), scritto, registrato
+        nel giornale e rilasciato dalla memoria. Con scheduler (MemoryScheduler) i lotti
+        sono composti secondo il limite di memoria anziché per numero di sorgenti.
+        Se il giornale contiene già dei progressi l'esecuzione riprende: le sorgenti
+        completate vengono saltate e le scritture dei lotti interrotti annullate
+        tramite l'esportatore (o completate, se l'esportatore ne conferma il commit).
+        """
+        if journal is None and batch_size is None and scheduler is None:
+            if prepare is not None:
+                prepare(self.sources)
+            exporter.export(self, target_epsg)
+            return
+
+        resume = journal is not None and journal.has_progress()
+        exporter.begin(self, target_epsg, resume=resume)
+
+        done = set()
+        if resume:
+            for batch_id, state in journal.incomplete_batches():
+                if exporter.committed(state):
+                    journal.complete_batch(batch_id, journal.batch_sources(batch_id))
+                    continue
+                exporter.rollback(state)
+                journal.discard_batch(batch_id)
+            done = journal.completed_sources()
+            print(f"Ripresa esecuzione: {len(done)} sorgenti già completate.")
+
+        pending = [s for s in self.sources if str(s.file_path) not in done]
+        if scheduler is not None:
+            batches = scheduler.batches(pending)
+        else:
+            size = batch_size or len(pending) or 1
+            batches = (pending[start:start + size] for start in range(0, len(pending), size))
+
+        completed = 0
+        for batch in batches:
+            batch_id = journal.start_batch(exporter.checkpoint(), [s.file_path for s in batch]) if journal else None
+
+            if prepare is not None:
+                prepare(batch)
+            else:
+                self.parse(batch)
+            if scheduler is not None:
+                scheduler.calibrate(batch)
+            exporter.write_batch(batch, target_epsg)
+
+            if journal:
+                journal.complete_batch(batch_id, [s.file_path for s in batch])
+            for source in batch:
+                source.release()
+            completed += len(batch)
+            print(f"Lotto completato: {completed}/{len(pending)} sorgenti")
+
+        exporter.finish(self)
+        self._index = None
+
+    @property
+    def index(self):
+        """
+        Indice chiave/spaziale sui layer parsati, riproiettati nel CRS del progetto.
+        Le sorgenti non ancora parsate sono escluse. Viene costruito alla prima
+        interrogazione; usare reset_index() dopo un nuovo parsing.
+        """
+        if self._index is None:
+            self._index = CXFIndex(dict(merge_layers(self._parsed(None), self.target_epsg)))
+        return self._index
+
+    def reset_index(self):
+        self._index = None
+
+    def find_parcel(self, comune, foglio, codice, sezione=None, allegato=None):
+        """Cerca una particella per chiave catastale (vedi CXFIndex.find)."""
+        return self.index.find(comune, foglio, codice, sezione=sezione, allegato=allegato)
+
+    def parcels_at(self, points, layer='bordo'):
+        """Point-in-parcel vettoriale; le coordinate sono nel CRS del progetto (vedi CXFIndex.at_points)."""
+        return self.index.at_points(points, layer=layer)
+
+    def query_bbox(self, bbox, layer='bordo', predicate='intersects'):
+        """Interrogazione per uno o più bbox nel CRS del progetto (vedi CXFIndex.in_bbox)."""
+        return self.index.in_bbox(bbox, layer=layer, predicate=predicate)
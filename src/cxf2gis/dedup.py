@@ -0,0 +1,100 @@
+import numpy as np
+import pandas as pd
+import shapely
+from shapely import STRtree
+
+# Chiave con cui una stessa particella compare in fogli e allegati diversi
+DEDUP_KEY = ['comune', 'foglio', 'codice']
+
+# Regole di scelta della particella da conservare in un gruppo di duplicati:
+# - first:   la prima sorgente nell'ordine del progetto
+# - last:    l'ultima sorgente nell'ordine del progetto (es. la consegna più recente)
+# - largest: la geometria con area maggiore
+DEDUP_RULES = ('first', 'last', 'largest')
+
+
+def _connected_components(n, left, right):
+    """
+    Etichetta le componenti connesse del grafo (left[k], right[k]) propagando
+    il minimo indice di ciascun gruppo; converge in poche iterazioni.
+    """
+    labels = np.arange(n)
+    while True:
+        pair_min = np.minimum(labels[left], labels[right])
+        new_labels = labels.copy()
+        np.minimum.at(new_labels, left, pair_min)
+        np.minimum.at(new_labels, right, pair_min)
+        # Compressione dei percorsi: ogni nodo punta direttamente al rappresentante
+        new_labels = new_labels[new_labels]
+        if np.array_equal(new_labels, labels):
+            return labels
+        labels = new_labels
+
+
+def find_duplicates(gdf, source_column, rule='first', min_overlap=0.5):
+    """
+    Individua le particelle duplicate tra sorgenti diverse.
+
+    Due feature sono duplicate se condividono la chiave (comune, foglio, codice),
+    provengono da sorgenti diverse e la loro intersezione copre almeno `min_overlap`
+    dell'area della più piccola. Le coppie candidate sono estratte con un'unica
+    interrogazione STRtree sull'intero layer.
+
+    :param gdf: Layer BORDO merged (stesso CRS per tutte le righe).
+    :param source_column: Colonna che identifica la sorgente di provenienza.
+    :return: Array booleano delle righe da scartare.
+    """
+    if rule not in DEDUP_RULES:
+        raise ValueError(f"Regola di deduplicazione non valida: '{rule}' (ammesse: {', '.join(DEDUP_RULES)})")
+
+    n = len(gdf)
+    drop = np.zeros(n, dtype=bool)
+    if n < 2:
+        return drop
+
+    geoms = np.asarray(gdf.geometry.values)
+    left, right = STRtree(geoms).query(geoms, predicate='intersects')
+
+    # Filtri vettoriali sulle coppie candidate: ordine, chiave, sorgente
+    key_codes = pd.MultiIndex.from_frame(gdf[DEDUP_KEY].astype(str)).factorize()[0]
+    sources = gdf[source_column].to_numpy()
+    mask = (left < right) & (key_codes[left] == key_codes[right]) & (sources[left] != sources[right])
+    left, right = left[mask], right[mask]
+    if not len(left):
+        return drop
+
+    # Sovrapposizione effettiva, calcolata solo sulle coppie rimaste
+    candidates = np.unique(np.concatenate([left, right]))
+    fixed = geoms.copy()
+    fixed[candidates] = shapely.make_valid(geoms[candidates])
+    areas = shapely.area(fixed)
+    inter = shapely.area(shapely.intersection(fixed[left], fixed[right]))
+    min_area = np.minimum(areas[left], areas[right])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        overlap = np.where(min_area > 0, inter / min_area, 0.0)
+    mask = overlap >= min_overlap
+    left, right = left[mask], right[mask]
+    if not len(left):
+        return drop
+
+    labels = _connected_components(n, left, right)
+    in_group = np.zeros(n, dtype=bool)
+    in_group[left] = in_group[right] = True
+
+    # Ordinamento secondo la regola: la prima riga di ogni gruppo è quella da conservare
+    groups = pd.DataFrame({
+        'gruppo': labels[in_group],
+        'sorgente': sources[in_group],
+        'area': areas[in_group],
+        'riga': np.flatnonzero(in_group),
+    })
+    if rule == 'first':
+        groups = groups.sort_values(['gruppo', 'sorgente', 'riga'])
+    elif rule == 'last':
+        groups = groups.sort_values(['gruppo', 'sorgente', 'riga'], ascending=[True, False, True])
+    else:
+        groups = groups.sort_values(['gruppo', 'area', 'riga'], ascending=[True, False, True])
+
+    duplicated = groups['gruppo'].duplicated().to_numpy()
+    drop[groups['riga'].to_numpy()[duplicated]] = True
+    return drop
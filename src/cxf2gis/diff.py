@@ -0,0 +1,111 @@
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+
+# Chiave con cui una particella viene riconosciuta tra due consegne
+DIFF_KEY = ['comune', 'sezione', 'foglio', 'allegato', 'codice']
+
+# Colonne derivate dalla geometria: le loro variazioni sono già coperte dal confronto geometrico
+DERIVED_COLUMNS = ['area_grafica']
+
+# Layer prodotti dal confronto, per tipo di variazione
+DELTA_LAYERS = {
+    'aggiunte': 'bordo_aggiunte',
+    'rimosse': 'bordo_rimosse',
+    'geometria': 'bordo_geometria_modificata',
+    'attributi': 'bordo_attributi_modificati',
+}
+
+
+def geometry_hashes(geoms, precision=None):
+    """
+    Hash (uint64) del WKB normalizzato di ciascuna geometria: l'ordine dei vertici
+    e degli anelli e la dimensione Z non influiscono sul confronto.
+    Con precision le coordinate vengono prima arrotondate alla griglia indicata.
+    """
+    geoms = np.asarray(geoms)
+    if precision:
+        geoms = shapely.set_precision(geoms, precision, mode='pointwise')
+    wkbs = shapely.to_wkb(shapely.normalize(geoms), output_dimension=2)
+    return pd.util.hash_array(wkbs)
+
+
+def _key_frame(gdf, row_column):
+    """Chiave di allineamento: DIFF_KEY più il numero d'ordine tra le righe con la stessa chiave."""
+    keys = gdf[DIFF_KEY].astype(str).reset_index(drop=True)
+    keys['_occorrenza'] = keys.groupby(DIFF_KEY).cumcount()
+    keys[row_column] = np.arange(len(keys))
+    return keys
+
+
+def _changed_columns(old, new, columns):
+    """Per ogni coppia di righe elenca (separate da virgola) le colonne con valori diversi."""
+    names = np.full(len(old), '', dtype=object)
+    for column in columns:
+        a, b = old[column].to_numpy(), new[column].to_numpy()
+        differs = ~((a == b) | (pd.isna(a) & pd.isna(b)))
+        names[differs] += column + ','
+    return pd.Series(names).str.rstrip(',').to_numpy()
+
+
+def diff_layers(old, new, precision=None, ignore=DERIVED_COLUMNS):
+    """
+    Confronta il layer BORDO di due consegne (stesso CRS) e restituisce solo le differenze.
+
+    Le particelle sono allineate per (comune, sezione, foglio, allegato, codice); le
+    chiavi ripetute nella stessa consegna sono accoppiate nell'ordine di comparsa.
+    Geometrie e attributi delle coppie sono confrontati tramite hash vettoriali
+    (WKB normalizzato e hash_pandas_object), senza confronti riga per riga.
+
+    :param ignore: Colonne escluse dal confronto degli attributi.
+    :return: (layers, stats): dizionario {nome_tabella: GeoDataFrame} dei soli layer
+             non vuoti (vedi DELTA_LAYERS) e numero di particelle per tipo di variazione.
+    """
+    old = old.reset_index(drop=True)
+    new = new.reset_index(drop=True)
+    pairs = _key_frame(old, '_riga_old').merge(
+        _key_frame(new, '_riga_new'), on=[*DIFF_KEY, '_occorrenza'], how='outer', indicator=True
+    )
+    added = pairs.loc[pairs['_merge'] == 'right_only', '_riga_new'].astype(np.int64).to_numpy()
+    removed = pairs.loc[pairs['_merge'] == 'left_only', '_riga_old'].astype(np.int64).to_numpy()
+    matched = pairs[pairs['_merge'] == 'both']
+    old_rows = matched['_riga_old'].astype(np.int64).to_numpy()
+    new_rows = matched['_riga_new'].astype(np.int64).to_numpy()
+
+    old_geoms = np.asarray(old.geometry.values)[old_rows]
+    new_geoms = np.asarray(new.geometry.values)[new_rows]
+    geometry_changed = geometry_hashes(old_geoms, precision) != geometry_hashes(new_geoms, precision)
+
+    skip = {*DIFF_KEY, *ignore, old.geometry.name, new.geometry.name}
+    columns = [c for c in old.columns if c in new.columns and c not in skip]
+    old_attributes = old[columns].iloc[old_rows].reset_index(drop=True)
+    new_attributes = new[columns].iloc[new_rows].reset_index(drop=True)
+    attributes_changed = (
+        pd.util.hash_pandas_object(old_attributes, index=False).to_numpy()
+        != pd.util.hash_pandas_object(new_attributes, index=False).to_numpy()
+    )
+
+    layers = {
+        'aggiunte': new.iloc[added],
+        'rimosse': old.iloc[removed],
+        'geometria': new.iloc[new_rows[geometry_changed]].assign(
+            area_precedente=shapely.area(old_geoms[geometry_changed])
+        ),
+        'attributi': new.iloc[new_rows[attributes_changed]].assign(
+            attributi_modificati=_changed_columns(
+                old_attributes[attributes_changed], new_attributes[attributes_changed], columns
+            )
+        ),
+    }
+    stats = {f"particelle_{change}": len(gdf) for change, gdf in layers.items()}
+    layers = {
+        DELTA_LAYERS[change]: gdf.reset_index(drop=True)
+        for change, gdf in layers.items() if not gdf.empty
+    }
+    return layers, stats
+
+
+def empty_layer(crs):
+    """Layer BORDO vuoto, per le consegne che non contengono particelle."""
+    return gpd.GeoDataFrame({column: pd.Series(dtype=str) for column in DIFF_KEY}, geometry=[], crs=crs)
@@ -0,0 +1,147 @@
+import hashlib
+import os
+import zlib
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import NamedTuple, Optional
+
+
+def decripta_nome_file(filename):
+    """ Estrae Comune, Sezione, Foglio e Allegato dal nome standard C660A000100 del file CXF """
+    name = os.path.splitext(os.path.basename(filename))[0].upper()
+    meta = {
+        'comune': name[0:4],
+        'sezione': name[4:5] if len(name) > 4 else '',
+        'foglio': name[5:9] if len(name) >= 9 else '0',
+        'allegato': name[9:11] if len(name) >= 11 else '00',
+        'file_nome': filename
+    }
+    # Pulizia zeri iniziali per il foglio (es: 0001 -> 1)
+    try:
+        meta['foglio'] = str(int(meta['foglio']))
+    except: pass
+
+    return meta
+
+
+class SourceDescriptor(NamedTuple):
+    """Descrittore leggero di un file CXF individuato dalla scansione (nessun file viene aperto)."""
+    path: str
+    size: int
+    sup_path: Optional[str]
+    meta: dict
+    duplicate_of: Optional[str] = None
+
+
+def _scan_directory(path):
+    """
+    Legge una singola directory con os.scandir.
+    Ritorna i descrittori dei file .cxf (senza distinzione maiuscole/minuscole) e le sottodirectory.
+    """
+    cxf_files, sup_files, subdirs = [], {}, []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.path)
+                        continue
+                    if not entry.is_file():
+                        continue
+                except OSError:
+                    continue
+                stem, ext = os.path.splitext(entry.name)
+                ext = ext.lower()
+                if ext == '.cxf':
+                    # DirEntry.stat() riusa i dati della scansione dove il sistema lo consente
+                    cxf_files.append((entry.path, stem, entry.stat().st_size))
+                elif ext == '.sup':
+                    sup_files[stem.lower()] = entry.path
+    except (PermissionError, FileNotFoundError) as error:
+        print(f"Directory non leggibile, ignorata: {path} ({error})")
+
+    descriptors = [
+        SourceDescriptor(
+            path=file_path,
+            size=size,
+            sup_path=sup_files.get(stem.lower()),
+            meta=decripta_nome_file(file_path),
+        )
+        for file_path, stem, size in cxf_files
+    ]
+    return descriptors, subdirs
+
+
+def scan(root, recursive=False, max_workers=16):
+    """
+    Scansione parallela di un albero di directory: ogni directory è un task
+    indipendente, così la latenza dei filesystem di rete (NFS) viene sovrapposta.
+    Il risultato è ordinato per percorso, quindi deterministico.
+    """
+    descriptors = []
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        pending = {pool.submit(_scan_directory, os.fspath(root))}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                found, subdirs = future.result()
+                descriptors.extend(found)
+                if recursive:
+                    pending.update(pool.submit(_scan_directory, d) for d in subdirs)
+    return sorted(descriptors, key=lambda d: d.path)
+
+
+def _file_digest(path, chunk_size=1 << 20):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def mark_duplicates(descriptors, max_workers=8):
+    """
+    Individua le consegne identiche byte per byte.
+    Vengono letti solo i file che condividono la dimensione con almeno un altro file;
+    il primo in ordine di percorso è l'originale, gli altri riportano duplicate_of.
+    """
+    by_size = {}
+    for d in descriptors:
+        by_size.setdefault(d.size, []).append(d)
+    to_hash = [d for group in by_size.values() if len(group) > 1 for d in group]
+    if not to_hash:
+        return list(descriptors)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        digests = dict(zip((d.path for d in to_hash), pool.map(_file_digest, (d.path for d in to_hash))))
+
+    originals, result = {}, []
+    for d in descriptors:
+        digest = digests.get(d.path)
+        if digest is None:
+            result.append(d)
+            continue
+        key = (d.size, digest)
+        if key in originals:
+            result.append(d._replace(duplicate_of=originals[key]))
+        else:
+            originals[key] = d.path
+            result.append(d)
+    return result
+
+
+def shard_of(comune, count):
+    """
+    Shard (0 .. count-1) a cui appartiene un comune. Si usa CRC32 e non hash():
+    il risultato deve essere identico su tutti i nodi e tra esecuzioni diverse.
+    """
+    return zlib.crc32(comune.upper().encode('utf-8')) % count
+
+
+def in_shard(descriptor, index, count):
+    """Vero se il descrittore appartiene allo shard `index` (1 .. count)."""
+    return shard_of(descriptor.meta['comune'], count) == index - 1
+
+
+def discover(root, recursive=False, max_workers=16):
+    """Scansione e individuazione dei duplicati in un'unica chiamata."""
+    return mark_duplicates(scan(root, recursive=recursive, max_workers=max_workers))
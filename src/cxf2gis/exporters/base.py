@@ -1,10 +1,29 @@
 import datetime
 from pathlib import Path
 from sqlalchemy import create_engine, text
+import numpy as np
 import pandas as pd
+import geopandas as gpd
+import shapely
+from ..validation import REPORT_LAYER
+from ..catalog import CATALOG_LAYER, catalog_layer
+from .projtools.parallel import parallel_to_crs
 
 class BaseExporter:
 
+    # Opzioni di post-elaborazione delle geometrie (vedi configure)
+    precision = None               # Griglia di arrotondamento delle coordinate, in unità del CRS di destinazione
+    drop_repeated_points = False   # Rimozione dei vertici consecutivi duplicati
+    reproject_workers = None       # Processi per la riproiezione parallela dei layer merged
+
+    def configure(self, **options):
+        """Imposta le opzioni comuni agli esportatori (es. precision=0.01)."""
+        for name, value in options.items():
+            if not hasattr(BaseExporter, name) or callable(getattr(BaseExporter, name)):
+                raise TypeError(f"Opzione esportatore non valida: '{name}'")
+            setattr(self, name, value)
+        return self
+
     def _get_file_info(self, project):
         file_paths = [Path(src.file_path) for src in project.sources if hasattr(src, 'file_path')]
         if not file_paths:
@@ -15,24 +34,133 @@ class BaseExporter:
         file_names = [p.name for p in file_paths]
         return file_date, file_names
 
-    def export(self, sources, target_epsg):
+    def export(self, project, target_epsg):
+        """Esportazione in un'unica passata di tutte le sorgenti del progetto."""
+        self.begin(project, target_epsg)
+        self.write_batch(project.sources, target_epsg)
+        self.finish(project)
+
+    # --- Interfaccia per le esecuzioni a lotti (vedi CXFProject.export) ---
+
+    def begin(self, project, target_epsg, resume=False):
+        """Prepara l'output. In ripresa (resume=True) l'output esistente va conservato."""
+        raise NotImplementedError
+
+    def write_layer(self, table_name, gdf):
+        """Accoda un layer merged all'output, creando la tabella se necessario."""
+        raise NotImplementedError
+
+    def write_batch(self, sources, target_epsg):
+        """Scrive i layer di un lotto di sorgenti parsate."""
+        for table_name, merged_gdf in self._merge_sources(sources, target_epsg):
+            self.write_layer(table_name, merged_gdf)
+
+    def checkpoint(self):
+        """Stato da registrare nel giornale prima di scrivere un lotto (vedi rollback)."""
+        return None
+
+    def rollback(self, state):
+        """Annulla le scritture di un lotto interrotto, dato lo stato registrato da checkpoint."""
+        pass
+
+    def committed(self, state):
+        """
+        Vero se le scritture del lotto risultano già confermate nell'output, cioè se il
+        processo si è interrotto dopo il commit dei dati ma prima dell'aggiornamento del giornale.
+        """
+        return False
+
+    def finish(self, project):
+        """Operazioni conclusive (metadati) dopo l'ultimo lotto."""
         raise NotImplementedError
     
     # 3. Logica di Merge e Riproiezione (come la tua versione originale)
     def _merge_sources(self, sources, target_epsg):
-        layers_to_merge = {k: [] for k in ['BORDO', 'TESTO', 'SIMBOLO', 'FIDUCIALE', 'LINEA']}
-        for src in sources:
-            for l_name, gdf in src.layers.items():
-                if gdf is not None and not gdf.empty:
-                    if gdf.crs==target_epsg:
-                        gdf_transformed = gdf
-                    else:
-                        gdf_transformed = gdf.to_crs(target_epsg)
-                    layers_to_merge[l_name.upper()].append(gdf_transformed)
-
-        # 4. Scrittura nuovi layer nel nuovo file
-        for l_type, gdfs in layers_to_merge.items():
-            if gdfs:
-                merged_gdf = pd.concat(gdfs, ignore_index=True)
-                table_name = l_type.lower()
-                yield table_name, merged_gdf
\ No newline at end of file
+        yield from merge_layers(
+            sources, target_epsg,
+            precision=self.precision,
+            drop_repeated_points=self.drop_repeated_points,
+            reproject_workers=self.reproject_workers
+        )
+
+
+def reduce_precision(gdf, precision=None, drop_repeated_points=False):
+    """
+    Arrotonda in blocco le coordinate alla griglia `precision` (es. 0.01 = 1 cm in un CRS metrico)
+    ed eventualmente rimuove i vertici consecutivi coincidenti.
+    L'arrotondamento è puntuale: la struttura delle geometrie non viene modificata.
+    """
+    if not precision and not drop_repeated_points:
+        return gdf
+    geoms = np.asarray(gdf.geometry.values)
+    if precision:
+        geoms = shapely.set_precision(geoms, precision, mode='pointwise')
+    if drop_repeated_points:
+        geoms = shapely.remove_repeated_points(geoms)
+    return gdf.set_geometry(gpd.GeoSeries(geoms, index=gdf.index, crs=gdf.crs))
+
+
+def merge_layers(sources, target_epsg, precision=None, drop_repeated_points=False, reproject_workers=None,
+                 layers=None):
+    """
+    Unisce i layer di tutte le sorgenti parsate riproiettandoli nel CRS di destinazione.
+    Genera coppie (nome_tabella, GeoDataFrame) con nomi tabella in minuscolo.
+    Dopo la riproiezione può ridurre la precisione delle coordinate (vedi reduce_precision).
+
+    Con reproject_workers i layer delle sorgenti che condividono lo stesso CRS vengono
+    prima concatenati e poi riproiettati in blocco su un pool di processi (vedi parallel_to_crs).
+
+    Per ultimo viene generato il layer catalogo (CATALOG_LAYER), una riga per sorgente
+    calcolata sui layer da scrivere (vedi CXFSource.summarize).
+
+    :param layers: Tabelle da generare (es. ['bordo']); default tutte, catalogo compreso.
+        Gli altri layer non vengono né concatenati né riproiettati.
+    """
+    wanted = None if layers is None else {name.upper() for name in layers}
+    layers_to_merge = {
+        k: [] for k in ['BORDO', 'TESTO', 'SIMBOLO', 'FIDUCIALE', 'LINEA', REPORT_LAYER.upper()]
+        if wanted is None or k in wanted
+    }
+    with_catalog = wanted is None or CATALOG_LAYER.upper() in wanted
+    summaries = []
+    for src in sources:
+        if with_catalog and getattr(src, 'parse_time', None) is not None:
+            summaries.append(src.summarize())
+        src_layers = dict(src.layers)
+        # Report dello stadio di validazione, se eseguito
+        if getattr(src, 'invalid_geometries', None) is not None:
+            src_layers[REPORT_LAYER] = src.invalid_geometries
+        for l_name, gdf in src_layers.items():
+            if l_name.upper() in layers_to_merge and gdf is not None and not gdf.empty:
+                if reproject_workers:
+                    # La riproiezione avviene dopo, sull'insieme delle sorgenti
+                    gdf_transformed = gdf
+                elif gdf.crs==target_epsg:
+                    gdf_transformed = gdf
+                else:
+                    gdf_transformed = gdf.to_crs(target_epsg)
+                layers_to_merge[l_name.upper()].append(gdf_transformed)
+
+    # 4. Scrittura nuovi layer nel nuovo file
+    for l_type, gdfs in layers_to_merge.items():
+        if gdfs:
+            if reproject_workers:
+                gdfs = [
+                    parallel_to_crs(pd.concat(group, ignore_index=True), target_epsg, max_workers=reproject_workers)
+                    for group in _group_by_crs(gdfs)
+                ]
+            merged_gdf = pd.concat(gdfs, ignore_index=True)
+            merged_gdf = reduce_precision(merged_gdf, precision, drop_repeated_points)
+            table_name = l_type.lower()
+            yield table_name, merged_gdf
+
+    if summaries:
+        yield CATALOG_LAYER, catalog_layer(summaries, target_epsg)
+
+
+def _group_by_crs(gdfs):
+    """Raggruppa i GeoDataFrame per CRS mantenendo l'ordine delle sorgenti."""
+    groups = {}
+    for gdf in gdfs:
+        groups.setdefault(gdf.crs.to_wkt(), []).append(gdf)
+    return list(groups.values())
@@ -8,6 +8,11 @@ from ..sql_common import MetadataManager, CXFMetadata
 import sqlite3
 import pandas as pd
 from ..base import BaseExporter
+from ...catalog import CATALOG_LAYER, CATALOG_INDEX
+from . import native
+
+# Motori di scrittura dei layer: GDAL tramite pyogrio o scrittura diretta via sqlite3
+WRITER_ENGINES = ('pyogrio', 'native')
 
 
 class GeoPackageMetadataManager(MetadataManager):
@@ -101,7 +106,15 @@ class GeoPackageMetadataManager(MetadataManager):
 class GPKGExporter(BaseExporter):
     """ TO DO """
     
-    def __init__(self, output_path):
+    def __init__(self, output_path, engine='pyogrio', spatial_index=True):
+        """
+        :param engine: 'pyogrio' (GDAL) oppure 'native' (sqlite3 diretto, vedi native.write_layer).
+        :param spatial_index: Solo per engine='native': crea e aggiorna l'indice rtree dei layer.
+        """
+        if engine not in WRITER_ENGINES:
+            raise ValueError(f"Motore di scrittura non valido: '{engine}' (ammessi: {', '.join(WRITER_ENGINES)})")
+        self.engine_name = engine
+        self.spatial_index = spatial_index
         # In SQLAlchemy 2.0 è buona norma usare l'URL di connessione esplicito
         self.output_path = Path(output_path)
         self.connection_url = f'sqlite:///{self.output_path}'
@@ -139,26 +152,92 @@ class GPKGExporter(BaseExporter):
         """
         Esegue l'integrazione dei sorgenti e la scrittura nel GeoPackage.
         """
-        # Recupero info dai file sorgenti tramite la classe base
-        file_date, file_names = self._get_file_info(project)
-        
+        BaseExporter.export(self, project, target_epsg)
+
+    def begin(self, project, target_epsg, resume=False):
         # Preparazione dell'output (archiviazione eventuale file precedente)
-        self.prepare_schema()
+        # In ripresa il file parzialmente scritto va invece conservato
+        if not resume:
+            self.prepare_schema()
 
-        # 1. Ciclo sui layer processati dalla logica comune di merge
-        for table_name, merged_gdf in self._merge_sources(project.sources, target_epsg):
-            print(f"Scrittura layer GeoPackage: {table_name} -> {self.output_path.name}")
-            
-            # 2. Scrittura del GeoDataFrame come layer del file GPKG
-            # Usiamo to_file con driver GPKG, che è lo standard per GeoPandas
-            # mode='a' (append) previene la ricreazione del file, preservando le tabelle esistenti (es. cxf_metadata)
-            merged_gdf.to_file(
-                self.output_path, 
-                layer=table_name, 
-                driver="GPKG", 
-                engine="pyogrio",  # Consigliato per performance se disponibile
-                mode='a'  # Append mode: non ricrea il file, aggiunge solo il layer
-            )
+    def write_layer(self, table_name, merged_gdf):
+        print(f"Scrittura layer GeoPackage: {table_name} -> {self.output_path.name}")
+
+        if self.engine_name == 'native':
+            native.write_layer(self.output_path, table_name, merged_gdf, spatial_index=self.spatial_index)
+            return
+
+        # 2. Scrittura del GeoDataFrame come layer del file GPKG
+        # Usiamo to_file con driver GPKG, che è lo standard per GeoPandas
+        # mode='a' (append) previene la ricreazione del file, preservando le tabelle esistenti (es. cxf_metadata)
+        merged_gdf.to_file(
+            self.output_path, 
+            layer=table_name, 
+            driver="GPKG", 
+            engine="pyogrio",  # Consigliato per performance se disponibile
+            mode='a'  # Append mode: non ricrea il file, aggiunge solo il layer
+        )
+
+    def _feature_tables(self, conn):
+        return [row[0] for row in conn.execute(
+            "SELECT table_name FROM gpkg_contents WHERE data_type = 'features'"
+        )]
+
+    def checkpoint(self):
+        """Ultimo fid di ogni layer prima della scrittura del lotto."""
+        if not self.output_path.exists():
+            return {}
+        conn = sqlite3.connect(self.output_path)
+        try:
+            if not conn.execute("SELECT count(*) FROM sqlite_master WHERE name = 'gpkg_contents'").fetchone()[0]:
+                return {}
+            return {
+                table: conn.execute(f'SELECT coalesce(max(fid), 0) FROM "{table}"').fetchone()[0]
+                for table in self._feature_tables(conn)
+            }
+        finally:
+            conn.close()
+
+    def rollback(self, state):
+        """
+        Rimuove le feature scritte da un lotto interrotto (fid successivi al checkpoint).
+        I trigger di cancellazione GPKG non richiedono funzioni SpatiaLite, quindi
+        basta sqlite3 e l'indice spaziale resta coerente.
+        """
+        if not self.output_path.exists():
+            return
+        state = state or {}
+        conn = sqlite3.connect(self.output_path)
+        try:
+            with conn:
+                for table in self._feature_tables(conn):
+                    deleted = conn.execute(
+                        f'DELETE FROM "{table}" WHERE fid > ?', (state.get(table, 0),)
+                    ).rowcount
+                    if deleted:
+                        print(f"Ripristino layer {table}: rimosse {deleted} feature di un lotto incompleto")
+        finally:
+            conn.close()
+
+    def _index_catalog(self):
+        """Indice per chiave sul layer catalogo (l'indice spaziale è quello rtree del layer)."""
+        conn = sqlite3.connect(self.output_path)
+        try:
+            with conn:
+                if conn.execute("SELECT count(*) FROM sqlite_master WHERE type = 'table' AND name = ?",
+                                (CATALOG_LAYER,)).fetchone()[0]:
+                    columns = ", ".join(CATALOG_INDEX)
+                    conn.execute(
+                        f'CREATE INDEX IF NOT EXISTS "{CATALOG_LAYER}_{"_".join(CATALOG_INDEX)}" '
+                        f'ON "{CATALOG_LAYER}" ({columns})'
+                    )
+        finally:
+            conn.close()
+
+    def finish(self, project):
+        self._index_catalog()
+        # Recupero info dai file sorgenti tramite la classe base
+        file_date, file_names = self._get_file_info(project)
 
         with GeoPackageMetadataManager(self.engine, self.output_path) as metadata_manager:
             metadata_manager.setup_database()
@@ -176,4 +255,4 @@ class GPKGExporter(BaseExporter):
             })
             # Metodi mantenuti per compatibilità con l'interfaccia PostGIS
             # metadata_manager.set_description()
-        pass
\ No newline at end of file
+        pass
@@ -0,0 +1,75 @@
+"""
+Codifica e decodifica del formato binario delle geometrie GeoPackage
+(header "GP" seguito da WKB standard), senza dipendere da GDAL o SpatiaLite.
+Rif. OGC GeoPackage 1.3, §2.1.3.
+"""
+import numpy as np
+import shapely
+
+# Dimensione dell'envelope (in byte) per ciascun valore dell'indicatore nei flag
+ENVELOPE_SIZES = {0: 0, 1: 32, 2: 48, 3: 48, 4: 64}
+
+# Header con envelope XY: magic, versione, flag, srs_id e (minx, maxx, miny, maxy), little endian
+HEADER_DTYPE = np.dtype([
+    ('magic', 'S2'), ('version', 'u1'), ('flags', 'u1'), ('srs_id', '<i4'), ('envelope', '<f8', (4,))
+])
+# Flag: bit 0 = little endian, bit 1-3 = envelope XY, bit 4 = geometria vuota (senza envelope)
+FLAGS_ENVELOPE_XY = 0b00011
+FLAGS_EMPTY = 0b10001
+
+
+def header_size(blob):
+    """Lunghezza dell'header GPKG (8 byte fissi + envelope opzionale)."""
+    if blob[:2] != b'GP':
+        raise ValueError("Geometria non in formato GeoPackage (magic 'GP' assente)")
+    envelope = (blob[3] >> 1) & 0b111
+    return 8 + ENVELOPE_SIZES[envelope]
+
+
+def blobs_to_geometries(blobs):
+    """Decodifica in blocco una sequenza di blob GPKG (None ammessi) in geometrie shapely."""
+    wkbs = np.array(
+        [None if blob is None else bytes(blob[header_size(blob):]) for blob in blobs],
+        dtype=object
+    )
+    return shapely.from_wkb(wkbs)
+
+
+def geometry_envelopes(blobs):
+    """
+    Envelope (minx, maxx, miny, maxy) nell'ordine delle colonne dell'indice rtree GPKG.
+    Ritorna anche la maschera delle geometrie valorizzate e non vuote.
+    """
+    geoms = blobs_to_geometries(blobs)
+    present = ~shapely.is_missing(geoms) & ~shapely.is_empty(geoms)
+    bounds = shapely.bounds(geoms)
+    return bounds[:, [0, 2, 1, 3]], present
+
+
+def geometries_to_blobs(geoms, srs_id):
+    """
+    Codifica in blocco un array di geometrie shapely in blob GPKG (None per le mancanti).
+    WKB, envelope e header sono calcolati in modo vettoriale; resta in Python
+    solo la concatenazione header + WKB di ciascuna riga.
+    """
+    geoms = np.asarray(geoms, dtype=object)
+    missing = shapely.is_missing(geoms)
+    empty = ~missing & shapely.is_empty(geoms)
+    wkbs = shapely.to_wkb(geoms, output_dimension=2, byte_order=1)
+
+    header = np.zeros(len(geoms), dtype=HEADER_DTYPE)
+    header['magic'] = b'GP'
+    header['flags'] = np.where(empty, FLAGS_EMPTY, FLAGS_ENVELOPE_XY)
+    header['srs_id'] = srs_id
+    header['envelope'] = shapely.bounds(geoms)[:, [0, 2, 1, 3]]
+
+    size = HEADER_DTYPE.itemsize
+    raw = header.tobytes()
+    blobs = []
+    for i, (wkb, is_missing, is_empty) in enumerate(zip(wkbs, missing, empty)):
+        if is_missing:
+            blobs.append(None)
+        else:
+            start = i * size
+            blobs.append(raw[start:start + (8 if is_empty else size)] + wkb)
+    return blobs
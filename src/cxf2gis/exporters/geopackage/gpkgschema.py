@@ -0,0 +1,51 @@
+"""
+Interrogazioni di servizio sulle tabelle di un GeoPackage tramite sqlite3,
+condivise dal writer nativo (native.py) e dall'unione degli shard (merge.py).
+Il parametro schema indica il database SQLite ('main' o un database agganciato con ATTACH).
+"""
+
+
+def feature_tables(conn, schema='main'):
+    """Tabelle registrate in gpkg_contents come layer di feature."""
+    return [row[0] for row in conn.execute(
+        f"SELECT table_name FROM {schema}.gpkg_contents WHERE data_type = 'features'"
+    )]
+
+
+def table_exists(conn, table, schema='main'):
+    return conn.execute(
+        f"SELECT count(*) FROM {schema}.sqlite_master WHERE type = 'table' AND name = ?", (table,)
+    ).fetchone()[0] > 0
+
+
+def columns(conn, table, schema='main'):
+    return [row[1] for row in conn.execute(f'PRAGMA {schema}.table_info("{table}")')]
+
+
+def column_types(conn, table, schema='main'):
+    """Coppie (colonna, tipo dichiarato) della tabella, nell'ordine di definizione."""
+    return [(row[1], row[2]) for row in conn.execute(f'PRAGMA {schema}.table_info("{table}")')]
+
+
+def rtree_indexes(conn):
+    """Coppie (tabella, colonna geometrica) con estensione gpkg_rtree_index."""
+    if not table_exists(conn, 'gpkg_extensions'):
+        return []
+    return conn.execute(
+        "SELECT table_name, column_name FROM gpkg_extensions WHERE extension_name = 'gpkg_rtree_index'"
+    ).fetchall()
+
+
+def drop_triggers(conn, tables):
+    """
+    Rimuove i trigger delle tabelle di destinazione e ne restituisce il DDL.
+    I trigger rtree di GDAL usano funzioni SpatiaLite (ST_MinX, ...) non disponibili
+    in sqlite3 e aggiornerebbero indice e conteggi riga per riga.
+    """
+    triggers = conn.execute(
+        f"SELECT name, sql FROM sqlite_master WHERE type = 'trigger' "
+        f"AND tbl_name IN ({','.join('?' * len(tables))})", tables
+    ).fetchall()
+    for name, _ in triggers:
+        conn.execute(f'DROP TRIGGER "{name}"')
+    return [sql for _, sql in triggers]
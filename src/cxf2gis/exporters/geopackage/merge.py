@@ -0,0 +1,165 @@
+import shutil
+import sqlite3
+from pathlib import Path
+
+import numpy as np
+
+from ..sql_common import CXFMetadata
+from .gpkgbinary import geometry_envelopes
+from . import rtree
+from .gpkgschema import feature_tables, table_exists, columns, column_types, rtree_indexes, drop_triggers
+
+# Geometrie lette per volta durante la ricostruzione degli indici
+RTREE_CHUNK = 100_000
+
+
+def _copy_table_definition(conn, table):
+    """Crea nel file di output una tabella presente solo nello shard, con le sue registrazioni GPKG."""
+    for (sql,) in conn.execute(
+        "SELECT sql FROM shard.sqlite_master WHERE type IN ('table', 'index') AND tbl_name = ? AND sql IS NOT NULL",
+        (table,)
+    ).fetchall():
+        conn.execute(sql)
+    conn.execute("INSERT OR IGNORE INTO gpkg_spatial_ref_sys SELECT * FROM shard.gpkg_spatial_ref_sys "
+                 "WHERE srs_id IN (SELECT srs_id FROM shard.gpkg_contents WHERE table_name = ?)", (table,))
+    conn.execute("INSERT INTO gpkg_contents SELECT * FROM shard.gpkg_contents WHERE table_name = ?", (table,))
+    conn.execute("INSERT INTO gpkg_geometry_columns SELECT * FROM shard.gpkg_geometry_columns WHERE table_name = ?", (table,))
+    if table_exists(conn, 'gpkg_extensions', 'shard') and table_exists(conn, 'gpkg_extensions'):
+        conn.execute("INSERT INTO gpkg_extensions SELECT * FROM shard.gpkg_extensions WHERE table_name = ?", (table,))
+        for column, in conn.execute(
+            "SELECT column_name FROM shard.gpkg_extensions WHERE table_name = ? AND extension_name = 'gpkg_rtree_index'",
+            (table,)
+        ).fetchall():
+            rtree = f"rtree_{table}_{column}"
+            conn.execute(f'CREATE VIRTUAL TABLE "{rtree}" USING rtree(id, minx, maxx, miny, maxy)')
+    if table_exists(conn, 'gpkg_ogr_contents', 'shard') and table_exists(conn, 'gpkg_ogr_contents'):
+        conn.execute("INSERT INTO gpkg_ogr_contents (table_name, feature_count) VALUES (?, 0)", (table,))
+    # I trigger della nuova tabella vengono creati al termine, come per le altre
+    return [sql for (sql,) in conn.execute(
+        "SELECT sql FROM shard.sqlite_master WHERE type = 'trigger' AND tbl_name = ?", (table,)
+    ).fetchall()]
+
+
+def _check_srs(conn, table):
+    main_srs = conn.execute("SELECT srs_id FROM gpkg_geometry_columns WHERE table_name = ?", (table,)).fetchone()
+    shard_srs = conn.execute("SELECT srs_id FROM shard.gpkg_geometry_columns WHERE table_name = ?", (table,)).fetchone()
+    if main_srs and shard_srs and main_srs[0] != shard_srs[0]:
+        raise ValueError(f"Layer '{table}': CRS diversi tra gli shard (srs_id {main_srs[0]} e {shard_srs[0]})")
+
+
+def _rebuild_rtree(conn, table, column):
+    """Ricostruisce l'indice spaziale calcolando gli envelope con shapely (vedi rtree.rebuild)."""
+    fids, envelopes = [np.empty(0, dtype=np.int64)], [np.empty((0, 4))]
+    cursor = conn.execute(f'SELECT fid, "{column}" FROM "{table}"')
+    while True:
+        rows = cursor.fetchmany(RTREE_CHUNK)
+        if not rows:
+            break
+        chunk_envelopes, present = geometry_envelopes([row[1] for row in rows])
+        fids.append(np.array([row[0] for row in rows], dtype=np.int64)[present])
+        envelopes.append(chunk_envelopes[present])
+    rtree.rebuild(conn, f"rtree_{table}_{column}", np.concatenate(fids), np.concatenate(envelopes))
+
+
+def _refresh_contents(conn, table, rtree_column):
+    """Aggiorna estensione (gpkg_contents) e conteggio (gpkg_ogr_contents) del layer."""
+    if rtree_column:
+        extent = conn.execute(
+            f'SELECT min(minx), min(miny), max(maxx), max(maxy) FROM "rtree_{table}_{rtree_column}"'
+        ).fetchone()
+        conn.execute(
+            "UPDATE gpkg_contents SET min_x = ?, min_y = ?, max_x = ?, max_y = ?, "
+            "last_change = strftime('%Y-%m-%dT%H:%M:%fZ', 'now') WHERE table_name = ?",
+            (*extent, table)
+        )
+    if table_exists(conn, 'gpkg_ogr_contents'):
+        conn.execute(
+            f'UPDATE gpkg_ogr_contents SET feature_count = (SELECT count(*) FROM "{table}") WHERE table_name = ?',
+            (table,)
+        )
+
+
+def merge_geopackages(output_path, input_paths):
+    """
+    Unisce più GeoPackage prodotti da CXF2GIS (es. gli shard di un'importazione
+    distribuita) in un unico file, senza rileggere le feature tramite GeoPandas.
+
+    Il primo input viene copiato come base; gli altri vengono agganciati con ATTACH
+    e copiati con INSERT ... SELECT, aggiungendo alla base le colonne che le mancano.
+    I trigger vengono sospesi durante la copia e ogni indice spaziale viene ricostruito
+    una sola volta alla fine.
+    """
+    output_path = Path(output_path)
+    input_paths = [Path(p) for p in input_paths]
+    if not input_paths:
+        raise ValueError("Nessun GeoPackage da unire")
+    if output_path.exists():
+        raise FileExistsError(f"Il file di output '{output_path}' esiste già")
+    for path in input_paths:
+        if not path.exists():
+            raise FileNotFoundError(path)
+
+    shutil.copyfile(input_paths[0], output_path)
+    conn = sqlite3.connect(output_path, isolation_level=None)
+    try:
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+        # ATTACH/DETACH non sono ammessi dentro una transazione: una transazione per shard
+        conn.execute("BEGIN")
+        triggers = drop_triggers(conn, feature_tables(conn))
+        has_metadata = table_exists(conn, CXFMetadata.__tablename__)
+        conn.execute("COMMIT")
+
+        for path in input_paths[1:]:
+            print(f"Unione shard: {path.name}")
+            conn.execute("ATTACH DATABASE ? AS shard", (str(path),))
+            conn.execute("BEGIN")
+            for table in feature_tables(conn, 'shard'):
+                if not table_exists(conn, table):
+                    triggers += _copy_table_definition(conn, table)
+                else:
+                    _check_srs(conn, table)
+
+                # Colonne presenti solo nello shard (es. export con --link-labels): aggiunte al
+                # file di output, dove le righe degli shard precedenti restano NULL
+                existing = set(columns(conn, table))
+                for name, sql_type in column_types(conn, table, 'shard'):
+                    if name not in existing:
+                        conn.execute(f'ALTER TABLE main."{table}" ADD COLUMN "{name}" {sql_type}')
+                # Tutte le colonne dello shard, escluso il fid che viene riassegnato
+                copied = [c for c in columns(conn, table, 'shard') if c != 'fid']
+                column_list = ", ".join(f'"{c}"' for c in copied)
+                conn.execute(
+                    f'INSERT INTO main."{table}" ({column_list}) SELECT {column_list} FROM shard."{table}"'
+                )
+
+            if has_metadata and table_exists(conn, CXFMetadata.__tablename__, 'shard'):
+                conn.execute(
+                    f"UPDATE main.{CXFMetadata.__tablename__} SET source_filenames = source_filenames || ', ' || "
+                    f"(SELECT group_concat(source_filenames, ', ') FROM shard.{CXFMetadata.__tablename__})"
+                )
+            conn.execute("COMMIT")
+            conn.execute("DETACH DATABASE shard")
+
+        conn.execute("BEGIN")
+        print("Ricostruzione indici spaziali...")
+        rtrees = dict(rtree_indexes(conn))
+        for table in feature_tables(conn):
+            if table in rtrees:
+                _rebuild_rtree(conn, table, rtrees[table])
+            _refresh_contents(conn, table, rtrees.get(table))
+
+        if has_metadata:
+            conn.execute(
+                f"UPDATE {CXFMetadata.__tablename__} SET schema_name = ?, "
+                f"description = 'Merge di {len(input_paths)} shard GPKG'", (output_path.stem,)
+            )
+
+        for sql in triggers:
+            conn.execute(sql)
+        conn.execute("COMMIT")
+    except Exception:
+        conn.close()
+        output_path.unlink()
+        raise
+    conn.close()
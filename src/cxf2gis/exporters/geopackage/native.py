@@ -0,0 +1,288 @@
+"""
+Scrittura diretta di layer GeoPackage tramite sqlite3, senza passare per GDAL/OGR.
+
+Le tabelle di sistema (gpkg_spatial_ref_sys, gpkg_contents, gpkg_geometry_columns,
+gpkg_extensions) sono create secondo OGC GeoPackage 1.3; le geometrie sono codificate
+in blocco (vedi gpkgbinary.geometries_to_blobs) e inserite con executemany in
+un'unica transazione per layer; l'indice rtree è popolato in ordine spaziale (vedi rtree.py).
+Il file risultante è leggibile da GDAL/QGIS.
+"""
+import sqlite3
+
+import numpy as np
+import pandas as pd
+import shapely
+from pyproj import CRS
+
+from . import rtree
+from .gpkgbinary import geometries_to_blobs
+from .gpkgschema import drop_triggers, table_exists, columns
+
+# Righe codificate e inserite per ciascuna chiamata a executemany
+INSERT_CHUNK = 50_000
+
+# Nome della colonna geometrica, come negli export GDAL
+GEOMETRY_COLUMN = 'geom'
+
+# application_id 'GPKG' e versione 1.3.0 (OGC GeoPackage §1.1.1.1.1)
+APPLICATION_ID = 0x47504B47
+USER_VERSION = 10300
+
+# Primo srs_id assegnato ai CRS privi di codice EPSG
+CUSTOM_SRS_ID = 100000
+
+GEOMETRY_TYPES = {
+    0: 'POINT', 1: 'LINESTRING', 2: 'LINESTRING', 3: 'POLYGON',
+    4: 'MULTIPOINT', 5: 'MULTILINESTRING', 6: 'MULTIPOLYGON', 7: 'GEOMETRYCOLLECTION',
+}
+
+RTREE_EXTENSION = ('gpkg_rtree_index', 'http://www.geopackage.org/spec120/#extension_rtree', 'write-only')
+
+CORE_TABLES = [
+    """CREATE TABLE IF NOT EXISTS gpkg_spatial_ref_sys (
+        srs_name TEXT NOT NULL, srs_id INTEGER NOT NULL PRIMARY KEY, organization TEXT NOT NULL,
+        organization_coordsys_id INTEGER NOT NULL, definition TEXT NOT NULL, description TEXT)""",
+    """CREATE TABLE IF NOT EXISTS gpkg_contents (
+        table_name TEXT NOT NULL PRIMARY KEY, data_type TEXT NOT NULL, identifier TEXT UNIQUE,
+        description TEXT DEFAULT '', last_change DATETIME NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ','now')),
+        min_x DOUBLE, min_y DOUBLE, max_x DOUBLE, max_y DOUBLE, srs_id INTEGER,
+        CONSTRAINT fk_gc_r_srs_id FOREIGN KEY (srs_id) REFERENCES gpkg_spatial_ref_sys(srs_id))""",
+    """CREATE TABLE IF NOT EXISTS gpkg_geometry_columns (
+        table_name TEXT NOT NULL, column_name TEXT NOT NULL, geometry_type_name TEXT NOT NULL,
+        srs_id INTEGER NOT NULL, z TINYINT NOT NULL, m TINYINT NOT NULL,
+        CONSTRAINT pk_geom_cols PRIMARY KEY (table_name, column_name),
+        CONSTRAINT uk_gc_table_name UNIQUE (table_name),
+        CONSTRAINT fk_gc_tn FOREIGN KEY (table_name) REFERENCES gpkg_contents(table_name),
+        CONSTRAINT fk_gc_srs FOREIGN KEY (srs_id) REFERENCES gpkg_spatial_ref_sys (srs_id))""",
+    """CREATE TABLE IF NOT EXISTS gpkg_extensions (
+        table_name TEXT, column_name TEXT, extension_name TEXT NOT NULL, definition TEXT NOT NULL,
+        scope TEXT NOT NULL, CONSTRAINT ge_tce UNIQUE (table_name, column_name, extension_name))""",
+]
+
+# Righe obbligatorie di gpkg_spatial_ref_sys (OGC GeoPackage §1.1.2.1.2)
+DEFAULT_SRS = [
+    ('WGS 84 geodetic', 4326, 'EPSG', 4326, CRS.from_epsg(4326).to_wkt('WKT1_GDAL'), 'longitude/latitude coordinates in decimal degrees on the WGS 84 spheroid'),
+    ('Undefined cartesian SRS', -1, 'NONE', -1, 'undefined', 'undefined cartesian coordinate reference system'),
+    ('Undefined geographic SRS', 0, 'NONE', 0, 'undefined', 'undefined geographic coordinate reference system'),
+]
+
+# Trigger dell'estensione rtree (OGC GeoPackage 1.3, Annex F.3); usano le funzioni
+# ST_* registrate da GDAL/SpatiaLite, quindi vengono sospesi durante la scrittura
+RTREE_TRIGGERS = [
+    """CREATE TRIGGER "rtree_{t}_{c}_insert" AFTER INSERT ON "{t}"
+    WHEN (new."{c}" NOT NULL AND NOT ST_IsEmpty(NEW."{c}"))
+    BEGIN
+      INSERT OR REPLACE INTO "rtree_{t}_{c}" VALUES (NEW.fid,
+        ST_MinX(NEW."{c}"), ST_MaxX(NEW."{c}"), ST_MinY(NEW."{c}"), ST_MaxY(NEW."{c}"));
+    END""",
+    """CREATE TRIGGER "rtree_{t}_{c}_update1" AFTER UPDATE OF "{c}" ON "{t}"
+    WHEN OLD.fid = NEW.fid AND (NEW."{c}" NOTNULL AND NOT ST_IsEmpty(NEW."{c}"))
+    BEGIN
+      INSERT OR REPLACE INTO "rtree_{t}_{c}" VALUES (NEW.fid,
+        ST_MinX(NEW."{c}"), ST_MaxX(NEW."{c}"), ST_MinY(NEW."{c}"), ST_MaxY(NEW."{c}"));
+    END""",
+    """CREATE TRIGGER "rtree_{t}_{c}_update2" AFTER UPDATE OF "{c}" ON "{t}"
+    WHEN OLD.fid = NEW.fid AND (NEW."{c}" ISNULL OR ST_IsEmpty(NEW."{c}"))
+    BEGIN
+      DELETE FROM "rtree_{t}_{c}" WHERE id = OLD.fid;
+    END""",
+    """CREATE TRIGGER "rtree_{t}_{c}_update3" AFTER UPDATE ON "{t}"
+    WHEN OLD.fid != NEW.fid AND (NEW."{c}" NOTNULL AND NOT ST_IsEmpty(NEW."{c}"))
+    BEGIN
+      DELETE FROM "rtree_{t}_{c}" WHERE id = OLD.fid;
+      INSERT OR REPLACE INTO "rtree_{t}_{c}" VALUES (NEW.fid,
+        ST_MinX(NEW."{c}"), ST_MaxX(NEW."{c}"), ST_MinY(NEW."{c}"), ST_MaxY(NEW."{c}"));
+    END""",
+    """CREATE TRIGGER "rtree_{t}_{c}_update4" AFTER UPDATE ON "{t}"
+    WHEN OLD.fid != NEW.fid AND (NEW."{c}" ISNULL OR ST_IsEmpty(NEW."{c}"))
+    BEGIN
+      DELETE FROM "rtree_{t}_{c}" WHERE id IN (OLD.fid, NEW.fid);
+    END""",
+    """CREATE TRIGGER "rtree_{t}_{c}_delete" AFTER DELETE ON "{t}"
+    WHEN old."{c}" NOT NULL
+    BEGIN
+      DELETE FROM "rtree_{t}_{c}" WHERE id = OLD.fid;
+    END""",
+]
+
+
+def _sql_type(dtype):
+    if pd.api.types.is_bool_dtype(dtype):
+        return 'BOOLEAN'
+    if pd.api.types.is_integer_dtype(dtype):
+        return 'INTEGER'
+    if pd.api.types.is_float_dtype(dtype):
+        return 'REAL'
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return 'DATETIME'
+    return 'TEXT'
+
+
+def _column_values(series):
+    """Valori Python pronti per sqlite3 (niente scalari numpy, NULL al posto di NA)."""
+    if pd.api.types.is_datetime64_any_dtype(series.dtype):
+        values = series.dt.strftime('%Y-%m-%dT%H:%M:%S.%fZ').tolist()
+    else:
+        values = series.tolist()
+    if series.hasnans:
+        mask = series.isna().to_numpy()
+        values = [None if m else v for v, m in zip(values, mask)]
+    return values
+
+
+def _geometry_type(geoms):
+    """Tipo geometrico da dichiarare: quello comune a tutte le feature, altrimenti GEOMETRY."""
+    type_ids = np.unique(shapely.get_type_id(geoms))
+    type_ids = type_ids[type_ids >= 0]
+    names = {GEOMETRY_TYPES[t] for t in type_ids}
+    return names.pop() if len(names) == 1 else 'GEOMETRY'
+
+
+def initialize(conn):
+    """Crea (se assenti) le tabelle di sistema GeoPackage e i CRS obbligatori."""
+    conn.execute(f"PRAGMA application_id = {APPLICATION_ID}")
+    conn.execute(f"PRAGMA user_version = {USER_VERSION}")
+    for ddl in CORE_TABLES:
+        conn.execute(ddl)
+    conn.executemany("INSERT OR IGNORE INTO gpkg_spatial_ref_sys VALUES (?, ?, ?, ?, ?, ?)", DEFAULT_SRS)
+
+
+def srs_id(conn, crs):
+    """srs_id del CRS in gpkg_spatial_ref_sys, registrandolo se necessario."""
+    if crs is None:
+        return -1
+    crs = CRS.from_user_input(crs)
+    definition = crs.to_wkt('WKT1_GDAL') or crs.to_wkt()
+    epsg = crs.to_epsg()
+    if epsg is not None:
+        conn.execute(
+            "INSERT OR IGNORE INTO gpkg_spatial_ref_sys VALUES (?, ?, 'EPSG', ?, ?, NULL)",
+            (crs.name, epsg, epsg, definition)
+        )
+        return epsg
+
+    row = conn.execute("SELECT srs_id FROM gpkg_spatial_ref_sys WHERE definition = ?", (definition,)).fetchone()
+    if row:
+        return row[0]
+    new_id = max(CUSTOM_SRS_ID, conn.execute("SELECT coalesce(max(srs_id), 0) + 1 FROM gpkg_spatial_ref_sys").fetchone()[0])
+    conn.execute(
+        "INSERT INTO gpkg_spatial_ref_sys VALUES (?, ?, 'NONE', ?, ?, NULL)",
+        (crs.name, new_id, new_id, definition)
+    )
+    return new_id
+
+
+def _create_table(conn, table, columns, geometry_type, srs, spatial_index):
+    column_defs = ", ".join(f'"{name}" {sql_type}' for name, sql_type in columns)
+    conn.execute(
+        f'CREATE TABLE "{table}" (fid INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL, '
+        f'"{GEOMETRY_COLUMN}" {geometry_type}{", " + column_defs if column_defs else ""})'
+    )
+    conn.execute(
+        "INSERT INTO gpkg_contents (table_name, data_type, identifier, srs_id) VALUES (?, 'features', ?, ?)",
+        (table, table, srs)
+    )
+    conn.execute(
+        "INSERT INTO gpkg_geometry_columns VALUES (?, ?, ?, ?, 0, 0)",
+        (table, GEOMETRY_COLUMN, geometry_type, srs)
+    )
+    if spatial_index:
+        conn.execute(
+            f'CREATE VIRTUAL TABLE "rtree_{table}_{GEOMETRY_COLUMN}" USING rtree(id, minx, maxx, miny, maxy)'
+        )
+        conn.execute("INSERT INTO gpkg_extensions VALUES (?, ?, ?, ?, ?)", (table, GEOMETRY_COLUMN, *RTREE_EXTENSION))
+
+
+def _prepare_table(conn, table, gdf, geometry_type, srs, spatial_index):
+    """
+    Crea la tabella o la allinea al GeoDataFrame in append: colonne mancanti aggiunte,
+    tipo geometrico generalizzato a GEOMETRY se il lotto ne introduce uno diverso.
+    :return: (colonna geometrica, presenza dell'indice rtree)
+    """
+    attributes = [(name, _sql_type(gdf[name].dtype)) for name in gdf.columns if name != gdf.geometry.name]
+    if not table_exists(conn, table):
+        _create_table(conn, table, attributes, geometry_type, srs, spatial_index)
+        return GEOMETRY_COLUMN, spatial_index
+
+    geometry_column, declared_type, table_srs = conn.execute(
+        "SELECT column_name, geometry_type_name, srs_id FROM gpkg_geometry_columns WHERE table_name = ?", (table,)
+    ).fetchone()
+    if table_srs != srs:
+        raise ValueError(f"Layer '{table}': CRS diverso da quello della tabella esistente (srs_id {table_srs} e {srs})")
+    if declared_type != geometry_type and declared_type != 'GEOMETRY':
+        conn.execute(
+            "UPDATE gpkg_geometry_columns SET geometry_type_name = 'GEOMETRY' WHERE table_name = ?", (table,)
+        )
+    existing = set(columns(conn, table))
+    for name, sql_type in attributes:
+        if name not in existing:
+            conn.execute(f'ALTER TABLE "{table}" ADD COLUMN "{name}" {sql_type}')
+    has_rtree = table_exists(conn, f"rtree_{table}_{geometry_column}")
+    return geometry_column, has_rtree
+
+
+def write_layer(path, table, gdf, spatial_index=True, chunk_size=INSERT_CHUNK):
+    """
+    Accoda un GeoDataFrame al layer `table` del GeoPackage `path`, creando file e tabella
+    se necessario. Tutte le righe sono inserite in un'unica transazione; l'indice rtree
+    viene aggiornato con gli envelope calcolati da shapely, senza i trigger SpatiaLite.
+    """
+    conn = sqlite3.connect(path, isolation_level=None)
+    try:
+        conn.execute("BEGIN")
+        initialize(conn)
+        srs = srs_id(conn, gdf.crs)
+        geoms = np.asarray(gdf.geometry.values)
+        geometry_column, has_rtree = _prepare_table(conn, table, gdf, _geometry_type(geoms), srs, spatial_index)
+        triggers = drop_triggers(conn, [table])
+
+        attributes = [name for name in gdf.columns if name != gdf.geometry.name]
+        column_list = ", ".join(f'"{c}"' for c in ['fid', geometry_column, *attributes])
+        placeholders = ", ".join('?' * (len(attributes) + 2))
+        first_fid = conn.execute(f'SELECT coalesce(max(fid), 0) + 1 FROM "{table}"').fetchone()[0]
+
+        for start in range(0, len(gdf), chunk_size):
+            chunk = gdf.iloc[start:start + chunk_size]
+            chunk_geoms = geoms[start:start + chunk_size]
+            fids = range(first_fid + start, first_fid + start + len(chunk))
+            values = [fids, geometries_to_blobs(chunk_geoms, srs)]
+            values += [_column_values(chunk[name]) for name in attributes]
+            conn.executemany(f'INSERT INTO "{table}" ({column_list}) VALUES ({placeholders})', zip(*values))
+
+        if has_rtree:
+            # Envelope calcolati in blocco da shapely e inseriti in ordine spaziale (vedi rtree.append)
+            present = ~shapely.is_missing(geoms) & ~shapely.is_empty(geoms)
+            fids = np.arange(first_fid, first_fid + len(gdf))[present]
+            rtree.append(conn, f"rtree_{table}_{geometry_column}", fids, shapely.bounds(geoms[present])[:, [0, 2, 1, 3]])
+        _update_extent(conn, table, geoms)
+        if not triggers and has_rtree:
+            triggers = [sql.format(t=table, c=geometry_column) for sql in RTREE_TRIGGERS]
+        for sql in triggers:
+            conn.execute(sql)
+        if table_exists(conn, 'gpkg_ogr_contents'):
+            conn.execute(
+                "UPDATE gpkg_ogr_contents SET feature_count = feature_count + ? WHERE table_name = ?",
+                (len(gdf), table)
+            )
+        conn.execute("COMMIT")
+    except Exception:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+
+def _update_extent(conn, table, geoms):
+    """Estende l'envelope del layer in gpkg_contents con quello delle nuove feature."""
+    present = geoms[~shapely.is_missing(geoms) & ~shapely.is_empty(geoms)]
+    if not len(present):
+        return
+    minx, miny, maxx, maxy = shapely.total_bounds(present).tolist()
+    conn.execute(
+        "UPDATE gpkg_contents SET "
+        "min_x = min(coalesce(min_x, :minx), :minx), min_y = min(coalesce(min_y, :miny), :miny), "
+        "max_x = max(coalesce(max_x, :maxx), :maxx), max_y = max(coalesce(max_y, :maxy), :maxy), "
+        "last_change = strftime('%Y-%m-%dT%H:%M:%fZ', 'now') WHERE table_name = :table",
+        {'minx': minx, 'miny': miny, 'maxx': maxx, 'maxy': maxy, 'table': table}
+    )
@@ -0,0 +1,57 @@
+"""
+Caricamento degli indici spaziali rtree di SQLite (estensione gpkg_rtree_index).
+
+Le voci sono inserite con INSERT ordinari nella tabella virtuale, quindi la struttura
+dei nodi resta interamente gestita da SQLite; per contenere il costo delle
+riorganizzazioni dell'R*-tree vengono però inserite in ordine Sort-Tile-Recursive,
+così che voci vicine nello spazio finiscano negli stessi nodi.
+"""
+import math
+
+import numpy as np
+
+# Voci per foglia usate per comporre le fasce dell'ordinamento (ordine di grandezza
+# di un nodo rtree SQLite con pagine da 4 KB; serve solo a raggruppare voci vicine)
+SORT_CAPACITY = 50
+
+
+def str_order(boxes, capacity=SORT_CAPACITY):
+    """
+    Ordine Sort-Tile-Recursive di un array Nx4 (minx, maxx, miny, maxy): fasce
+    verticali per centro x, poi per centro y dentro ogni fascia.
+    """
+    boxes = np.asarray(boxes, dtype=np.float64)
+    n = len(boxes)
+    if n <= capacity:
+        return np.arange(n)
+    n_nodes = math.ceil(n / capacity)
+    n_slices = math.ceil(math.sqrt(n_nodes))
+    slice_size = capacity * math.ceil(n_nodes / n_slices)
+    cx = boxes[:, 0] + boxes[:, 1]
+    cy = boxes[:, 2] + boxes[:, 3]
+    by_x = np.argsort(cx, kind='stable')
+    slice_id = np.empty(n, dtype=np.int64)
+    slice_id[by_x] = np.arange(n) // slice_size
+    return np.lexsort((cy, slice_id))
+
+
+def append(conn, rtree, ids, boxes):
+    """
+    Aggiunge voci all'indice `rtree` in ordine spaziale.
+    :param boxes: Array Nx4 nell'ordine delle colonne rtree (minx, maxx, miny, maxy).
+    """
+    ids = np.asarray(ids, dtype=np.int64)
+    if not len(ids):
+        return
+    boxes = np.asarray(boxes, dtype=np.float64)
+    order = str_order(boxes)
+    conn.executemany(
+        f'INSERT INTO "{rtree}" (id, minx, maxx, miny, maxy) VALUES (?, ?, ?, ?, ?)',
+        zip(ids[order].tolist(), *boxes[order].T.tolist())
+    )
+
+
+def rebuild(conn, rtree, ids, boxes):
+    """Sostituisce il contenuto dell'indice `rtree` con le voci (ids, boxes)."""
+    conn.execute(f'DELETE FROM "{rtree}"')
+    append(conn, rtree, ids, boxes)
@@ -1,12 +1,30 @@
 import os
+import time
+import uuid
 import datetime
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import pandas as pd
 import geopandas as gpd
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, inspect, text
+from geoalchemy2 import Geometry
 from sqlmodel import select
 from ..base import BaseExporter
 from ..sql_common import MetadataManager, CXFMetadata
+from ...catalog import CATALOG_LAYER, CATALOG_INDEX
+
+# Tabella dello schema di output con i lotti confermati (vedi checkpoint e committed)
+BATCH_TABLE = 'cxf2gis_lotti'
+
+# Stato del record di metadati degli schemi che contengono un confronto tra consegne (vedi delta)
+DELTA_STATUS = 'delta'
+
+# Indici per chiave creati sulle tabelle dopo il caricamento, oltre all'indice spaziale
+# GiST (idx_<tabella>_<geometria>, il nome che userebbe geoalchemy2)
+TABLE_INDEXES = {
+    'bordo': ['comune', 'foglio', 'codice'],
+    CATALOG_LAYER: CATALOG_INDEX,
+}
 
 
 class PostGISMetadataManager(MetadataManager):
@@ -57,6 +75,12 @@ class PostGISMetadataManager(MetadataManager):
         ), {"s": self.target_schema}).scalar()
         return result
 
+    def _entry_status(self):
+        """Stato (record_status) registrato per lo schema nella tabella dei metadati."""
+        return self.session.execute(text(
+            f"SELECT record_status FROM public.{CXFMetadata.__tablename__} WHERE schema_name = :s"
+        ), {"s": self.target_schema}).scalar()
+
     def _create_schema(self):
         self.session.execute(text(f'CREATE SCHEMA "{self.target_schema}"'))
 
@@ -73,12 +97,28 @@ class PostGISMetadataManager(MetadataManager):
 
 class PostGISExporter(BaseExporter):
 
-    def __init__(self, host, database, user, password, port=5432):
+    def __init__(self, host, database, user, password, port=5432, target_schema="catasto", pool_size=5, delta=False):
+        """
+        :param pool_size: Connessioni del pool SQLAlchemy, cioè il numero massimo di layer
+                          scritti in parallelo nell'export in un'unica passata (vedi write_concurrent).
+        :param delta: Lo schema riceve un confronto tra consegne (comando diff): viene registrato
+                      con stato DELTA_STATUS e può sostituire solo uno schema delta, mai un export completo.
+        """
         # In SQLAlchemy 2.0 è buona norma usare l'URL di connessione esplicito
         connection_url = f'postgresql://{user}:{password}@{host}:{port}/{database}'
-        self.engine = create_engine(connection_url)
+        self.engine = create_engine(connection_url, pool_size=pool_size, max_overflow=0)
+        self.pool_size = pool_size
+        self.target_schema = target_schema
+        self.delta = delta
+        # Tabelle già indicizzate subito dopo il caricamento (vedi _load_table)
+        self._indexed = set()
+        # Identificativo del lotto in scrittura, registrato nella sua stessa transazione
+        self._batch_token = None
+        # Schema archiviato da prepare_schema e suo stato precedente, per restore_schema
+        self._archived = None
 
     def prepare_schema(self, target_schema):
+        self._archived = None
         with PostGISMetadataManager(self.engine, target_schema) as metadata_manager:
             # Verifica esistenza schema
             schema_exists = metadata_manager._check_schema_exists()
@@ -95,9 +135,16 @@ class PostGISExporter(BaseExporter):
                     raise RuntimeError(
                         f"SICUREZZA: Lo schema '{target_schema}' non è gestito da CXF2GIS. Operazione annullata."
                     )
+                if self.delta and metadata_manager._entry_status() != DELTA_STATUS:
+                    raise RuntimeError(
+                        f"SICUREZZA: Lo schema '{target_schema}' contiene un export completo e non può "
+                        f"essere sostituito da un confronto. Operazione annullata."
+                    )
             
+                status = metadata_manager._entry_status()
                 archive_name = metadata_manager._archive_schema()
                 metadata_manager._register_archive(archive_name)
+                self._archived = (archive_name, status)
             metadata_manager._create_schema()
 
         metadata_manager.setup_database()
@@ -148,22 +195,210 @@ class PostGISExporter(BaseExporter):
             conn.execute(text(f'CREATE SCHEMA "{target_schema}"'))
             # Il commit avviene qui automaticamente alla chiusura del blocco 'with'
 
-    def export(self, project, target_epsg, target_schema="catasto"):
-    
-        file_date, file_names = self._get_file_info(project)
-        
-        self.prepare_schema(target_schema)
-
-        # 2. Scrittura layer nel database
-        for table_name, merged_gdf in self._merge_sources(project.sources, target_epsg):
-            print(f"Scrittura tabella: {target_schema}.{table_name}")
-            merged_gdf.to_postgis(
-                name=table_name,
-                con=self.engine, # to_postgis accetta direttamente l'engine
-                schema=target_schema,
-                if_exists='replace',
-                index=False
+    def export(self, project, target_epsg, target_schema=None):
+        """
+        Esportazione in un'unica passata con i layer scritti in parallelo (vedi write_concurrent).
+        A differenza delle esecuzioni a lotti (write_batch) ogni layer ha la sua transazione:
+        se un layer fallisce, lo schema parziale viene eliminato e quello archiviato
+        da begin ripristinato (vedi restore_schema).
+        """
+        if target_schema is not None:
+            self.target_schema = target_schema
+        self.begin(project, target_epsg)
+        try:
+            self.write_concurrent(project.sources, target_epsg)
+        except BaseException:
+            # Lo schema nuovo è scritto solo in parte: torna in uso quello archiviato da begin
+            self.restore_schema()
+            raise
+        self.finish(project)
+
+    def restore_schema(self):
+        """
+        Annulla prepare_schema dopo un export fallito: elimina lo schema in scrittura e
+        riporta al suo nome, con lo stato precedente, lo schema archiviato (se presente).
+        """
+        archived, self._archived = self._archived, None
+        with self.engine.begin() as conn:
+            conn.execute(text(f'DROP SCHEMA IF EXISTS "{self.target_schema}" CASCADE'))
+            conn.execute(
+                text(f"DELETE FROM public.{CXFMetadata.__tablename__} WHERE schema_name = :s"),
+                {"s": self.target_schema}
             )
+            if archived is None:
+                return
+            archive_name, status = archived
+            print(f"Ripristino schema '{archive_name}' -> '{self.target_schema}'...")
+            conn.execute(text(f'ALTER SCHEMA "{archive_name}" RENAME TO "{self.target_schema}"'))
+            conn.execute(text(
+                f"UPDATE public.{CXFMetadata.__tablename__} SET schema_name = :s, record_status = :status "
+                f"WHERE schema_name = :a"
+            ), {"s": self.target_schema, "status": status, "a": archive_name})
+
+    def begin(self, project, target_epsg, resume=False):
+        # In ripresa lo schema parzialmente popolato va conservato, non archiviato
+        if not resume:
+            self.prepare_schema(self.target_schema)
+
+    def write_layer(self, table_name, merged_gdf, con=None):
+        print(f"Scrittura tabella: {self.target_schema}.{table_name}")
+        con = con if con is not None else self.engine  # to_postgis accetta direttamente l'engine
+        self._create_table(con, table_name, merged_gdf)
+        merged_gdf.to_postgis(
+            name=table_name,
+            con=con,
+            schema=self.target_schema,
+            if_exists='append',
+            index=False
+        )
+
+    def _create_table(self, con, table_name, merged_gdf):
+        """
+        Crea la tabella vuota, se non esiste, con la colonna geometrica senza indice spaziale:
+        to_postgis imposta sempre il proprio tipo Geometry (con spatial_index=True), per cui
+        la tabella viene creata da pandas.to_sql con il dtype esplicito. Il GiST viene costruito
+        una sola volta a caricamento concluso (vedi _create_indexes) invece di essere
+        aggiornato riga per riga durante il COPY.
+        """
+        if inspect(con).has_table(table_name, schema=self.target_schema):
+            return
+        geometry = merged_gdf.geometry
+        # Tipo geometrico con le stesse regole di to_postgis: un solo tipo, altrimenti GEOMETRY
+        geom_types = geometry.geom_type.dropna().unique()
+        geometry_type = geom_types[0].upper() if len(geom_types) == 1 else 'GEOMETRY'
+        if geometry.has_z.any():
+            geometry_type += 'Z'
+        srid = merged_gdf.crs.to_epsg() if merged_gdf.crs is not None else -1
+        pd.DataFrame(merged_gdf.iloc[:0]).to_sql(
+            name=table_name,
+            con=con,
+            schema=self.target_schema,
+            index=False,
+            dtype={geometry.name: Geometry(geometry_type=geometry_type, srid=srid, spatial_index=False)}
+        )
+
+    def write_batch(self, sources, target_epsg):
+        """
+        Tutti i layer di un lotto sono scritti in un'unica transazione, quindi in sequenza
+        su una sola connessione: un lotto interrotto non lascia righe parziali e può essere
+        semplicemente ripetuto. Gli indici, compreso il GiST, vengono creati una sola volta in finish.
+        """
+        with self.engine.begin() as conn:
+            for table_name, merged_gdf in self._merge_sources(sources, target_epsg):
+                self.write_layer(table_name, merged_gdf, con=conn)
+            if self._batch_token is not None:
+                # Conferma del lotto nella stessa transazione dei dati: in ripresa un lotto
+                # confermato qui ma non nel giornale non va riscritto (vedi committed)
+                conn.execute(text(
+                    f'CREATE TABLE IF NOT EXISTS "{self.target_schema}"."{BATCH_TABLE}" '
+                    f'(lotto TEXT PRIMARY KEY, completato TIMESTAMP DEFAULT now())'
+                ))
+                conn.execute(
+                    text(f'INSERT INTO "{self.target_schema}"."{BATCH_TABLE}" (lotto) VALUES (:lotto)'),
+                    {"lotto": self._batch_token}
+                )
+                self._batch_token = None
+
+    def checkpoint(self):
+        """Identificativo del lotto, registrato nel giornale e scritto nella transazione del lotto."""
+        self._batch_token = uuid.uuid4().hex
+        return {"lotto": self._batch_token}
+
+    def rollback(self, state):
+        """Nulla da annullare: un lotto non confermato è stato scritto in una transazione mai conclusa."""
+        pass
+
+    def committed(self, state):
+        """Vero se la transazione del lotto è stata confermata (identificativo presente in BATCH_TABLE)."""
+        if not state or not state.get("lotto"):
+            return False
+        table = f'"{self.target_schema}"."{BATCH_TABLE}"'
+        with self.engine.connect() as conn:
+            if conn.execute(text("SELECT to_regclass(:t)"), {"t": table}).scalar() is None:
+                return False
+            return conn.execute(
+                text(f"SELECT EXISTS (SELECT 1 FROM {table} WHERE lotto = :lotto)"), {"lotto": state["lotto"]}
+            ).scalar()
+
+    def write_concurrent(self, sources, target_epsg):
+        """
+        Scrive i layer in parallelo, ciascuno su una connessione del pool (il lavoro è di
+        I/O sul server: bastano i thread). Ogni layer viene affidato al pool appena unito
+        e riproiettato, così la preparazione dei successivi si sovrappone alle scritture
+        in corso, e gli indici di una tabella (compreso il GiST) sono creati appena termina
+        il suo caricamento.
+        Al primo layer fallito i caricamenti non ancora avviati vengono annullati e
+        l'errore viene propagato, senza attendere la preparazione dei layer successivi.
+        """
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.pool_size) as pool:
+            futures = []
+            try:
+                for table_name, merged_gdf in self._merge_sources(sources, target_epsg):
+                    futures.append(pool.submit(self._load_table, table_name, merged_gdf))
+                    for future in futures:
+                        if future.done() and future.exception() is not None:
+                            future.result()
+                elapsed = [future.result() for future in futures]
+            except BaseException:
+                pool.shutdown(cancel_futures=True)
+                raise
+        print(
+            f"Scrittura di {len(futures)} tabelle completata in {time.perf_counter() - start:.1f}s "
+            f"(somma dei tempi per tabella: {sum(elapsed):.1f}s)"
+        )
+
+    def _load_table(self, table_name, merged_gdf):
+        """Caricamento e indicizzazione di una tabella in transazioni proprie; restituisce la durata."""
+        start = time.perf_counter()
+        with self.engine.begin() as conn:
+            self.write_layer(table_name, merged_gdf, con=conn)
+        loaded = time.perf_counter()
+        with self.engine.begin() as conn:
+            self._create_indexes(conn, table_name, merged_gdf.geometry.name)
+        self._indexed.add(table_name)
+        end = time.perf_counter()
+        print(
+            f"Tabella {self.target_schema}.{table_name}: {len(merged_gdf)} righe, "
+            f"caricamento {loaded - start:.1f}s, indici {end - loaded:.1f}s"
+        )
+        return end - start
+
+    def _create_indexes(self, conn, table_name, geometry_column='geometry'):
+        """
+        Indice spaziale GiST, eventuale indice per chiave (TABLE_INDEXES) e statistiche della
+        tabella, creati in blocco sui dati già caricati (vedi _create_table).
+        """
+        table = f'"{self.target_schema}"."{table_name}"'
+        conn.execute(text(
+            f'CREATE INDEX IF NOT EXISTS "idx_{table_name}_{geometry_column}" '
+            f'ON {table} USING GIST ("{geometry_column}")'
+        ))
+        columns = TABLE_INDEXES.get(table_name)
+        if columns:
+            conn.execute(text(
+                f'CREATE INDEX IF NOT EXISTS "{table_name}_{"_".join(columns)}_idx" ON {table} ({", ".join(columns)})'
+            ))
+        conn.execute(text(f'ANALYZE {table}'))
+
+    def _index_tables(self):
+        """Indicizza le tabelle geometriche dello schema non ancora indicizzate (es. dopo un export a lotti)."""
+        with self.engine.begin() as conn:
+            tables = conn.execute(
+                text("SELECT f_table_name, f_geometry_column FROM geometry_columns WHERE f_table_schema = :s"),
+                {"s": self.target_schema}
+            ).all()
+            for table_name, geometry_column in tables:
+                if table_name not in self._indexed:
+                    self._create_indexes(conn, table_name, geometry_column)
+
+    def finish(self, project):
+        self._index_tables()
+        with self.engine.begin() as conn:
+            # Dopo l'ultimo lotto il giornale contiene tutte le conferme
+            conn.execute(text(f'DROP TABLE IF EXISTS "{self.target_schema}"."{BATCH_TABLE}"'))
+        target_schema = self.target_schema
+        file_date, file_names = self._get_file_info(project)
 
         # --- BLOCCO TRANSAZIONALE 2: METADATI E DOCUMENTAZIONE ---
         with PostGISMetadataManager(self.engine, target_schema) as metadata_manager:
@@ -172,7 +407,7 @@ class PostGISExporter(BaseExporter):
                 "extraction_date": file_date,
                 # "import_timestamp": ,
                 "source_filenames": ", ".join(file_names),
-                "record_status": "production",
-                "description": f"Importazione CXF2GIS - {len(project.sources)} file"
+                "record_status": DELTA_STATUS if self.delta else "production",
+                "description": f"{'Confronto' if self.delta else 'Importazione'} CXF2GIS - {len(project.sources)} file"
             })
             metadata_manager._set_schema_description(file_names, file_date)
@@ -0,0 +1,83 @@
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+import geopandas as gpd
+import shapely
+from pyproj import CRS, Transformer
+
+# Sotto questa soglia di vertici il costo dei processi supera il guadagno
+MIN_PARALLEL_COORDINATES = 200_000
+
+
+@lru_cache(maxsize=16)
+def _transformer(source_wkt, target_wkt):
+    # Un Transformer per coppia di CRS e per processo worker
+    return Transformer.from_crs(CRS.from_wkt(source_wkt), CRS.from_wkt(target_wkt), always_xy=True)
+
+
+def _transform_chunk(task):
+    """
+    Trasforma in place un intervallo di coordinate nella memoria condivisa.
+    Il buffer ha forma (2, N): x e y sono contigui, quindi pyproj può lavorare senza copie.
+    """
+    shm_name, n_coords, start, stop, source_wkt, target_wkt = task
+    # La memoria è di proprietà del processo principale, che si occupa dell'unlink
+    shm = SharedMemory(name=shm_name)
+    try:
+        coords = np.ndarray((2, n_coords), dtype=np.float64, buffer=shm.buf)
+        _transformer(source_wkt, target_wkt).transform(
+            coords[0, start:stop], coords[1, start:stop], inplace=True
+        )
+        del coords
+    finally:
+        shm.close()
+    return stop - start
+
+
+def parallel_to_crs(gdf, target_crs, max_workers=None, chunk_size=250_000):
+    """
+    Equivalente di GeoDataFrame.to_crs che distribuisce la trasformazione delle coordinate
+    su un pool di processi. Le coordinate vengono estratte in un unico array in memoria
+    condivisa (nessun pickling di geometrie), trasformate a blocchi e reinserite nelle
+    geometrie; le colonne attributo non vengono copiate.
+    """
+    target_crs = CRS.from_user_input(target_crs)
+    if gdf.crs is None:
+        raise ValueError("Impossibile riproiettare un GeoDataFrame senza CRS")
+    if gdf.crs == target_crs:
+        return gdf
+
+    geoms = np.asarray(gdf.geometry.values)
+    coords = shapely.get_coordinates(geoms)
+    n_coords = len(coords)
+    if n_coords < MIN_PARALLEL_COORDINATES:
+        return gdf.to_crs(target_crs)
+
+    shm = SharedMemory(create=True, size=2 * n_coords * np.dtype(np.float64).itemsize)
+    try:
+        shared = np.ndarray((2, n_coords), dtype=np.float64, buffer=shm.buf)
+        shared[:] = coords.T
+        del coords
+
+        source_wkt, target_wkt = gdf.crs.to_wkt(), target_crs.to_wkt()
+        tasks = [
+            (shm.name, n_coords, start, min(start + chunk_size, n_coords), source_wkt, target_wkt)
+            for start in range(0, n_coords, chunk_size)
+        ]
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            for _ in pool.map(_transform_chunk, tasks):
+                pass
+
+        # set_coordinates sostituisce le geometrie nell'array passato: si lavora su una copia
+        new_geoms = shapely.set_coordinates(geoms.copy(), shared.T)
+        del shared
+    finally:
+        shm.close()
+        shm.unlink()
+
+    # Copia superficiale: i dati delle colonne attributo sono condivisi con l'originale
+    result = gdf.copy(deep=False)
+    result[gdf.geometry.name] = gpd.GeoSeries(new_geoms, index=gdf.index, crs=target_crs)
+    return result
@@ -1,4 +1,3 @@
-import requests
 import xml.etree.ElementTree as ET
 import time
 from sqlitedict import SqliteDict
@@ -66,6 +65,8 @@ class PrgCloudCache(ProjDictLike):
 
     def _fetch_from_service(self, foglio_id):
         """Esegue la chiamata HTTP, decodifica le entità HTML e fa il parsing."""
+        import requests  # Importato solo quando serve davvero interrogare il servizio
+
         params = {
             'username': self.username,
             'password': self.password,
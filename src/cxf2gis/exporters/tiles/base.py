@@ -0,0 +1,379 @@
+import datetime
+import gzip
+import json
+import math
+import os
+import sqlite3
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from pathlib import Path
+
+import numpy as np
+import shapely
+from pandas.api.types import is_numeric_dtype
+from shapely import STRtree
+
+from ..base import BaseExporter
+
+# Le tile vettoriali (MVT) sono sempre definite in Web Mercator
+WEB_MERCATOR = "EPSG:3857"
+ORIGIN_SHIFT = 20037508.342789244
+EARTH_RADIUS = 6378137.0
+EXTENT = 4096   # Risoluzione interna di una tile MVT
+BUFFER = 64     # Margine (in unità tile) per evitare artefatti ai bordi
+
+# Task inviati ai worker in blocchi; per worker restano in attesa al massimo PENDING_CHUNKS blocchi
+CHUNK_SIZE = 64
+PENDING_CHUNKS = 2
+
+# Layer del tileset -> (tabella merged di origine, filtro sulla classe del BORDO)
+TILE_LAYERS = {
+    'particelle': ('bordo', lambda gdf: gdf['classe'] != 'FABBRICATO'),
+    'fabbricati': ('bordo', lambda gdf: gdf['classe'] == 'FABBRICATO'),
+    'testo': ('testo', None),
+    'linee': ('linea', None),
+}
+
+
+def tile_bounds(z, x, y):
+    """Estensione in Web Mercator della tile XYZ (z, x, y)."""
+    size = 2 * ORIGIN_SHIFT / 2 ** z
+    minx = -ORIGIN_SHIFT + x * size
+    maxy = ORIGIN_SHIFT - y * size
+    return minx, maxy - size, minx + size, maxy
+
+
+def tile_range(bounds, z):
+    """Intervalli (x0, x1, y0, y1) delle tile XYZ che coprono un bbox in Web Mercator."""
+    n = 2 ** z
+    size = 2 * ORIGIN_SHIFT / n
+    minx, miny, maxx, maxy = bounds
+    x0 = max(0, int((minx + ORIGIN_SHIFT) // size))
+    x1 = min(n - 1, int((maxx + ORIGIN_SHIFT) // size))
+    y0 = max(0, int((ORIGIN_SHIFT - maxy) // size))
+    y1 = min(n - 1, int((ORIGIN_SHIFT - miny) // size))
+    return x0, x1, y0, y1
+
+
+def mercator_to_lonlat(x, y):
+    lon = x / ORIGIN_SHIFT * 180.0
+    lat = math.degrees(2 * math.atan(math.exp(y / EARTH_RADIUS)) - math.pi / 2)
+    return lon, lat
+
+
+def _import_mvt():
+    try:
+        import mapbox_vector_tile
+    except ImportError as error:
+        raise ImportError(
+            "L'export in tile vettoriali richiede 'mapbox-vector-tile': "
+            "pip install \"CXF2GIS[tiles]\""
+        ) from error
+    return mapbox_vector_tile
+
+
+def _encode_tiles(tasks):
+    """Codifica un blocco di tile nello stesso worker (riduce il costo di invio dei task)."""
+    return [_encode_tile(task) for task in tasks]
+
+
+def bounded_map(pool, function, tasks, max_pending, chunk_size=CHUNK_SIZE):
+    """
+    Come pool.map, ma i task vengono generati e inviati man mano: in attesa ci sono al
+    massimo max_pending blocchi di chunk_size task, quindi in memoria restano solo i
+    WKB e le proprietà delle tile in lavorazione. I risultati arrivano nell'ordine dei task.
+    """
+    tasks = iter(tasks)
+    pending = deque()
+    while True:
+        while len(pending) < max_pending:
+            chunk = list(islice(tasks, chunk_size))
+            if not chunk:
+                break
+            pending.append(pool.submit(function, chunk))
+        if not pending:
+            return
+        yield from pending.popleft().result()
+
+
+def _encode_tile(task):
+    """
+    Ritaglia, semplifica e codifica una singola tile MVT.
+    Eseguita nei processi worker: riceve solo WKB e proprietà delle feature
+    che intersecano la tile, mai l'intero GeoDataFrame.
+    """
+    z, x, y, layers = task
+    mapbox_vector_tile = _import_mvt()
+
+    bounds = tile_bounds(z, x, y)
+    pixel = (bounds[2] - bounds[0]) / EXTENT
+    clip_box = (
+        bounds[0] - BUFFER * pixel, bounds[1] - BUFFER * pixel,
+        bounds[2] + BUFFER * pixel, bounds[3] + BUFFER * pixel,
+    )
+
+    mvt_layers = []
+    for name, (wkbs, properties) in layers.items():
+        geoms = shapely.from_wkb(wkbs)
+        geoms = shapely.clip_by_rect(geoms, *clip_box)
+        # Semplificazione alla risoluzione del pixel: ai bassi zoom riduce drasticamente i vertici
+        geoms = shapely.simplify(geoms, pixel, preserve_topology=True)
+        features = [
+            {'geometry': geom, 'properties': props}
+            for geom, props in zip(geoms, properties)
+            if not geom.is_empty
+        ]
+        if features:
+            mvt_layers.append({'name': name, 'features': features})
+
+    if not mvt_layers:
+        return z, x, y, None
+
+    data = mapbox_vector_tile.encode(
+        mvt_layers,
+        default_options={'quantize_bounds': bounds, 'extents': EXTENT},
+    )
+    return z, x, y, gzip.compress(data)
+
+
+class VectorTilesExporter(BaseExporter):
+    """
+    Esportatore di tile vettoriali (Mapbox Vector Tiles) in un archivio
+    MBTiles o PMTiles, pronto per essere servito ai browser.
+    Il formato viene dedotto dall'estensione del file di output.
+    """
+
+    def __init__(self, output_path, min_zoom=12, max_zoom=18, max_workers=None):
+        self.output_path = Path(output_path)
+        self.min_zoom = min_zoom
+        self.max_zoom = max_zoom
+        self.max_workers = max_workers
+
+        suffix = self.output_path.suffix.lower()
+        if suffix not in ('.mbtiles', '.pmtiles'):
+            raise ValueError(f"Formato tile non supportato: '{suffix}' (usare .mbtiles o .pmtiles)")
+        self.tile_format = suffix.lstrip('.')
+
+        if not 0 <= min_zoom <= max_zoom <= 24:
+            raise ValueError(f"Intervallo di zoom non valido: {min_zoom}-{max_zoom}")
+
+    def prepare_output(self):
+        """Archivia un eventuale tileset preesistente, come avviene per il GeoPackage."""
+        if not self.output_path.exists():
+            return
+        archive_date = datetime.date.today().strftime("%Y_%m_%d")
+        archive_path = self.output_path.with_name(
+            f"{self.output_path.stem}_archived_{archive_date}{self.output_path.suffix}"
+        )
+        print(f"Archiviazione file '{self.output_path.name}' -> '{archive_path.name}'...")
+        if archive_path.exists():
+            archive_path.unlink()
+        self.output_path.rename(archive_path)
+
+    def _tile_layers(self, project):
+        """Costruisce i layer del tileset a partire dai layer merged riproiettati in Web Mercator."""
+        merged = dict(self._merge_sources(project.sources, WEB_MERCATOR))
+        layers = {}
+        for name, (table_name, selector) in TILE_LAYERS.items():
+            gdf = merged.get(table_name)
+            if gdf is None:
+                continue
+            if selector is not None:
+                gdf = gdf[selector(gdf)]
+            if gdf.empty:
+                continue
+
+            attributes = gdf.drop(columns=gdf.geometry.name)
+            # Le proprietà MVT accettano solo scalari: i NaN vengono omessi
+            properties = [
+                {k: v for k, v in row.items() if not (isinstance(v, float) and math.isnan(v))}
+                for row in attributes.to_dict(orient='records')
+            ]
+            geoms = np.asarray(gdf.geometry.values)
+            fields = {
+                col: 'Number' if is_numeric_dtype(attributes[col]) else 'String'
+                for col in attributes.columns
+            }
+            layers[name] = {
+                'tree': STRtree(geoms),
+                'wkb': shapely.to_wkb(geoms),
+                'properties': properties,
+                'bounds': shapely.total_bounds(geoms),
+                'fields': fields,
+            }
+        return layers
+
+    def _iter_tasks(self, layers, z):
+        """
+        Genera i task di una zoom: per ogni riga di tile interroga gli STRtree
+        con tutte le tile della riga in un'unica chiamata vettoriale.
+        """
+        all_bounds = np.array([layer['bounds'] for layer in layers.values()])
+        extent = (*all_bounds[:, :2].min(axis=0), *all_bounds[:, 2:].max(axis=0))
+        x0, x1, y0, y1 = tile_range(extent, z)
+        xs = np.arange(x0, x1 + 1)
+
+        for y in range(y0, y1 + 1):
+            boxes = shapely.box(*np.array([tile_bounds(z, x, y) for x in xs]).T)
+            tiles = {}
+            for name, layer in layers.items():
+                tile_idx, feat_idx = layer['tree'].query(boxes, predicate='intersects')
+                if not len(tile_idx):
+                    continue
+                order = np.argsort(tile_idx, kind='stable')
+                tile_idx, feat_idx = tile_idx[order], feat_idx[order]
+                splits = np.flatnonzero(np.diff(tile_idx)) + 1
+                for t_idx, f_idx in zip(np.split(tile_idx, splits), np.split(feat_idx, splits)):
+                    x = int(xs[t_idx[0]])
+                    tiles.setdefault(x, {})[name] = (
+                        layer['wkb'][f_idx],
+                        [layer['properties'][i] for i in f_idx],
+                    )
+            for x in sorted(tiles):
+                yield z, x, y, tiles[x]
+
+    def _metadata(self, layers):
+        all_bounds = np.array([layer['bounds'] for layer in layers.values()])
+        min_lon, min_lat = mercator_to_lonlat(*all_bounds[:, :2].min(axis=0))
+        max_lon, max_lat = mercator_to_lonlat(*all_bounds[:, 2:].max(axis=0))
+        vector_layers = [
+            {'id': name, 'fields': layer['fields'], 'minzoom': self.min_zoom, 'maxzoom': self.max_zoom}
+            for name, layer in layers.items()
+        ]
+        return {
+            'name': self.output_path.stem,
+            'format': 'pbf',
+            'type': 'overlay',
+            'generator': 'cxf2gis',
+            'minzoom': self.min_zoom,
+            'maxzoom': self.max_zoom,
+            'bounds': (min_lon, min_lat, max_lon, max_lat),
+            'center': ((min_lon + max_lon) / 2, (min_lat + max_lat) / 2, self.min_zoom),
+            'vector_layers': vector_layers,
+        }
+
+    def _write_mbtiles(self, tiles, metadata):
+        conn = sqlite3.connect(self.output_path)
+        try:
+            conn.executescript("""
+                CREATE TABLE metadata (name TEXT, value TEXT);
+                CREATE TABLE tiles (zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_data BLOB);
+            """)
+            count = 0
+            for z, x, y, data in tiles:
+                # MBTiles usa lo schema TMS: l'asse y è invertito rispetto a XYZ
+                conn.execute(
+                    "INSERT INTO tiles VALUES (?, ?, ?, ?)",
+                    (z, x, 2 ** z - 1 - y, data)
+                )
+                count += 1
+            conn.execute("CREATE UNIQUE INDEX tile_index ON tiles (zoom_level, tile_column, tile_row)")
+            rows = {
+                'name': metadata['name'],
+                'format': metadata['format'],
+                'type': metadata['type'],
+                'generator': metadata['generator'],
+                'minzoom': str(metadata['minzoom']),
+                'maxzoom': str(metadata['maxzoom']),
+                'bounds': ",".join(f"{v:.7f}" for v in metadata['bounds']),
+                'center': ",".join(str(v) for v in metadata['center']),
+                'json': json.dumps({'vector_layers': metadata['vector_layers']}),
+            }
+            conn.executemany("INSERT INTO metadata VALUES (?, ?)", rows.items())
+            conn.commit()
+        finally:
+            conn.close()
+        return count
+
+    def _write_pmtiles(self, tiles, metadata):
+        try:
+            from pmtiles.tile import zxy_to_tileid
+            from pmtiles.writer import Writer  # noqa: F401 (usato in _finalize_pmtiles)
+        except ImportError as error:
+            raise ImportError(
+                "L'export in PMTiles richiede il pacchetto 'pmtiles': pip install \"CXF2GIS[tiles]\""
+            ) from error
+
+        # Le tile arrivano per righe, non nell'ordine di Hilbert dei tile id: vengono
+        # appoggiate su una tabella SQLite temporanea e rilette ordinate, così l'archivio
+        # risulta clusterizzato senza tenere tutte le tile in memoria
+        with tempfile.TemporaryDirectory() as tmp:
+            staging = sqlite3.connect(os.path.join(tmp, "tiles.db"))
+            try:
+                staging.execute("CREATE TABLE tiles (tile_id INTEGER PRIMARY KEY, data BLOB)")
+                staging.executemany(
+                    "INSERT INTO tiles VALUES (?, ?)",
+                    ((zxy_to_tileid(z, x, y), data) for z, x, y, data in tiles)
+                )
+                staging.commit()
+                count = self._finalize_pmtiles(
+                    staging.execute("SELECT tile_id, data FROM tiles ORDER BY tile_id"), metadata
+                )
+            finally:
+                staging.close()
+        return count
+
+    def _finalize_pmtiles(self, tiles, metadata):
+        """Scrive l'archivio PMTiles da tile (tile_id, data) già ordinate per tile_id."""
+        from pmtiles.tile import Compression, TileType
+        from pmtiles.writer import Writer
+
+        count = 0
+        with open(self.output_path, 'wb') as f:
+            writer = Writer(f)
+            for tile_id, data in tiles:
+                writer.write_tile(tile_id, data)
+                count += 1
+            if not count:
+                raise RuntimeError("Nessuna tile generata: il PMTiles non può essere vuoto.")
+            min_lon, min_lat, max_lon, max_lat = metadata['bounds']
+            writer.finalize(
+                {
+                    'tile_type': TileType.MVT,
+                    'tile_compression': Compression.GZIP,
+                    'min_lon_e7': int(min_lon * 10_000_000),
+                    'min_lat_e7': int(min_lat * 10_000_000),
+                    'max_lon_e7': int(max_lon * 10_000_000),
+                    'max_lat_e7': int(max_lat * 10_000_000),
+                    'center_zoom': self.min_zoom,
+                },
+                {
+                    'name': metadata['name'],
+                    'generator': metadata['generator'],
+                    'vector_layers': metadata['vector_layers'],
+                },
+            )
+        return count
+
+    def export(self, project, target_epsg=None):
+        """
+        Genera il tileset. Il parametro target_epsg è ignorato: le tile MVT
+        sono sempre prodotte in Web Mercator (EPSG:3857).
+        """
+        _import_mvt()  # Fallisce subito se manca la dipendenza opzionale
+        self.prepare_output()
+
+        layers = self._tile_layers(project)
+        if not layers:
+            print("Nessun layer da esportare in tile.")
+            return
+
+        def tiles():
+            # Le tile vengono codificate in parallelo e scritte man mano dal processo principale
+            workers = self.max_workers or os.cpu_count() or 1
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                for z in range(self.min_zoom, self.max_zoom + 1):
+                    print(f"Generazione tile zoom {z}...")
+                    tasks = self._iter_tasks(layers, z)
+                    for z_, x, y, data in bounded_map(pool, _encode_tiles, tasks, workers * PENDING_CHUNKS):
+                        if data is not None:
+                            yield z_, x, y, data
+
+        metadata = self._metadata(layers)
+        if self.tile_format == 'mbtiles':
+            count = self._write_mbtiles(tiles(), metadata)
+        else:
+            count = self._write_pmtiles(tiles(), metadata)
+        print(f"Scritte {count} tile in {self.output_path.name}")
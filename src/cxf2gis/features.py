@@ -0,0 +1,90 @@
+from functools import lru_cache
+from typing import NamedTuple, Optional
+
+import numpy as np
+import shapely
+from pyproj import CRS, Transformer
+
+# Campo usato come codice della feature per ciascun layer (None: nessun codice)
+CODE_FIELDS = {'BORDO': 'codice', 'SIMBOLO': 'codice_simbolo', 'FIDUCIALE': 'id_fid'}
+
+LAYERS = ('BORDO', 'TESTO', 'SIMBOLO', 'FIDUCIALE', 'LINEA')
+
+
+class FeatureRecord(NamedTuple):
+    """Feature in forma compatta: chiave catastale, geometria WKB e attributi residui."""
+    layer: str
+    comune: str
+    sezione: str
+    foglio: str
+    allegato: str
+    codice: Optional[str]
+    wkb: bytes
+    attributes: dict
+
+
+@lru_cache(maxsize=16)
+def _transformer(source_crs, target_crs):
+    """Transformer tra due CRS (None se coincidono), creato una sola volta per coppia."""
+    source, target = CRS.from_user_input(source_crs), CRS.from_user_input(target_crs)
+    if source == target:
+        return None
+    return Transformer.from_crs(source, target, always_xy=True)
+
+
+def _reproject(geoms, source_crs, target_crs):
+    """Riproietta in blocco un array di geometrie shapely."""
+    transformer = None if target_crs is None else _transformer(source_crs, str(target_crs))
+    if transformer is None:
+        return geoms
+    return shapely.transform(geoms, lambda coords: np.column_stack(transformer.transform(coords[:, 0], coords[:, 1])))
+
+
+def _flush(pending, target_crs):
+    """Converte un lotto di (sorgente, layer, record) in FeatureRecord, riproiettando per CRS."""
+    geoms = np.array([data['geometry'] for _, _, data in pending], dtype=object)
+    crs_of = np.array([str(source.input_epsg) for source, _, _ in pending], dtype=object)
+    for crs in np.unique(crs_of):
+        mask = crs_of == crs
+        geoms[mask] = _reproject(geoms[mask], crs, target_crs)
+    wkbs = shapely.to_wkb(geoms, output_dimension=2)
+
+    records = []
+    for (source, layer, data), wkb in zip(pending, wkbs):
+        meta = source.meta
+        code_field = CODE_FIELDS.get(layer)
+        attributes = {
+            k: v for k, v in data.items()
+            if k not in ('geometry', 'comune', 'foglio', 'sezione', 'allegato', code_field)
+        }
+        records.append(FeatureRecord(
+            layer.lower(), meta['comune'], meta['sezione'], meta['foglio'], meta['allegato'],
+            data.get(code_field) if code_field else None, wkb, attributes
+        ))
+    return records
+
+
+def iter_features(sources, layers=None, target_crs=None, batch_size=10_000):
+    """
+    Genera lotti (liste) di FeatureRecord leggendo le sorgenti una alla volta,
+    senza costruire GeoDataFrame né conservare i record sulle sorgenti: la memoria
+    occupata dipende da batch_size e dal singolo file, non dalla dimensione del progetto.
+
+    :param layers: Layer da includere (es. ['bordo', 'testo']); default tutti.
+    :param target_crs: CRS delle geometrie prodotte; None per lasciarle nel CRS di origine.
+    """
+    wanted = {layer.upper() for layer in (layers or LAYERS)}
+    unknown = wanted - set(LAYERS)
+    if unknown:
+        raise ValueError(f"Layer non validi: {', '.join(sorted(unknown))} (ammessi: {', '.join(LAYERS)})")
+    exclude = [layer for layer in LAYERS if layer not in wanted]
+
+    pending = []
+    for source in sources:
+        for layer, data in source.iter_records(exclude_types=[*source.exclude_types, *exclude]):
+            pending.append((source, layer, data))
+            if len(pending) >= batch_size:
+                yield _flush(pending, target_crs)
+                pending = []
+    if pending:
+        yield _flush(pending, target_crs)
@@ -0,0 +1,154 @@
+import numpy as np
+import shapely
+from shapely import STRtree
+
+# Chiave univoca di una particella nel catasto
+PARCEL_KEY = ['comune', 'sezione', 'foglio', 'allegato', 'codice']
+# Chiave ridotta per le ricerche senza sezione/allegato
+SHORT_KEY = ['comune', 'foglio', 'codice']
+
+
+def normalize_foglio(foglio):
+    """Normalizza il numero di foglio come in CXFSource._decripta_nome_file (es: '0001' -> '1')."""
+    try:
+        return str(int(foglio))
+    except (TypeError, ValueError):
+        return str(foglio)
+
+
+class CXFIndex:
+    """
+    Indice in memoria sui layer merged di un progetto (o di un export già scritto).
+
+    - Indice hash sulla chiave (comune, sezione, foglio, allegato, codice) del layer 'bordo';
+    - STRtree per layer, costruito solo alla prima interrogazione spaziale.
+
+    Tutte le geometrie dei layer devono condividere lo stesso CRS, che è anche
+    il CRS atteso per le coordinate delle interrogazioni.
+    """
+
+    def __init__(self, layers: dict):
+        """
+        :param layers: Dizionario {nome_tabella: GeoDataFrame}, es. l'output di merge_layers.
+        """
+        self.layers = {name.lower(): gdf.reset_index(drop=True) for name, gdf in layers.items()}
+        self._trees = {}
+        self._key_index = None
+        self._short_index = None
+
+    @classmethod
+    def from_geopackage(cls, path):
+        """Carica in memoria tutti i layer geometrici di un GeoPackage prodotto da CXF2GIS."""
+        import pyogrio
+        import geopandas as gpd
+
+        layers = {}
+        for name, geometry_type in pyogrio.list_layers(path):
+            if geometry_type is None:
+                continue  # Tabelle non spaziali (es. cxf_metadata)
+            layers[name] = gpd.read_file(path, layer=name, engine='pyogrio')
+        if not layers:
+            raise ValueError(f"Nessun layer geometrico trovato in {path}")
+        return cls(layers)
+
+    def _layer(self, layer):
+        try:
+            return self.layers[layer.lower()]
+        except KeyError:
+            raise KeyError(f"Layer '{layer}' non presente nell'indice (disponibili: {', '.join(self.layers)})")
+
+    def tree(self, layer='bordo'):
+        """Restituisce (costruendolo alla prima richiesta) lo STRtree del layer."""
+        layer = layer.lower()
+        if layer not in self._trees:
+            self._trees[layer] = STRtree(np.asarray(self._layer(layer).geometry.values))
+        return self._trees[layer]
+
+    def build(self):
+        """Costruisce subito indice chiave e STRtree di tutti i layer (es. prima di servire richieste)."""
+        if 'bordo' in self.layers:
+            self._build_key_index()
+        for layer in self.layers:
+            self.tree(layer)
+        return self
+
+    def _build_key_index(self):
+        bordo = self._layer('bordo')
+        # groupby(...).indices costruisce l'intero dizionario chiave -> posizioni in un'unica passata
+        self._key_index = bordo.groupby(PARCEL_KEY, sort=False, dropna=False).indices
+        self._short_index = bordo.groupby(SHORT_KEY, sort=False, dropna=False).indices
+
+    def find(self, comune, foglio, codice, sezione=None, allegato=None):
+        """
+        Cerca una particella per chiave catastale.
+        Se sezione o allegato non sono indicati la ricerca avviene sulla chiave ridotta
+        (comune, foglio, codice) e può restituire più righe.
+        """
+        if self._key_index is None:
+            self._build_key_index()
+
+        comune, foglio, codice = str(comune).upper(), normalize_foglio(foglio), str(codice)
+        if sezione is None or allegato is None:
+            positions = self._short_index.get((comune, foglio, codice), [])
+            bordo = self._layer('bordo').iloc[positions]
+            if sezione is not None:
+                bordo = bordo[bordo['sezione'] == sezione]
+            if allegato is not None:
+                bordo = bordo[bordo['allegato'] == allegato]
+            return bordo
+
+        positions = self._key_index.get((comune, sezione, foglio, allegato, codice), [])
+        return self._layer('bordo').iloc[positions]
+
+    def find_many(self, keys):
+        """
+        Ricerca massiva per chiave completa.
+        :param keys: Iterabile di tuple (comune, sezione, foglio, allegato, codice).
+        :return: GeoDataFrame con una colonna 'indice_chiave' che rimanda alla posizione in keys.
+        """
+        if self._key_index is None:
+            self._build_key_index()
+
+        query_idx, positions = [], []
+        for i, (comune, sezione, foglio, allegato, codice) in enumerate(keys):
+            found = self._key_index.get(
+                (str(comune).upper(), sezione, normalize_foglio(foglio), allegato, str(codice)), []
+            )
+            query_idx.extend([i] * len(found))
+            positions.extend(found)
+
+        result = self._layer('bordo').iloc[positions].copy()
+        result.insert(0, 'indice_chiave', np.asarray(query_idx, dtype=np.int64))
+        return result
+
+    def at_points(self, points, layer='bordo'):
+        """
+        Point-in-parcel vettoriale: restituisce le feature del layer che contengono ciascun punto.
+        :param points: Array di geometrie Point oppure array Nx2 di coordinate.
+        :return: GeoDataFrame con una colonna 'indice_punto' (posizione del punto in input).
+        """
+        points = np.asarray(points)
+        if points.dtype != object:
+            points = shapely.points(points)
+        point_idx, feat_idx = self.tree(layer).query(points, predicate='within')
+
+        result = self._layer(layer).iloc[feat_idx].copy()
+        result.insert(0, 'indice_punto', point_idx)
+        return result
+
+    def in_bbox(self, bbox, layer='bordo', predicate='intersects'):
+        """
+        Interroga il layer con uno o più bbox (minx, miny, maxx, maxy).
+        :param bbox: Tupla singola oppure array Nx4 di bbox.
+        :return: GeoDataFrame; con più bbox include la colonna 'indice_bbox'.
+        """
+        bbox = np.asarray(bbox, dtype=float)
+        single = bbox.ndim == 1
+        boxes = shapely.box(*np.atleast_2d(bbox).T)
+        box_idx, feat_idx = self.tree(layer).query(boxes, predicate=predicate)
+
+        if single:
+            return self._layer(layer).iloc[np.sort(feat_idx)]
+        result = self._layer(layer).iloc[feat_idx].copy()
+        result.insert(0, 'indice_bbox', box_idx)
+        return result
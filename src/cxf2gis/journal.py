@@ -0,0 +1,111 @@
+import json
+import os
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+
+
+class RunJournal:
+    """
+    Giornale di avanzamento di un'esecuzione a lotti, salvato in un piccolo file SQLite.
+
+    Ogni lotto viene registrato all'avvio insieme alle sue sorgenti e a uno stato fornito
+    dall'esportatore (es. l'ultimo fid di ciascuna tabella) e marcato come completato,
+    insieme alle sue sorgenti, in un'unica transazione dopo il commit dei dati. In ripresa
+    le sorgenti completate vengono saltate e i lotti rimasti a metà possono essere annullati
+    oppure, se l'esportatore ne conferma il commit, completati (vedi batch_sources).
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.conn = sqlite3.connect(self.path)
+        with self.conn:
+            self.conn.executescript("""
+                CREATE TABLE IF NOT EXISTS lotti (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    avviato TEXT NOT NULL,
+                    completato TEXT,
+                    stato TEXT,
+                    sorgenti_lotto TEXT
+                );
+                CREATE TABLE IF NOT EXISTS sorgenti (
+                    path TEXT PRIMARY KEY,
+                    dimensione INTEGER,
+                    lotto INTEGER REFERENCES lotti(id),
+                    completato TEXT NOT NULL
+                );
+            """)
+            # Giornali creati da versioni precedenti, senza l'elenco delle sorgenti del lotto
+            columns = {row[1] for row in self.conn.execute("PRAGMA table_info(lotti)")}
+            if 'sorgenti_lotto' not in columns:
+                self.conn.execute("ALTER TABLE lotti ADD COLUMN sorgenti_lotto TEXT")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    def reset(self):
+        """Azzera il giornale per una nuova esecuzione completa."""
+        with self.conn:
+            self.conn.execute("DELETE FROM sorgenti")
+            self.conn.execute("DELETE FROM lotti")
+
+    def has_progress(self):
+        """Vero se esiste almeno un lotto registrato (completato o meno)."""
+        return self.conn.execute("SELECT EXISTS (SELECT 1 FROM lotti)").fetchone()[0] == 1
+
+    def completed_sources(self):
+        return {row[0] for row in self.conn.execute("SELECT path FROM sorgenti")}
+
+    def start_batch(self, state=None, paths=None):
+        """Registra l'avvio di un lotto con le sue sorgenti e lo stato di ripristino dell'esportatore."""
+        with self.conn:
+            cursor = self.conn.execute(
+                "INSERT INTO lotti (avviato, stato, sorgenti_lotto) VALUES (?, ?, ?)",
+                (
+                    datetime.now().isoformat(),
+                    json.dumps(state) if state is not None else None,
+                    json.dumps([str(path) for path in paths]) if paths is not None else None,
+                )
+            )
+        return cursor.lastrowid
+
+    def batch_sources(self, batch_id):
+        """Sorgenti registrate all'avvio del lotto (lista vuota se non note)."""
+        row = self.conn.execute("SELECT sorgenti_lotto FROM lotti WHERE id = ?", (batch_id,)).fetchone()
+        return json.loads(row[0]) if row and row[0] else []
+
+    def complete_batch(self, batch_id, paths):
+        """Marca come completati il lotto e tutte le sue sorgenti in un'unica transazione."""
+        now = datetime.now().isoformat()
+        rows = []
+        for path in paths:
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                size = None
+            rows.append((str(path), size, batch_id, now))
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO sorgenti (path, dimensione, lotto, completato) VALUES (?, ?, ?, ?)",
+                rows
+            )
+            self.conn.execute("UPDATE lotti SET completato = ? WHERE id = ?", (now, batch_id))
+
+    def incomplete_batches(self):
+        """Lotti avviati ma mai completati, con il relativo stato di ripristino."""
+        return [
+            (batch_id, json.loads(state) if state else None)
+            for batch_id, state in self.conn.execute(
+                "SELECT id, stato FROM lotti WHERE completato IS NULL ORDER BY id"
+            )
+        ]
+
+    def discard_batch(self, batch_id):
+        with self.conn:
+            self.conn.execute("DELETE FROM lotti WHERE id = ?", (batch_id,))
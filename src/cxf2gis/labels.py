@@ -0,0 +1,114 @@
+import numpy as np
+import shapely
+from shapely import STRtree
+
+# Layer puntuali associati alle particelle e colonna di conteggio scritta sul BORDO
+POINT_LAYERS = {'TESTO': 'n_testi', 'SIMBOLO': 'n_simboli'}
+
+# Colonna dei layer puntuali con il codice della particella che li contiene
+PARCEL_COLUMN = 'codice_particella'
+
+# Classi del BORDO usate come contenitore solo se nessun altro poligono contiene il punto:
+# il testo di una particella non va attribuito al fabbricato disegnato al suo interno
+FALLBACK_CLASSES = ('FABBRICATO',)
+
+# Priorità dei contenitori (minore = preferito): particelle, fabbricati, poligoni che
+# racchiudono altre particelle (es. bordo del foglio o dell'allegato)
+RANK_PARCEL, RANK_FALLBACK, RANK_ENCLOSING = 0, 1, 2
+
+
+def containing_polygons(points, polygons, rank=None):
+    """
+    Per ogni punto restituisce l'indice del poligono contenitore preferito (-1 se nessuno).
+
+    Le coppie punto/poligono sono estratte con un'unica interrogazione STRtree
+    (predicate 'within'). Tra più contenitori si sceglie quello di rank minore e,
+    a parità di rank, quello di area minore (es. particella piuttosto che il bordo di foglio).
+
+    :param rank: Priorità intera per poligono (default: tutti uguali).
+    """
+    result = np.full(len(points), -1, dtype=np.intp)
+    if not len(points) or not len(polygons):
+        return result
+
+    point_idx, polygon_idx = STRtree(polygons).query(points, predicate='within')
+    if not len(point_idx):
+        return result
+
+    # Ordinamento per punto, rank e area crescenti: il primo di ogni gruppo è il contenitore scelto
+    rank = np.zeros(len(polygons), dtype=np.int64) if rank is None else np.asarray(rank)
+    order = np.lexsort((shapely.area(polygons)[polygon_idx], rank[polygon_idx], point_idx))
+    point_idx, polygon_idx = point_idx[order], polygon_idx[order]
+    first = np.flatnonzero(np.r_[True, point_idx[1:] != point_idx[:-1]])
+    result[point_idx[first]] = polygon_idx[first]
+    return result
+
+
+def container_rank(bordo):
+    """
+    Rank di ciascun poligono del BORDO per containing_polygons.
+
+    I poligoni che contengono altre particelle (non FALLBACK_CLASSES) sono scelti per ultimi,
+    dopo i fabbricati: un punto in un fabbricato interno al solo bordo di foglio va al fabbricato.
+    """
+    polygons = np.asarray(bordo.geometry.values)
+    rank = np.full(len(polygons), RANK_PARCEL, dtype=np.int64)
+    if 'classe' in bordo:
+        rank[bordo['classe'].isin(FALLBACK_CLASSES).to_numpy()] = RANK_FALLBACK
+    parcels = np.flatnonzero(rank == RANK_PARCEL)
+    if len(parcels) < 2:
+        return rank
+
+    # Coppie contenitore/contenuto tra particelle, esclusi il poligono stesso e i duplicati esatti
+    outer, inner = STRtree(polygons[parcels]).query(polygons[parcels], predicate='contains')
+    nested = (outer != inner) & ~shapely.equals(polygons[parcels][outer], polygons[parcels][inner])
+    rank[parcels[np.unique(outer[nested])]] = RANK_ENCLOSING
+    return rank
+
+
+def associate_labels(layers):
+    """
+    Collega i punti TESTO e SIMBOLO di una sorgente alle particelle del layer BORDO.
+
+    Sui layer puntuali viene scritta la chiave della particella (codice_particella,
+    più sezione e allegato se assenti), sul BORDO il numero di testi e simboli contenuti.
+    I fabbricati (FALLBACK_CLASSES) sono scelti solo se nessuna particella contiene il punto,
+    i poligoni che racchiudono altre particelle solo in assenza di entrambi (vedi container_rank).
+    Le colonne sono sempre create, così ogni lotto di un export ha lo stesso schema.
+
+    :return: (layers arricchiti, statistiche)
+    """
+    layers = dict(layers)
+    bordo = layers.get('BORDO')
+    polygons = np.asarray(bordo.geometry.values) if bordo is not None else np.empty(0, dtype=object)
+    rank = container_rank(bordo) if bordo is not None else None
+    stats = {}
+
+    counts = {}
+    for layer_name, count_column in POINT_LAYERS.items():
+        gdf = layers.get(layer_name)
+        if gdf is None or gdf.empty:
+            counts[count_column] = np.zeros(len(polygons), dtype=np.int64)
+            continue
+
+        match = containing_polygons(np.asarray(gdf.geometry.values), polygons, rank=rank)
+        found = match >= 0
+        gdf = gdf.copy()
+        codici = np.full(len(gdf), None, dtype=object)
+        if bordo is not None:
+            codici[found] = bordo['codice'].to_numpy()[match[found]]
+        for key in ('sezione', 'allegato'):
+            if key not in gdf:
+                # Costanti per sorgente: valgono anche per i punti non associati (None senza BORDO)
+                has_value = bordo is not None and key in bordo and len(bordo)
+                gdf[key] = bordo[key].iloc[0] if has_value else None
+        gdf[PARCEL_COLUMN] = codici
+        layers[layer_name] = gdf
+
+        counts[count_column] = np.bincount(match[found], minlength=len(polygons))
+        stats[f"{layer_name.lower()}_associati"] = int(found.sum())
+        stats[f"{layer_name.lower()}_non_associati"] = int((~found).sum())
+
+    if bordo is not None:
+        layers['BORDO'] = bordo.assign(**counts)
+    return layers, stats
@@ -1,22 +1,52 @@
 import os
+import time
+from functools import lru_cache
+from pathlib import Path
 import geopandas as gpd
 import pandas as pd
 from shapely.geometry import Polygon, Point, LineString
 
 from .comuni.base import ComuniManager
+from .discovery import decripta_nome_file
+from .exporters.projtools.prgcloud import ProjDictLike
+from .validation import validate_layers
+from .labels import associate_labels
+from .catalog import summarize_layers
 
 # Inizializzazione
 mgr = ComuniManager()
-mgr.update_cache()
+
+
+@lru_cache(maxsize=1)
+def _comuni_dataframe():
+    # La cache dei comuni viene aggiornata al primo utilizzo (extra_info), non all'import del modulo
+    try:
+        mgr.update_cache()
+    except Exception as error:
+        if not mgr.cache_path.exists():
+            raise
+        print(f"Aggiornamento tabella comuni non riuscito, uso la cache locale: {error}")
+    return mgr.get_all_as_dataframe()
+
+def parse_layers(source):
+    """
+    Funzione per i processi worker: esegue il parsing e restituisce solo i layer,
+    da riassegnare (con il tempo di parsing) alla sorgente del processo principale con set_parse_result.
+    """
+    source.parse()
+    return source.layers, source.parse_time
 
 class CXFSource:
 
-    def __init__(self, file_path, input_epsg="EPSG:6707", exclude_types=None, extra_info=False):
+    def __init__(self, file_path, input_epsg="EPSG:6707", exclude_types=None, extra_info=False, sup_path=None):
 
         self.file_path = file_path
+        self.sup_path = sup_path
         self.meta = self._decripta_nome_file(file_path)
 
         self.exclude_types = exclude_types or []
+        # Può essere un CRS o un ProjDictLike (es. PRGCloud): in quel caso
+        # la risoluzione avviene al parsing, non alla creazione della sorgente
         self.input_epsg = input_epsg
         # Contenitori per i diversi tipi di geometria
         self.layers = {
@@ -26,33 +56,35 @@ class CXFSource:
             'FIDUCIALE': [], # Punti fiduciali
             'LINEA': []    # Linee (archi, bordi di foglio, ecc.)
         }
-        
+        # Report delle geometrie invalide (popolato da validate)
+        self.invalid_geometries = None
+        # Statistiche di elaborazione della sorgente
+        self.stats = {}
+        # Durata del parsing in secondi, riportata nel layer catalogo (vedi summarize)
+        self.parse_time = None
+
+        # La tabella comuni (CSV ISTAT) viene caricata solo al parsing
+        self.extra_info = extra_info
         self.df_comuni = None
-        # Caricamento opzionale della tabella comuni (CSV ISTAT)
-        try:
-            assert extra_info is True
-            self.df_comuni = mgr.get_all_as_dataframe()
-        except AssertionError:
-            pass
-        except Exception as error:
-            print(f"Errore caricamento tabella comuni: {error}")
 
     def _decripta_nome_file(self, filename):
         """ Estrae Comune, Sezione, Foglio e Allegato dal nome standard C660A000100 del file CXF """
-        name = os.path.splitext(os.path.basename(filename))[0].upper()
-        meta = {
-            'comune': name[0:4],
-            'sezione': name[4:5] if len(name) > 4 else '',
-            'foglio': name[5:9] if len(name) >= 9 else '0',
-            'allegato': name[9:11] if len(name) >= 11 else '00',
-            'file_nome': filename
-        }
-        # Pulizia zeri iniziali per il foglio (es: 0001 -> 1)
+        return decripta_nome_file(filename)
+
+    def _load_comuni(self):
+        """Caricamento opzionale della tabella comuni, condivisa tra le sorgenti dello stesso processo."""
+        if self.extra_info is not True or self.df_comuni is not None:
+            return
         try:
-            meta['foglio'] = str(int(meta['foglio']))
-        except: pass
+            self.df_comuni = _comuni_dataframe()
+        except Exception as error:
+            print(f"Errore caricamento tabella comuni: {error}")
 
-        return meta
+    def _resolve_crs(self):
+        """Risolve il CRS di input quando è stato dichiarato tramite un ProjDictLike."""
+        if isinstance(self.input_epsg, ProjDictLike):
+            self.input_epsg = self.input_epsg[Path(self.file_path).stem]['proj4']
+        return self.input_epsg
 
     def _sup2gdf(self, file_path):
         """
@@ -60,10 +92,12 @@ class CXFSource:
         Ritorna un DataFrame con colonne ['codice', 'area_sup']
         """
         # Il file SUP ha solitamente lo stesso base-name del CXF
-        base_path = os.path.splitext(file_path)[0]
-        sup_path = base_path + ".SUP"
-        
-        if not os.path.exists(sup_path):
+        sup_path = self.sup_path
+        if sup_path is None:
+            base_path = os.path.splitext(file_path)[0]
+            sup_path = next((base_path + ext for ext in (".SUP", ".sup") if os.path.exists(base_path + ext)), None)
+
+        if sup_path is None or not os.path.exists(sup_path):
             # print(f"Nota: File SUP non trovato in {sup_path}. Procedo senza dati di superficie.")
             return None
 
@@ -84,42 +118,57 @@ class CXFSource:
         
         return pd.DataFrame(records)
 
-    def _parse(self):
-        # for file_cxf in self.files_to_process:
-            
+    def iter_records(self, exclude_types=None):
+        """
+        Legge il file CXF e genera coppie (nome_layer, record) senza accumularle:
+        è la base sia del parsing in GeoDataFrame sia dell'iterazione in streaming
+        (vedi features.iter_features). Gli elementi in exclude_types vengono saltati.
+        """
+        self._resolve_crs()
+        exclude_types = self.exclude_types if exclude_types is None else exclude_types
+
         df_sup = self._sup2gdf(self.file_path)
         meta = self.meta
-        
+
         with open(self.file_path, 'r', encoding='latin-1') as f:
             lines = [line.strip() for line in f if line.strip()]
 
+        handlers = {
+            "BORDO": lambda i: self._handle_bordo(lines, i, df_sup, meta),
+            "TESTO": lambda i: self._handle_testo(lines, i, meta),
+            "SIMBOLO": lambda i: self._handle_simbolo(lines, i, meta),
+            "FIDUCIALE": lambda i: self._handle_fiduciale(lines, i, meta),
+            "LINEA": lambda i: self._handle_linea(lines, i, meta),
+        }
         i = 0
         while i < len(lines):
             tag = lines[i]
 
             # Salto l'elemento se incluso nella lista di esclusione
-            if tag in self.exclude_types:
+            if tag in exclude_types or tag not in handlers:
                 i += 1
                 continue
 
-            if tag == "BORDO":
-                i = self._handle_bordo(lines, i, df_sup, meta)
-            elif tag == "TESTO":
-                i = self._handle_testo(lines, i, meta)
-            elif tag == "SIMBOLO":
-                i = self._handle_simbolo(lines, i, meta)
-            elif tag == "FIDUCIALE":
-                i = self._handle_fiduciale(lines, i, meta)
-            elif tag == "LINEA":
-                i = self._handle_linea(lines, i, meta)
-            else:
-                i += 1
+            data, i = handlers[tag](i)
+            yield tag, data
+
+    def _parse(self):
+        start = time.perf_counter()
+        self._load_comuni()
+        for layer_name, data in self.iter_records():
+            self.layers[layer_name].append(data)
 
         # Dopo il parsing, trasformiamo le liste in GeoDataFrame riproiettati
         self._finalize_layers()
+        self.parse_time = time.perf_counter() - start
 
     parse = _parse  # Alias pubblico
 
+    def set_parse_result(self, layers, parse_time=None):
+        """Applica i layer (e il tempo di parsing) prodotti da parse_layers in un processo worker."""
+        self.layers = layers
+        self.parse_time = parse_time
+
     def _finalize_layers(self):
         """ 
         Converte le liste di dizionari in GeoDataFrames, 
@@ -149,6 +198,45 @@ class CXFSource:
             
             self.layers[layer_name] = gdf
 
+    @property
+    def parsed(self):
+        """Vero dopo il parsing (i layer non sono più liste di record)."""
+        return not any(isinstance(data, list) for data in self.layers.values())
+
+    def summarize(self):
+        """
+        Riga del layer catalogo calcolata sui layer attuali, quindi dopo deduplicazione,
+        validazione e collegamento delle etichette (vedi catalog.summarize_layers).
+        """
+        crs = next((gdf.crs for gdf in self.layers.values() if gdf is not None), self.input_epsg)
+        return summarize_layers(self.meta, self.file_path, self.layers, crs, self.parse_time or 0.0)
+
+    def release(self):
+        """Libera i GeoDataFrame dopo la scrittura, mantenendo metadati e statistiche."""
+        self.layers = {layer_name: None for layer_name in self.layers}
+        self.invalid_geometries = None
+
+    def validate(self):
+        """
+        Verifica e ripara le geometrie dei layer già finalizzati.
+        Le geometrie invalide originali restano disponibili in self.invalid_geometries.
+        """
+        layers, report, stats = validate_layers(self.layers)
+        self.set_validation_result(layers, report, stats)
+        return stats
+
+    def set_validation_result(self, layers, report, stats):
+        """Applica il risultato di validate_layers (anche se calcolato in un altro processo)."""
+        self.layers = layers
+        self.invalid_geometries = report
+        self.stats.update(stats)
+
+    def associate_labels(self):
+        """Collega testi e simboli alle particelle che li contengono (vedi labels.associate_labels)."""
+        self.layers, stats = associate_labels(self.layers)
+        self.stats.update(stats)
+        return stats
+
     def _handle_bordo(self, lines, i, df_sup, meta):
         codice = lines[i+1]
         num_isole = int(lines[i+8])
@@ -176,46 +264,48 @@ class CXFSource:
             'sezione': meta['sezione'], 'allegato': meta['allegato']
         }
         
+        # Colonne sempre presenti: gli export a lotti richiedono lo stesso schema per ogni lotto
+        data['area_nominale'] = float('nan')
+        data['area_grafica'] = float('nan')
         if df_sup is not None:
             sup_match = df_sup[df_sup['codice'] == codice]
             if not sup_match.empty:
                 data['area_nominale'] = sup_match.iloc[0]['area_nominale']
                 data['area_grafica'] = geom.area
 
-        self.layers['BORDO'].append(data)
-        return cursor
+        return data, cursor
 
     def _handle_testo(self, lines, i, meta):
-        self.layers['TESTO'].append({
+        data = {
             'geometry': Point(float(lines[i+4]), float(lines[i+5])),
             'testo': lines[i+1], 
             'angolo': float(lines[i+3]),
             'foglio': meta['foglio'],
             'comune': meta['comune']  # <-- AGGIUNGI QUESTO
-        })
-        return i + 8
+        }
+        return data, i + 8
 
     def _handle_simbolo(self, lines, i, meta):
         cod = lines[i+1]
-        self.layers['SIMBOLO'].append({
+        data = {
             'geometry': Point(float(lines[i+3]), float(lines[i+4])),
             'codice_simbolo': cod,
             'angolo': float(lines[i+2]),
             'foglio': meta['foglio'],
             'comune': meta['comune']  # <-- AGGIUNGI QUESTO
-        })
-        return i + 6
+        }
+        return data, i + 6
 
     def _handle_fiduciale(self, lines, i, meta):
-        self.layers['FIDUCIALE'].append({
+        data = {
             'geometry': Point(float(lines[i+3]), float(lines[i+4])),
             'id_fid': lines[i+1], 'foglio': meta['foglio']
-        })
-        return i + 5
+        }
+        return data, i + 5
 
     def _handle_linea(self, lines, i, meta):
         num_v = int(lines[i+2])
         cursor = i + 3
         coords = [(float(lines[cursor+j*2]), float(lines[cursor+j*2+1])) for j in range(num_v)]
-        self.layers['LINEA'].append({'geometry': LineString(coords), 'foglio': meta['foglio']})
-        return cursor + (num_v * 2)
\ No newline at end of file
+        data = {'geometry': LineString(coords), 'foglio': meta['foglio']}
+        return data, cursor + (num_v * 2)
\ No newline at end of file
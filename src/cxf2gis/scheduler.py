@@ -0,0 +1,96 @@
+import os
+
+# Stima iniziale: byte di memoria occupati dai layer parsati per byte di file CXF
+DEFAULT_BYTES_PER_BYTE = 10.0
+# Occupazione approssimativa di una geometria GEOS oltre alle coordinate
+GEOMETRY_OVERHEAD = 120
+
+
+def parse_memory(value):
+    """Converte una dimensione come '512M', '4G' o '1500000' in byte."""
+    units = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+    value = str(value).strip().upper().removesuffix('B')
+    if value and value[-1] in units:
+        return int(float(value[:-1]) * units[value[-1]])
+    return int(value)
+
+
+def measure_source_memory(source):
+    """
+    Memoria effettivamente occupata dai layer di una sorgente parsata: colonne
+    (memory_usage deep) più coordinate e overhead delle geometrie GEOS, che
+    pandas non conteggia.
+    """
+    import numpy as np
+    import shapely
+
+    total = 0
+    for gdf in source.layers.values():
+        if gdf is None or isinstance(gdf, list) or gdf.empty:
+            continue
+        total += int(gdf.drop(columns=gdf.geometry.name).memory_usage(deep=True).sum())
+        geoms = np.asarray(gdf.geometry.values)
+        total += int(shapely.count_coordinates(geoms)) * 16 + len(geoms) * GEOMETRY_OVERHEAD
+    return total
+
+
+class MemoryScheduler:
+    """
+    Raggruppa le sorgenti in lotti la cui memoria stimata resta sotto `memory_limit`.
+
+    La stima parte dalla dimensione del file CXF moltiplicata per un fattore che
+    viene ricalibrato (media mobile esponenziale) dopo ogni lotto, misurando i
+    layer realmente prodotti. I lotti sono composti a partire dalle sorgenti più
+    grandi (first-fit decreasing), così i fogli urbani più densi non restano in coda.
+    """
+
+    def __init__(self, memory_limit, bytes_per_byte=DEFAULT_BYTES_PER_BYTE, smoothing=0.5):
+        self.memory_limit = parse_memory(memory_limit)
+        self.bytes_per_byte = bytes_per_byte
+        self.smoothing = smoothing
+        # Dimensione dei file per percorso: ogni file viene interrogato (stat) una sola volta
+        self._sizes = {}
+
+    def _file_size(self, source):
+        path = str(source.file_path)
+        size = self._sizes.get(path)
+        if size is None:
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                size = 0
+            self._sizes[path] = size
+        return size
+
+    def estimate(self, source):
+        return int(self._file_size(source) * self.bytes_per_byte)
+
+    def calibrate(self, sources):
+        """Aggiorna il fattore di stima con la memoria misurata di un lotto appena parsato."""
+        file_bytes = sum(self._file_size(s) for s in sources)
+        if not file_bytes:
+            return self.bytes_per_byte
+        measured = sum(measure_source_memory(s) for s in sources) / file_bytes
+        self.bytes_per_byte = (1 - self.smoothing) * self.bytes_per_byte + self.smoothing * measured
+        return self.bytes_per_byte
+
+    def batches(self, sources):
+        """
+        Generatore di lotti. Ogni lotto viene composto solo quando richiesto,
+        quindi sfrutta la calibrazione effettuata sui lotti precedenti.
+        """
+        remaining = sorted(sources, key=self._file_size, reverse=True)
+        while remaining:
+            batch, budget, skipped = [], self.memory_limit, []
+            for source in remaining:
+                estimate = self.estimate(source)
+                if estimate <= budget or not batch:
+                    if estimate > self.memory_limit:
+                        print(f"Attenzione: {os.path.basename(source.file_path)} supera da solo il limite di memoria "
+                              f"(stima {estimate / 1024 ** 2:.0f} MB)")
+                    batch.append(source)
+                    budget -= estimate
+                else:
+                    skipped.append(source)
+            remaining = skipped
+            yield batch
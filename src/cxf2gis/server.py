@@ -0,0 +1,215 @@
+"""
+Servizio HTTP locale in sola lettura sulle particelle di un export (o di un progetto parsato).
+
+Endpoint (GET):
+- /layers                               elenco dei layer con numero di feature e CRS
+- /parcel?comune=&foglio=&codice=       ricerca per chiave (sezione e allegato opzionali)
+- /bbox?bbox=minx,miny,maxx,maxy        feature che intersecano il bbox (layer, limit opzionali)
+- /point?x=&y=                          feature che contengono il punto (layer opzionale)
+- /metrics                              latenze per endpoint e statistiche della cache
+
+Le risposte sono GeoJSON; con format=wkb le geometrie sono restituite in WKB esadecimale.
+Le coordinate delle interrogazioni sono nel CRS dei dati.
+"""
+import json
+import sys
+import threading
+import traceback
+import time
+from collections import defaultdict, deque
+from functools import lru_cache
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+import numpy as np
+import shapely
+
+# Campioni di latenza conservati per endpoint per il calcolo dei percentili
+LATENCY_SAMPLES = 10_000
+
+
+class RequestError(ValueError):
+    """Richiesta non valida: viene restituita al client con stato 400."""
+
+
+def _param(params, name, cast=str, default=None):
+    value = params.get(name)
+    if value is None:
+        if default is None:
+            raise RequestError(f"Parametro obbligatorio mancante: {name}")
+        return default
+    try:
+        return cast(value)
+    except ValueError:
+        raise RequestError(f"Valore non valido per {name}: {value}")
+
+
+class FeatureService:
+    """
+    Logica del servizio, indipendente dal server HTTP: risolve le richieste sul CXFIndex,
+    mantiene una cache LRU delle risposte serializzate e le metriche di latenza.
+    """
+
+    def __init__(self, index, cache_size=1024):
+        self.index = index
+        self.started = time.time()
+        self._latencies = defaultdict(lambda: deque(maxlen=LATENCY_SAMPLES))
+        self._errors = defaultdict(int)
+        self._lock = threading.Lock()
+        # Cache per istanza: la chiave è (endpoint, parametri ordinati)
+        self._render = lru_cache(maxsize=cache_size)(self._render_uncached)
+
+    # --- Serializzazione -------------------------------------------------------
+
+    @staticmethod
+    def _encode(gdf, fmt):
+        if fmt == 'geojson':
+            return gdf.to_json(na='null', drop_id=True).encode('utf-8'), 'application/geo+json'
+        if fmt == 'wkb':
+            properties = json.loads(gdf.drop(columns=gdf.geometry.name).to_json(orient='records'))
+            wkb = shapely.to_wkb(np.asarray(gdf.geometry.values), hex=True)
+            features = [{'properties': p, 'wkb': w} for p, w in zip(properties, wkb.tolist())]
+            body = {'crs': gdf.crs.to_string() if gdf.crs else None, 'features': features}
+            return json.dumps(body).encode('utf-8'), 'application/json'
+        raise RequestError(f"Formato non supportato: {fmt} (geojson, wkb)")
+
+    # --- Endpoint --------------------------------------------------------------
+
+    def _layers(self, params):
+        return {
+            name: {'features': len(gdf), 'crs': gdf.crs.to_string() if gdf.crs else None}
+            for name, gdf in self.index.layers.items()
+        }
+
+    def _parcel(self, params):
+        return self.index.find(
+            _param(params, 'comune'), _param(params, 'foglio'), _param(params, 'codice'),
+            sezione=params.get('sezione'), allegato=params.get('allegato')
+        )
+
+    def _bbox(self, params):
+        try:
+            bbox = [float(v) for v in _param(params, 'bbox').split(',')]
+        except ValueError:
+            bbox = []
+        if len(bbox) != 4:
+            raise RequestError("bbox deve essere nel formato minx,miny,maxx,maxy")
+        limit = _param(params, 'limit', int, default=-1)
+        if 'limit' in params and limit < 0:
+            raise RequestError(f"limit deve essere un intero non negativo: {params['limit']}")
+        result = self.index.in_bbox(bbox, layer=params.get('layer', 'bordo'))
+        return result if limit < 0 else result.head(limit)
+
+    def _point(self, params):
+        point = shapely.points([[_param(params, 'x', float), _param(params, 'y', float)]])
+        result = self.index.at_points(point, layer=params.get('layer', 'bordo'))
+        return result.drop(columns='indice_punto')
+
+    ROUTES = {'/layers': '_layers', '/parcel': '_parcel', '/bbox': '_bbox', '/point': '_point'}
+
+    def _render_uncached(self, path, query):
+        params = dict(query)
+        result = getattr(self, self.ROUTES[path])(params)
+        if isinstance(result, dict):
+            return json.dumps(result).encode('utf-8'), 'application/json'
+        return self._encode(result, params.get('format', 'geojson'))
+
+    def metrics(self):
+        with self._lock:
+            endpoints = {}
+            for path, samples in self._latencies.items():
+                ms = np.fromiter(samples, dtype=float) * 1000
+                endpoints[path] = {
+                    'richieste': len(ms),
+                    'errori': self._errors[path],
+                    'media_ms': round(float(ms.mean()), 3),
+                    'p50_ms': round(float(np.percentile(ms, 50)), 3),
+                    'p95_ms': round(float(np.percentile(ms, 95)), 3),
+                    'p99_ms': round(float(np.percentile(ms, 99)), 3),
+                    'max_ms': round(float(ms.max()), 3),
+                }
+        cache = self._render.cache_info()
+        return {
+            'uptime_s': round(time.time() - self.started, 1),
+            'cache': {'hits': cache.hits, 'misses': cache.misses, 'size': cache.currsize, 'maxsize': cache.maxsize},
+            'endpoints': endpoints,
+        }
+
+    def handle(self, target):
+        """
+        Risolve una richiesta GET (percorso con query string).
+        :return: (stato HTTP, content type, corpo in byte)
+        """
+        start = time.perf_counter()
+        url = urlsplit(target)
+        path = url.path.rstrip('/') or '/'
+        try:
+            if path == '/metrics':
+                response = HTTPStatus.OK, 'application/json', json.dumps(self.metrics()).encode('utf-8')
+            elif path in self.ROUTES:
+                # Parametri ordinati: la stessa richiesta con ordine diverso usa la stessa voce di cache
+                query = tuple(sorted(parse_qsl(url.query)))
+                body, content_type = self._render(path, query)
+                response = HTTPStatus.OK, content_type, body
+            else:
+                response = HTTPStatus.NOT_FOUND, 'application/json', json.dumps(
+                    {'errore': f"Endpoint sconosciuto: {path}", 'endpoint': [*self.ROUTES, '/metrics']}
+                ).encode('utf-8')
+        except RequestError as error:
+            response = HTTPStatus.BAD_REQUEST, 'application/json', json.dumps({'errore': str(error)}).encode('utf-8')
+        except KeyError as error:
+            response = HTTPStatus.NOT_FOUND, 'application/json', json.dumps({'errore': str(error.args[0])}).encode('utf-8')
+        except Exception as error:
+            # Qualsiasi altro errore (es. shapely o pandas su parametri anomali) non deve lasciare il client senza risposta
+            print(f"Errore interno su {target}: {error}", file=sys.stderr)
+            traceback.print_exc()
+            response = HTTPStatus.INTERNAL_SERVER_ERROR, 'application/json', json.dumps(
+                {'errore': f"Errore interno: {error}"}
+            ).encode('utf-8')
+
+        # I percorsi sconosciuti sono raggruppati, per non far crescere le metriche senza limite
+        key = path if path in self.ROUTES or path == '/metrics' else '*'
+        with self._lock:
+            self._latencies[key].append(time.perf_counter() - start)
+            if response[0] != HTTPStatus.OK:
+                self._errors[key] += 1
+        return response
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        status, content_type, body = self.server.service.handle(self.path)
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Il log per richiesta su stderr è sostituito dalle metriche di /metrics
+        pass
+
+
+def make_server(index, host='127.0.0.1', port=8000, cache_size=1024):
+    """Crea il server HTTP (multithread) sopra un CXFIndex; avviarlo con serve_forever()."""
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    server.service = FeatureService(index, cache_size=cache_size)
+    return server
+
+
+def serve(index, host='127.0.0.1', port=8000, cache_size=1024):
+    """Avvia il servizio e resta in ascolto fino a Ctrl+C."""
+    server = make_server(index, host=host, port=port, cache_size=cache_size)
+    # Gli indici vengono costruiti prima della prima richiesta, non durante
+    index.build()
+    print(f"Servizio in ascolto su http://{host}:{server.server_address[1]} "
+          f"(layer: {', '.join(index.layers)})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,93 @@
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+from shapely.geometry import MultiPolygon
+
+# Nome del layer di report con le geometrie invalide trovate
+REPORT_LAYER = 'geometrie_invalide'
+
+POLYGONAL = {'Polygon', 'MultiPolygon'}
+
+
+def _polygonal_part(geom):
+    """
+    make_valid può restituire GeometryCollection miste (es. poligono + linea degenere):
+    per il layer BORDO si conservano solo le parti poligonali.
+    """
+    if geom is None or geom.geom_type in POLYGONAL:
+        return geom
+    polygons = []
+    for part in shapely.get_parts(geom):
+        if part.geom_type == 'Polygon':
+            polygons.append(part)
+        elif part.geom_type == 'MultiPolygon':
+            polygons.extend(part.geoms)
+    if not polygons:
+        return None
+    return polygons[0] if len(polygons) == 1 else MultiPolygon(polygons)
+
+
+def validate_layer(gdf, layer_name):
+    """
+    Verifica e ripara in blocco le geometrie di un layer.
+    is_valid, is_valid_reason e make_valid sono applicati sull'intero array di geometrie.
+
+    :return: (GeoDataFrame riparato, GeoDataFrame di report o None, numero di geometrie riparate)
+    """
+    geoms = np.asarray(gdf.geometry.values)
+    invalid = ~shapely.is_valid(geoms) & ~shapely.is_missing(geoms)
+    if not invalid.any():
+        return gdf, None, 0
+
+    idx = np.flatnonzero(invalid)
+    reasons = shapely.is_valid_reason(geoms[idx])
+    repaired = shapely.make_valid(geoms[idx])
+    if layer_name.upper() == 'BORDO':
+        repaired = np.array([_polygonal_part(g) for g in repaired], dtype=object)
+    fixed = shapely.is_valid(repaired) & ~shapely.is_missing(repaired)
+
+    report = gpd.GeoDataFrame({
+        'layer': layer_name.lower(),
+        'codice': gdf['codice'].iloc[idx].values if 'codice' in gdf else None,
+        'comune': gdf['comune'].iloc[idx].values if 'comune' in gdf else None,
+        'foglio': gdf['foglio'].iloc[idx].values if 'foglio' in gdf else None,
+        'motivo': reasons,
+        'riparata': fixed,
+    }, geometry=geoms[idx], crs=gdf.crs)
+
+    gdf = gdf.copy()
+    new_geoms = geoms.copy()
+    new_geoms[idx[fixed]] = repaired[fixed]
+    gdf[gdf.geometry.name] = gpd.GeoSeries(new_geoms, index=gdf.index, crs=gdf.crs)
+    if 'area_grafica' in gdf:
+        # L'area grafica va ricalcolata sulle geometrie riparate, ma solo dove era valorizzata:
+        # NaN indica una particella senza corrispondenza nel file SUP e tale deve restare
+        measured = gdf['area_grafica'].iloc[idx[fixed]].notna().to_numpy()
+        rows = gdf.index[idx[fixed][measured]]
+        gdf.loc[rows, 'area_grafica'] = shapely.area(repaired[fixed][measured])
+
+    return gdf, report, int(fixed.sum())
+
+
+def validate_layers(layers):
+    """
+    Applica validate_layer a tutti i layer di una sorgente.
+    :return: (layers riparati, report unico o None, statistiche)
+    """
+    reports = []
+    stats = {'geometrie_invalide': 0, 'geometrie_riparate': 0}
+    validated = {}
+    for layer_name, gdf in layers.items():
+        if gdf is None or gdf.empty:
+            validated[layer_name] = gdf
+            continue
+        gdf, report, n_fixed = validate_layer(gdf, layer_name)
+        validated[layer_name] = gdf
+        if report is not None:
+            reports.append(report)
+            stats['geometrie_invalide'] += len(report)
+            stats['geometrie_riparate'] += n_fixed
+
+    report = pd.concat(reports, ignore_index=True) if reports else None
+    return validated, report, stats
@@ -0,0 +1,49 @@
+import geopandas as gpd
+import pytest
+import shapely
+
+from cxfdata import write_dataset, write_foglio
+
+from cxf2gis.core import CXFProject
+
+# CRS delle consegne sintetiche e dell'output dei test
+INPUT_EPSG = "EPSG:3003"
+TARGET_EPSG = "EPSG:6875"
+
+
+def bordo(rows, crs=INPUT_EPSG):
+    """
+    Layer BORDO minimale da tuple (codice, box): foglio 1 del comune C660,
+    senza sezione e con allegato 00.
+    """
+    return gpd.GeoDataFrame(
+        {
+            'codice': [codice for codice, _ in rows],
+            'classe': ['FABBRICATO' if codice.endswith('+') else 'PARTICELLA' for codice, _ in rows],
+            'comune': 'C660', 'sezione': '', 'foglio': '1', 'allegato': '00',
+        },
+        geometry=[shapely.box(*bounds) for _, bounds in rows],
+        crs=crs,
+    )
+
+
+@pytest.fixture
+def cxf_dir(tmp_path):
+    """Tre fogli sintetici affiancati di 5x5 particelle (con file SUP)."""
+    folder = tmp_path / "cxf"
+    write_dataset(folder, n_fogli=3, nx=5, ny=5)
+    return folder
+
+
+@pytest.fixture
+def project(cxf_dir):
+    project = CXFProject(TARGET_EPSG)
+    project.add_directory(str(cxf_dir), INPUT_EPSG)
+    return project
+
+
+@pytest.fixture
+def foglio_path(tmp_path):
+    path = tmp_path / "C660A000100.cxf"
+    write_foglio(str(path), nx=4, ny=4)
+    return path
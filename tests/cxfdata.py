@@ -0,0 +1,51 @@
+"""
+Consegne CXF/SUP sintetiche per i test.
+
+Ogni foglio è una griglia di particelle quadrate con il rispettivo TESTO al centro,
+più un SIMBOLO, un FIDUCIALE e una LINEA; il file SUP riporta l'area di ogni particella.
+"""
+import os
+
+# Lato delle particelle e origine del primo foglio (Gauss-Boaga fuso ovest)
+STEP = 50.0
+X0, Y0 = 1500000.0, 5000000.0
+
+
+def _bordo(codice, x, y, step):
+    ring = [(x, y), (x + step, y), (x + step, y + step), (x, y + step), (x, y)]
+    lines = ["BORDO", codice, "1", "0", f"{x + step / 2:.3f}", f"{y + step / 2:.3f}", "0", "0", "0", str(len(ring))]
+    for px, py in ring:
+        lines += [f"{px:.3f}", f"{py:.3f}"]
+    return lines
+
+
+def write_foglio(path, nx=5, ny=5, x0=X0, y0=Y0, step=STEP):
+    """Scrive un file CXF (e il relativo SUP) con nx * ny particelle numerate da 1."""
+    out = []
+    for i in range(nx):
+        for j in range(ny):
+            x, y = x0 + i * step, y0 + j * step
+            codice = str(i * ny + j + 1)
+            out += _bordo(codice, x, y, step)
+            out += ["TESTO", codice, "1", "0", f"{x + step / 2:.3f}", f"{y + step / 2:.3f}", "0", "0"]
+    out += ["SIMBOLO", "14", "0", f"{x0 + step / 4:.3f}", f"{y0 + step / 4:.3f}", "0"]
+    out += ["FIDUCIALE", "1", "0", f"{x0:.3f}", f"{y0:.3f}"]
+    out += ["LINEA", "1", "2", f"{x0:.3f}", f"{y0:.3f}", f"{x0 + nx * step:.3f}", f"{y0:.3f}"]
+    out += ["EOF"]
+
+    with open(path, "w", encoding="latin-1") as f:
+        f.write("\n".join(out) + "\n")
+    with open(os.path.splitext(path)[0] + ".SUP", "w", encoding="latin-1") as f:
+        for k in range(1, nx * ny + 1):
+            f.write(f"{k} {step * step:.0f}\n")
+
+
+def write_dataset(folder, n_fogli=3, comune="C660", nx=5, ny=5, step=STEP):
+    """Scrive n_fogli fogli affiancati lungo x in `folder` e ne restituisce i percorsi."""
+    os.makedirs(folder, exist_ok=True)
+    paths = []
+    for n in range(1, n_fogli + 1):
+        path = os.path.join(folder, f"{comune}A{n:04d}00.cxf")
+        write_foglio(path, nx=nx, ny=ny, x0=X0 + (n - 1) * nx * step, step=step)
+        paths.append(path)
+    return paths
@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+import shapely
+
+from cxf2gis.catalog import CATALOG_LAYER, catalog_layer, summarize_layers
+from cxf2gis.core import CXFProject
+from cxf2gis.exporters.base import merge_layers
+
+from conftest import INPUT_EPSG, TARGET_EPSG, bordo
+from cxfdata import STEP, X0, Y0, write_foglio
+
+META = {'comune': 'C660', 'sezione': '', 'foglio': '1', 'allegato': '00'}
+
+
+def test_summarize_layers():
+    layers = {'BORDO': bordo([('101', (0, 0, 10, 10)), ('102', (10, 0, 20, 5))]), 'TESTO': None}
+    layers['BORDO']['area_grafica'] = [100.0, 50.0]
+    layers['BORDO']['area_nominale'] = [90.0, np.nan]
+
+    summary = summarize_layers(META, '/dati/C660_000100.cxf', layers, INPUT_EPSG, 0.12345)
+    assert summary['file_nome'] == 'C660_000100.cxf'
+    assert (summary['n_bordo'], summary['n_testo']) == (2, 0)
+    assert (summary['area_grafica'], summary['area_nominale']) == (150.0, 90.0)
+    assert summary['tempo_parsing'] == 0.123
+    assert summary['geometry'].bounds == (0, 0, 20, 10)
+
+
+def test_summarize_layers_without_features():
+    summary = summarize_layers(META, 'vuoto.cxf', {'BORDO': None}, INPUT_EPSG, 0.0)
+    assert summary['n_bordo'] == 0 and summary['area_grafica'] == 0.0
+    assert summary['geometry'] is None
+
+
+def test_catalog_layer_reprojects_by_crs():
+    box = shapely.box(X0, Y0, X0 + 100, Y0 + 100)
+    summaries = [
+        {'foglio': '1', 'crs_origine': INPUT_EPSG, 'geometry': box},
+        {'foglio': '2', 'crs_origine': TARGET_EPSG, 'geometry': shapely.box(0, 0, 1, 1)},
+        {'foglio': '3', 'crs_origine': INPUT_EPSG, 'geometry': box},
+    ]
+    catalog = catalog_layer(summaries, TARGET_EPSG)
+    # L'ordine delle sorgenti è conservato anche con più CRS di origine
+    assert catalog['foglio'].tolist() == ['1', '2', '3']
+    assert catalog.crs == TARGET_EPSG
+    assert catalog.geometry.iloc[1].bounds == (0, 0, 1, 1)
+    assert catalog.geometry.iloc[0].bounds != box.bounds
+    assert catalog.geometry.iloc[0].equals(catalog.geometry.iloc[2])
+
+
+def test_catalog_in_merge_layers(project):
+    project.parse()
+    layers = dict(merge_layers(project, TARGET_EPSG))
+    catalog = layers[CATALOG_LAYER]
+    assert catalog['foglio'].tolist() == ['1', '2', '3']
+    assert catalog['n_bordo'].tolist() == [25, 25, 25]
+    assert catalog['area_grafica'].sum() == pytest.approx(layers['bordo']['area_grafica'].sum())
+    # L'envelope di ogni foglio, riproiettato dai soli vertici del box, contiene le sue particelle
+    for row in catalog.itertuples():
+        parcels = layers['bordo'][layers['bordo']['foglio'] == row.foglio]
+        assert row.geometry.buffer(0.01).contains(shapely.union_all(parcels.geometry.values))
+
+
+def test_catalog_after_deduplicate(tmp_path):
+    # Allegato 01 sovrapposto alle prime 20 particelle del foglio 1
+    write_foglio(str(tmp_path / "C660A000100.cxf"), nx=5, ny=5)
+    write_foglio(str(tmp_path / "C660A000101.cxf"), nx=4, ny=5)
+    project = CXFProject(target_epsg=TARGET_EPSG)
+    project.add_directory(str(tmp_path), INPUT_EPSG)
+    project.parse()
+    assert project.deduplicate(rule='first') == 20
+
+    catalog = dict(merge_layers(project, TARGET_EPSG))[CATALOG_LAYER]
+    assert catalog['allegato'].tolist() == ['00', '01']
+    assert catalog['n_bordo'].tolist() == [25, 0]
+    assert catalog['area_grafica'].tolist() == [pytest.approx(25 * STEP ** 2), 0.0]
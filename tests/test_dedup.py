@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from cxf2gis.dedup import find_duplicates
+
+from conftest import bordo
+
+
+def _layer(sources):
+    """Stessa particella (codice 101) in due sorgenti, quasi coincidente, più una particella distinta."""
+    gdf = pd.concat([
+        bordo([('101', (0, 0, 10, 10)), ('102', (20, 0, 30, 10))]),
+        bordo([('101', (0, 0, 10, 12)), ('103', (40, 0, 50, 10))]),
+    ], ignore_index=True)
+    gdf['_sorgente'] = sources
+    return gdf
+
+
+def test_first_keeps_earliest_source():
+    drop = find_duplicates(_layer([0, 0, 1, 1]), '_sorgente', rule='first')
+    assert drop.tolist() == [False, False, True, False]
+
+
+def test_last_keeps_latest_source():
+    drop = find_duplicates(_layer([0, 0, 1, 1]), '_sorgente', rule='last')
+    assert drop.tolist() == [True, False, False, False]
+
+
+def test_largest_keeps_largest_area():
+    drop = find_duplicates(_layer([0, 0, 1, 1]), '_sorgente', rule='largest')
+    assert drop.tolist() == [True, False, False, False]
+
+
+def test_same_source_is_not_a_duplicate():
+    assert not find_duplicates(_layer([0, 0, 0, 0]), '_sorgente').any()
+
+
+def test_insufficient_overlap_is_kept():
+    gdf = pd.concat([bordo([('101', (0, 0, 10, 10))]), bordo([('101', (8, 0, 18, 10))])], ignore_index=True)
+    gdf['_sorgente'] = [0, 1]
+    assert not find_duplicates(gdf, '_sorgente', min_overlap=0.5).any()
+    assert find_duplicates(gdf, '_sorgente', min_overlap=0.1).tolist() == [False, True]
+
+
+def test_invalid_rule():
+    with pytest.raises(ValueError):
+        find_duplicates(_layer([0, 0, 1, 1]), '_sorgente', rule='random')
+
+
+def test_project_deduplicate(project):
+    project.parse()
+    # Stesso foglio caricato due volte: tutte le particelle della seconda copia sono duplicate
+    twin = type(project.sources[0])(project.sources[0].file_path, project.sources[0].input_epsg)
+    twin.parse()
+    project.sources.append(twin)
+    removed = project.deduplicate('first')
+    assert removed == 25
+    assert twin.layers['BORDO'].empty
+    assert np.all([len(s.layers['BORDO']) == 25 for s in project.sources[:-1]])
@@ -0,0 +1,73 @@
+import shapely
+from cxfdata import X0, STEP, write_foglio
+
+from cxf2gis.core import CXFProject
+from cxf2gis.diff import DELTA_LAYERS, diff_layers, geometry_hashes
+from cxf2gis.exporters.base import merge_layers
+
+from conftest import INPUT_EPSG, TARGET_EPSG, bordo
+
+
+def test_geometry_hash_ignores_vertex_order():
+    square = shapely.box(0, 0, 1, 1)
+    reversed_square = shapely.Polygon(list(square.exterior.coords)[::-1])
+    shifted = shapely.box(0, 0, 1, 1.004)
+    hashes = geometry_hashes([square, reversed_square, shifted])
+    assert hashes[0] == hashes[1] != hashes[2]
+    hashes = geometry_hashes([square, shifted], precision=0.01)
+    assert hashes[0] == hashes[1]
+
+
+def test_diff_layers():
+    old = bordo([('101', (0, 0, 10, 10)), ('102', (10, 0, 20, 10)), ('103', (20, 0, 30, 10)), ('104', (30, 0, 40, 10))])
+    new = bordo([('101', (0, 0, 10, 10)), ('102', (10, 0, 21, 10)), ('103', (20, 0, 30, 10)), ('105', (40, 0, 50, 10))])
+    old['area_nominale'] = [100.0, 100.0, 100.0, 100.0]
+    new['area_nominale'] = [100.0, 110.0, 90.0, 100.0]
+    # Colonna derivata dalla geometria: ignorata nel confronto degli attributi
+    old['area_grafica'] = shapely.area(old.geometry.values)
+    new['area_grafica'] = shapely.area(new.geometry.values) + 1
+
+    layers, stats = diff_layers(old, new)
+
+    assert stats == {
+        'particelle_aggiunte': 1, 'particelle_rimosse': 1,
+        'particelle_geometria': 1, 'particelle_attributi': 2,
+    }
+    assert layers[DELTA_LAYERS['aggiunte']]['codice'].tolist() == ['105']
+    assert layers[DELTA_LAYERS['rimosse']]['codice'].tolist() == ['104']
+    geometria = layers[DELTA_LAYERS['geometria']]
+    assert geometria['codice'].tolist() == ['102']
+    assert geometria['area_precedente'].tolist() == [100.0]
+    attributi = layers[DELTA_LAYERS['attributi']]
+    assert attributi['codice'].tolist() == ['102', '103']
+    assert attributi['attributi_modificati'].tolist() == ['area_nominale', 'area_nominale']
+
+
+def test_diff_layers_without_changes():
+    # Chiavi ripetute: accoppiate nell'ordine di comparsa
+    old = bordo([('101', (0, 0, 10, 10)), ('101', (10, 0, 20, 10))])
+    layers, stats = diff_layers(old, old.copy())
+    assert layers == {}
+    assert set(stats.values()) == {0}
+
+
+def test_project_diff(project, cxf_dir, tmp_path):
+    # Nuova consegna: il secondo foglio ha una griglia 5x6, quindi 5 particelle in più
+    new_dir = tmp_path / "nuova"
+    new_dir.mkdir()
+    for path in sorted(cxf_dir.glob("*.cxf")):
+        ny = 6 if path.stem == "C660A000200" else 5
+        write_foglio(str(new_dir / path.name), nx=5, ny=ny, x0=X0 + (int(path.stem[5:9]) - 1) * 5 * STEP)
+    current = CXFProject(TARGET_EPSG)
+    current.add_directory(str(new_dir), INPUT_EPSG)
+
+    layers, stats = current.diff(project)
+    assert stats['particelle_aggiunte'] == 5
+    assert stats['particelle_rimosse'] == 0
+    assert set(layers[DELTA_LAYERS['aggiunte']]['foglio']) == {'2'}
+
+
+def test_merge_layers_filter(project):
+    project.parse()
+    assert [name for name, _ in merge_layers(project, TARGET_EPSG, layers=['BORDO'])] == ['bordo']
+    assert [name for name, _ in merge_layers(project, TARGET_EPSG, layers=['testo', 'fogli'])] == ['testo', 'fogli']
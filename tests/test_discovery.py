@@ -0,0 +1,72 @@
+import os
+
+from cxf2gis.core import CXFProject
+from cxf2gis.discovery import decripta_nome_file, discover, in_shard, mark_duplicates, scan, shard_of
+
+from conftest import INPUT_EPSG, TARGET_EPSG
+from cxfdata import write_foglio
+
+
+def _tree(root):
+    """Consegna con sottocartelle, estensioni in maiuscolo, un duplicato e un file estraneo."""
+    write_foglio(str(root / "C660A000100.cxf"))
+    (root / "sub" / "deep").mkdir(parents=True)
+    write_foglio(str(root / "sub" / "C660A000200.CXF"), ny=6)
+    os.rename(root / "sub" / "C660A000200.SUP", root / "sub" / "C660A000200.sup")
+    write_foglio(str(root / "sub" / "deep" / "D123B000300.cxf"), nx=4)
+    (root / "sub" / "deep" / "copia").mkdir()
+    write_foglio(str(root / "sub" / "deep" / "copia" / "C660A000100.cxf"))
+    (root / "note.txt").write_text("non CXF")
+
+
+def test_decripta_nome_file():
+    meta = decripta_nome_file("/dati/c660a0012a1.cxf")
+    assert {k: meta[k] for k in ('comune', 'sezione', 'foglio', 'allegato')} == {
+        'comune': 'C660', 'sezione': 'A', 'foglio': '12', 'allegato': 'A1'
+    }
+
+
+def test_scan(tmp_path):
+    _tree(tmp_path)
+    assert [os.path.basename(d.path) for d in scan(tmp_path)] == ["C660A000100.cxf"]
+
+    found = scan(tmp_path, recursive=True, max_workers=2)
+    assert [os.path.relpath(d.path, tmp_path) for d in found] == [
+        "C660A000100.cxf",
+        os.path.join("sub", "C660A000200.CXF"),
+        os.path.join("sub", "deep", "D123B000300.cxf"),
+        os.path.join("sub", "deep", "copia", "C660A000100.cxf"),
+    ]
+    # Il file SUP è associato senza distinzione di maiuscole nell'estensione
+    assert found[1].sup_path.endswith("C660A000200.sup")
+    assert found[1].size == os.path.getsize(found[1].path)
+    assert found[2].meta['comune'] == 'D123'
+
+
+def test_mark_duplicates(tmp_path):
+    _tree(tmp_path)
+    found = discover(tmp_path, recursive=True)
+    duplicates = [d for d in found if d.duplicate_of]
+    assert len(duplicates) == 1
+    assert duplicates[0].path.endswith(os.path.join("copia", "C660A000100.cxf"))
+    assert duplicates[0].duplicate_of == str(tmp_path / "C660A000100.cxf")
+    # Senza dimensioni in comune nessun file viene letto
+    assert mark_duplicates(found[:2]) == found[:2]
+
+
+def test_shards_partition_comuni(tmp_path):
+    _tree(tmp_path)
+    found = scan(tmp_path, recursive=True)
+    assert shard_of('c660', 4) == shard_of('C660', 4)
+    for count in (1, 2, 3):
+        owners = [[i for i in range(1, count + 1) if in_shard(d, i, count)] for d in found]
+        assert all(len(owner) == 1 for owner in owners)
+
+
+def test_add_directory_skips_duplicates(tmp_path):
+    _tree(tmp_path)
+    project = CXFProject(TARGET_EPSG)
+    project.add_directory(str(tmp_path), INPUT_EPSG, recursive=True)
+    assert sorted(os.path.basename(s.file_path) for s in project.sources) == [
+        "C660A000100.cxf", "C660A000200.CXF", "D123B000300.cxf"
+    ]
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+import shapely
+
+from cxf2gis.exporters.base import merge_layers
+from cxf2gis.features import FeatureRecord, iter_features
+
+from conftest import INPUT_EPSG, TARGET_EPSG
+from cxfdata import X0, Y0
+
+
+def _all(batches):
+    return [record for batch in batches for record in batch]
+
+
+def test_iter_features_counts(project):
+    records = _all(project.iter_features())
+    layers = [record.layer for record in records]
+    assert {layer: layers.count(layer) for layer in set(layers)} == {
+        'bordo': 75, 'testo': 75, 'simbolo': 3, 'fiduciale': 3, 'linea': 3,
+    }
+    # Nessun record resta sulle sorgenti
+    assert not any(any(layer) for source in project.sources for layer in source.layers.values())
+
+
+def test_iter_features_record(project):
+    record = _all(project.iter_features(layers=['bordo'], target_crs=INPUT_EPSG))[0]
+    assert isinstance(record, FeatureRecord)
+    assert record[:6] == ('bordo', 'C660', 'A', '1', '00', '1')
+    assert record.attributes == {'classe': 'PARTICELLA', 'area_nominale': 2500.0, 'area_grafica': 2500.0}
+    assert shapely.from_wkb(record.wkb).bounds == (X0, Y0, X0 + 50, Y0 + 50)
+
+
+def test_iter_features_matches_merge_layers(project):
+    records = _all(project.iter_features(layers=['BORDO']))
+    geoms = shapely.from_wkb([record.wkb for record in records])
+
+    project.parse()
+    bordo = dict(merge_layers(project, TARGET_EPSG))['bordo']
+    assert [record.codice for record in records] == bordo['codice'].tolist()
+    assert np.allclose(shapely.get_coordinates(geoms), shapely.get_coordinates(bordo.geometry.values))
+
+
+def test_iter_features_batches(project):
+    batches = list(project.iter_features(layers=['testo', 'simbolo'], batch_size=20))
+    assert [len(batch) for batch in batches] == [20, 20, 20, 18]
+    assert {record.layer for record in _all(batches)} == {'testo', 'simbolo'}
+    assert {record.codice for record in _all(batches) if record.layer == 'simbolo'} == {'14'}
+
+
+def test_iter_features_invalid_layer(project):
+    with pytest.raises(ValueError, match='PARTICELLE'):
+        next(iter_features(project.sources, layers=['particelle']))
@@ -0,0 +1,157 @@
+import sqlite3
+
+import geopandas as gpd
+import numpy as np
+import pyogrio
+import pytest
+import shapely
+
+from cxf2gis.core import CXFProject
+from cxf2gis.exporters.geopackage.base import GPKGExporter
+from cxf2gis.exporters.geopackage.gpkgbinary import blobs_to_geometries, geometries_to_blobs, geometry_envelopes
+from cxf2gis.exporters.geopackage.merge import merge_geopackages
+from cxf2gis.exporters.geopackage.native import write_layer
+
+from conftest import INPUT_EPSG, TARGET_EPSG
+
+
+def _layer(n, x0=0.0, seed=0):
+    rng = np.random.default_rng(seed)
+    x = x0 + rng.uniform(0, 1000, n)
+    y = rng.uniform(0, 1000, n)
+    return gpd.GeoDataFrame(
+        {'codice': [str(i) for i in range(n)], 'area_nominale': rng.uniform(0, 100, n)},
+        geometry=shapely.box(x, y, x + 5, y + 5),
+        crs=TARGET_EPSG,
+    )
+
+
+def _rtree(path, table='bordo'):
+    conn = sqlite3.connect(path)
+    try:
+        check = conn.execute(f"SELECT rtreecheck('rtree_{table}_geom')").fetchone()[0]
+        rows = conn.execute(f'SELECT id, minx, maxx, miny, maxy FROM "rtree_{table}_geom" ORDER BY id').fetchall()
+    finally:
+        conn.close()
+    return check, np.array(rows)
+
+
+def test_gpkgbinary_round_trip():
+    geoms = np.array([
+        shapely.Point(1.5, 2.5),
+        shapely.box(0, 0, 10, 20),
+        shapely.LineString([(0, 0), (3, 4), (5, 1)]),
+        shapely.MultiPolygon([shapely.box(0, 0, 1, 1), shapely.box(2, 2, 3, 3)]),
+        shapely.Polygon(),
+        None,
+    ], dtype=object)
+    blobs = geometries_to_blobs(geoms, 6875)
+
+    assert blobs[-1] is None
+    assert all(bytes(blob[:2]) == b'GP' for blob in blobs[:-1])
+    decoded = blobs_to_geometries(blobs)
+    assert shapely.equals(decoded[:4], geoms[:4]).all()
+    assert shapely.is_empty(decoded[4]) and decoded[5] is None
+
+    envelopes, present = geometry_envelopes(blobs)
+    assert present.tolist() == [True, True, True, True, False, False]
+    assert envelopes[1].tolist() == [0, 10, 0, 20]
+
+
+def test_native_write_layer_read_back(tmp_path):
+    path = tmp_path / "native.gpkg"
+    first, second = _layer(300), _layer(200, x0=2000, seed=1)
+    write_layer(path, 'bordo', first)
+    write_layer(path, 'bordo', second)
+
+    info = pyogrio.read_info(path, layer='bordo')
+    assert info['features'] == 500
+    assert info['crs'] == TARGET_EPSG
+    assert info['geometry_type'] == 'Polygon'
+    back = pyogrio.read_dataframe(path, layer='bordo')
+    expected = np.concatenate([first.geometry.values, second.geometry.values])
+    assert shapely.equals(back.geometry.values, expected).all()
+    assert back['codice'].tolist() == first['codice'].tolist() + second['codice'].tolist()
+
+    check, rows = _rtree(path)
+    assert check == 'ok'
+    assert rows[:, 0].tolist() == list(range(1, 501))
+    # Envelope arrotondati verso l'esterno a float32 dall'rtree di SQLite
+    bounds = shapely.bounds(expected)[:, [0, 2, 1, 3]]
+    assert np.all(rows[:, [1, 3]] <= bounds[:, [0, 2]]) and np.all(rows[:, [2, 4]] >= bounds[:, [1, 3]])
+    # GDAL usa l'indice per il filtro bbox
+    assert len(pyogrio.read_dataframe(path, layer='bordo', bbox=(2000, 0, 3000, 1000))) == 200
+
+
+def test_native_write_layer_without_spatial_index(tmp_path):
+    path = tmp_path / "native.gpkg"
+    write_layer(path, 'bordo', _layer(10), spatial_index=False)
+    conn = sqlite3.connect(path)
+    try:
+        assert not conn.execute("SELECT count(*) FROM sqlite_master WHERE name LIKE 'rtree_%'").fetchone()[0]
+    finally:
+        conn.close()
+    assert pyogrio.read_info(path, layer='bordo')['features'] == 10
+
+
+def test_merge_geopackages(tmp_path):
+    shards = [tmp_path / "a.gpkg", tmp_path / "b.gpkg"]
+    write_layer(shards[0], 'bordo', _layer(100))
+    write_layer(shards[1], 'bordo', _layer(50, x0=2000, seed=1))
+    # Layer presente solo nel secondo shard
+    write_layer(shards[1], 'testo', gpd.GeoDataFrame(
+        {'testo': ['101']}, geometry=[shapely.Point(2001, 1)], crs=TARGET_EPSG
+    ))
+    output = tmp_path / "merged.gpkg"
+
+    merge_geopackages(output, shards)
+
+    assert pyogrio.read_info(output, layer='bordo')['features'] == 150
+    assert pyogrio.read_info(output, layer='testo')['features'] == 1
+    back = pyogrio.read_dataframe(output, layer='bordo')
+    assert back['codice'].tolist() == [str(i) for i in range(100)] + [str(i) for i in range(50)]
+    check, rows = _rtree(output)
+    assert check == 'ok' and len(rows) == 150
+    assert len(pyogrio.read_dataframe(output, layer='bordo', bbox=(2000, 0, 3000, 1000))) == 50
+    # Estensione del layer aggiornata in gpkg_contents
+    conn = sqlite3.connect(output)
+    try:
+        extent = conn.execute("SELECT min_x, max_x FROM gpkg_contents WHERE table_name = 'bordo'").fetchone()
+    finally:
+        conn.close()
+    assert extent[0] < 1000 and extent[1] > 2000
+
+
+def test_merge_geopackages_refuses_existing_output(tmp_path):
+    shard = tmp_path / "a.gpkg"
+    write_layer(shard, 'bordo', _layer(10))
+    with pytest.raises(FileExistsError):
+        merge_geopackages(shard, [shard])
+
+
+@pytest.mark.parametrize('engine', ['pyogrio', 'native'])
+def test_merge_geopackages_with_different_columns(cxf_dir, tmp_path, engine):
+    # Primo shard esportato senza collegamento delle etichette, secondo con --link-labels
+    shards = []
+    for n, link_labels in ((1, False), (2, True)):
+        project = CXFProject(TARGET_EPSG)
+        project.add_source(str(cxf_dir / f"C660A000{n}00.cxf"), INPUT_EPSG)
+        project.parse()
+        if link_labels:
+            project.associate_labels()
+        shards.append(tmp_path / f"shard{n}.gpkg")
+        project.export(GPKGExporter(shards[-1], engine=engine), TARGET_EPSG)
+    output = tmp_path / "merged.gpkg"
+
+    merge_geopackages(output, shards)
+
+    testo = pyogrio.read_dataframe(output, layer='testo')
+    assert {'codice_particella', 'sezione', 'allegato'} <= set(testo.columns)
+    assert testo.loc[testo['foglio'] == '1', 'codice_particella'].isna().all()
+    second = testo[testo['foglio'] == '2']
+    assert (second['codice_particella'] == second['testo']).all()
+    bordo = pyogrio.read_dataframe(output, layer='bordo')
+    assert bordo.loc[bordo['foglio'] == '1', 'n_testi'].isna().all()
+    assert (bordo.loc[bordo['foglio'] == '2', 'n_testi'] == 1).all()
+    check, rows = _rtree(output)
+    assert check == 'ok' and len(rows) == 50
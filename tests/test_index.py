@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+from cxf2gis.core import CXFProject
+from cxf2gis.exporters.geopackage.base import GPKGExporter
+from cxf2gis.index import CXFIndex
+
+from conftest import TARGET_EPSG
+
+
+def test_find_parcel(project):
+    project.parse()
+    found = project.find_parcel('c660', '0002', 7)
+    assert len(found) == 1
+    assert found.iloc[0][['comune', 'foglio', 'codice']].tolist() == ['C660', '2', '7']
+    assert len(project.find_parcel('C660', '2', '7', sezione='A', allegato='00')) == 1
+    assert project.find_parcel('C660', '2', '7', sezione='A', allegato='01').empty
+    assert project.find_parcel('C660', '9', '7').empty
+
+
+def test_find_parcel_partially_parsed(project):
+    # Solo il primo foglio è parsato: gli altri restano fuori dall'indice
+    project.parse(project.sources[:1])
+    assert len(project.find_parcel('C660', '1', '1')) == 1
+    assert project.find_parcel('C660', '2', '1').empty
+
+    project.parse()
+    project.reset_index()
+    assert len(project.find_parcel('C660', '2', '1')) == 1
+
+
+def test_find_many(project):
+    project.parse()
+    keys = [('C660', 'A', '1', '00', '3'), ('C660', 'A', '3', '00', '25'), ('C660', 'A', '3', '00', '99')]
+    found = project.index.find_many(keys)
+    assert found['indice_chiave'].tolist() == [0, 1]
+    assert found['codice'].tolist() == ['3', '25']
+
+
+def test_spatial_queries(project):
+    project.parse()
+    bordo = project.index.layers['bordo']
+    target = bordo[(bordo['foglio'] == '1') & (bordo['codice'] == '7')].geometry.iloc[0]
+
+    centre = np.array([[target.centroid.x, target.centroid.y]])
+    at = project.parcels_at(centre)
+    assert at['indice_punto'].tolist() == [0]
+    assert at[['foglio', 'codice']].values.tolist() == [['1', '7']]
+
+    # bbox di 2 m attorno al centro: nel CRS di destinazione le particelle non sono più allineate agli assi
+    inner = (target.centroid.x - 1, target.centroid.y - 1, target.centroid.x + 1, target.centroid.y + 1)
+    assert project.query_bbox(inner)['codice'].tolist() == ['7']
+    many = project.query_bbox([inner, (0, 0, 1, 1)])
+    assert many['indice_bbox'].tolist() == [0]
+
+
+def test_unknown_layer(project):
+    project.parse()
+    with pytest.raises(KeyError):
+        project.index.tree('simboli')
+
+
+def test_from_geopackage(project, tmp_path):
+    output = tmp_path / "out.gpkg"
+    project.parse()
+    project.export(GPKGExporter(output), TARGET_EPSG)
+
+    index = CXFIndex.from_geopackage(output)
+    assert {'bordo', 'testo', 'fogli'} <= set(index.layers)
+    assert len(index.find('C660', '3', '25')) == 1
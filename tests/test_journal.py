@@ -0,0 +1,87 @@
+import sqlite3
+
+import pyogrio
+import pytest
+
+from cxf2gis.core import CXFProject
+from cxf2gis.exporters.geopackage.base import GPKGExporter
+from cxf2gis.journal import RunJournal
+
+from conftest import INPUT_EPSG, TARGET_EPSG
+
+
+def test_journal_batches(tmp_path):
+    path = tmp_path / "run.journal"
+    with RunJournal(path) as journal:
+        assert not journal.has_progress()
+        first = journal.start_batch({'bordo': 0}, ['a.cxf', 'b.cxf'])
+        journal.complete_batch(first, ['a.cxf', 'b.cxf'])
+        second = journal.start_batch({'bordo': 50}, ['c.cxf'])
+
+    # Il giornale sopravvive alla chiusura: in ripresa restano il lotto incompleto e il suo stato
+    with RunJournal(path) as journal:
+        assert journal.has_progress()
+        assert journal.completed_sources() == {'a.cxf', 'b.cxf'}
+        assert journal.incomplete_batches() == [(second, {'bordo': 50})]
+        assert journal.batch_sources(second) == ['c.cxf']
+        journal.discard_batch(second)
+        assert journal.incomplete_batches() == []
+        journal.reset()
+        assert not journal.has_progress() and journal.completed_sources() == set()
+
+
+def test_journal_upgrades_old_schema(tmp_path):
+    path = tmp_path / "old.journal"
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE lotti (id INTEGER PRIMARY KEY AUTOINCREMENT, avviato TEXT NOT NULL, "
+                 "completato TEXT, stato TEXT)")
+    conn.execute("INSERT INTO lotti (avviato) VALUES ('2024-01-01')")
+    conn.commit()
+    conn.close()
+
+    with RunJournal(path) as journal:
+        assert journal.batch_sources(1) == []
+        batch_id = journal.start_batch(None, ['a.cxf'])
+        assert journal.batch_sources(batch_id) == ['a.cxf']
+
+
+@pytest.mark.parametrize('engine', ['pyogrio', 'native'])
+def test_resume_rolls_back_interrupted_batch(project, cxf_dir, tmp_path, engine):
+    output = tmp_path / "out.gpkg"
+    journal_path = tmp_path / "out.journal"
+
+    class Interrupted(Exception):
+        pass
+
+    exporter = GPKGExporter(output, engine=engine)
+    write_batch = exporter.write_batch
+    calls = []
+
+    def failing_write_batch(sources, target_epsg):
+        # Il secondo lotto viene scritto ma il processo si interrompe prima di aggiornare il giornale
+        write_batch(sources, target_epsg)
+        calls.append(sources)
+        if len(calls) == 2:
+            raise Interrupted()
+
+    exporter.write_batch = failing_write_batch
+    with RunJournal(journal_path) as journal, pytest.raises(Interrupted):
+        project.export(exporter, TARGET_EPSG, journal=journal, batch_size=1)
+    assert pyogrio.read_info(output, layer='bordo')['features'] == 50
+
+    with RunJournal(journal_path) as journal:
+        assert len(journal.completed_sources()) == 1
+        assert len(journal.incomplete_batches()) == 1
+        # Ripresa in un nuovo processo: progetto ricaricato dalla stessa cartella
+        resumed = CXFProject(TARGET_EPSG)
+        resumed.add_directory(str(cxf_dir), INPUT_EPSG)
+        resumed.export(GPKGExporter(output, engine=engine), TARGET_EPSG, journal=journal, batch_size=1)
+        assert journal.incomplete_batches() == []
+        assert journal.completed_sources() == {str(s.file_path) for s in resumed.sources}
+
+    # Le righe del lotto interrotto sono state rimosse e riscritte una sola volta
+    bordo = pyogrio.read_dataframe(output, layer='bordo')
+    assert len(bordo) == 75
+    assert not bordo.duplicated(['foglio', 'codice']).any()
+    fogli = pyogrio.read_dataframe(output, layer='fogli')
+    assert sorted(fogli['foglio']) == ['1', '2', '3']
@@ -0,0 +1,90 @@
+import geopandas as gpd
+import numpy as np
+import shapely
+
+from cxf2gis.labels import (
+    PARCEL_COLUMN, RANK_ENCLOSING, RANK_FALLBACK, RANK_PARCEL, associate_labels, container_rank,
+    containing_polygons,
+)
+
+from conftest import INPUT_EPSG, bordo
+
+
+def test_containing_polygons_prefers_smallest():
+    polygons = np.array([shapely.box(0, 0, 100, 100), shapely.box(0, 0, 10, 10), shapely.box(50, 50, 60, 60)])
+    points = shapely.points([(5, 5), (55, 55), (80, 80), (500, 500)])
+    assert containing_polygons(points, polygons).tolist() == [1, 2, 0, -1]
+
+
+def test_containing_polygons_rank_before_area():
+    polygons = np.array([shapely.box(0, 0, 100, 100), shapely.box(0, 0, 10, 10)])
+    points = shapely.points([(5, 5)])
+    assert containing_polygons(points, polygons, rank=[0, 1]).tolist() == [0]
+
+
+def test_containing_polygons_empty_inputs():
+    assert containing_polygons(shapely.points([(0, 0)]), np.empty(0, dtype=object)).tolist() == [-1]
+    assert containing_polygons(np.empty(0, dtype=object), np.array([shapely.box(0, 0, 1, 1)])).tolist() == []
+
+
+def _points(coords, **columns):
+    return gpd.GeoDataFrame(columns, geometry=shapely.points(coords), crs=INPUT_EPSG)
+
+
+def test_associate_labels():
+    layers = {
+        'BORDO': bordo([
+            ('101', (0, 0, 100, 100)),
+            ('101+', (10, 10, 30, 30)),    # Fabbricato interno alla particella 101
+            ('102', (100, 0, 200, 100)),
+            ('103+', (300, 0, 320, 20)),   # Fabbricato senza particella
+        ]),
+        'TESTO': _points([(20, 20), (150, 50), (310, 10), (900, 900)], testo=['101', '102', '103', 'x']),
+        'SIMBOLO': None,
+    }
+
+    result, stats = associate_labels(layers)
+
+    testo = result['TESTO']
+    assert testo[PARCEL_COLUMN].iloc[:3].tolist() == ['101', '102', '103+']
+    assert testo[PARCEL_COLUMN].isna().tolist() == [False, False, False, True]
+    assert testo['sezione'].tolist() == [''] * 4
+    assert testo['allegato'].tolist() == ['00'] * 4
+    assert result['BORDO']['n_testi'].tolist() == [1, 0, 1, 1]
+    assert result['BORDO']['n_simboli'].tolist() == [0, 0, 0, 0]
+    assert stats == {'testo_associati': 3, 'testo_non_associati': 1}
+    # I layer in ingresso non vengono modificati
+    assert PARCEL_COLUMN not in layers['TESTO']
+
+
+def test_associate_labels_without_bordo():
+    result, stats = associate_labels({'BORDO': None, 'TESTO': _points([(0, 0)], testo=['101'])})
+    testo = result['TESTO']
+    assert testo[PARCEL_COLUMN].isna().all()
+    assert {'sezione', 'allegato'} <= set(testo.columns)
+    assert stats == {'testo_associati': 0, 'testo_non_associati': 1}
+
+
+def test_container_rank_nested_boundary():
+    layers = bordo([
+        ('BORDO', (0, 0, 1000, 1000)),  # Bordo del foglio, contiene tutto
+        ('101', (0, 0, 100, 100)),
+        ('102', (0, 0, 100, 100)),      # Duplicato esatto: non è un contenitore
+        ('103+', (500, 500, 520, 520)),
+    ])
+    assert container_rank(layers).tolist() == [RANK_ENCLOSING, RANK_PARCEL, RANK_PARCEL, RANK_FALLBACK]
+
+
+def test_associate_labels_nested_boundary():
+    layers = {
+        'BORDO': bordo([
+            ('BORDO', (0, 0, 1000, 1000)),
+            ('101', (0, 0, 100, 100)),
+            ('101+', (10, 10, 30, 30)),     # Fabbricato interno alla particella 101
+            ('102+', (500, 500, 520, 520)), # Fabbricato interno al solo bordo di foglio
+        ]),
+        'TESTO': _points([(20, 20), (50, 50), (510, 510), (800, 800)], testo=['a', 'b', 'c', 'd']),
+    }
+
+    testo = associate_labels(layers)[0]['TESTO']
+    assert testo[PARCEL_COLUMN].tolist() == ['101', '101', '102+', 'BORDO']
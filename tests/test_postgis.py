@@ -0,0 +1,190 @@
+import sys
+import threading
+import time
+
+import pandas as pd
+import pytest
+import shapely
+
+from cxf2gis import cli
+from cxf2gis.exporters.postgis import base as postgis_base
+from cxf2gis.exporters.postgis.base import BATCH_TABLE, PostGISExporter
+
+from conftest import bordo
+
+
+class StubResult:
+    def __init__(self, value):
+        self.value = value
+
+    def scalar(self):
+        return self.value
+
+    def all(self):
+        return self.value
+
+
+class StubEngine:
+    """
+    Engine SQLAlchemy simulato: registra le istruzioni eseguite e risponde
+    con il valore della prima chiave di `responses` contenuta nel testo SQL.
+    """
+
+    def __init__(self, responses=None):
+        self.responses = responses or {}
+        self.statements = []
+
+    def begin(self):
+        return self
+
+    connect = begin
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, statement, params=None):
+        sql = str(statement)
+        self.statements.append((sql, params))
+        return StubResult(next((v for k, v in self.responses.items() if k in sql), None))
+
+    def executed(self, fragment):
+        return [(sql, params) for sql, params in self.statements if fragment in sql]
+
+
+@pytest.fixture
+def engine():
+    return StubEngine()
+
+
+@pytest.fixture
+def exporter(engine, monkeypatch):
+    monkeypatch.setattr(postgis_base, "create_engine", lambda *args, **kwargs: engine)
+    return PostGISExporter("localhost", "catasto", "user", "password", pool_size=2)
+
+
+def test_create_indexes_builds_gist(exporter, engine):
+    exporter._create_indexes(engine, "bordo")
+    statements = [sql for sql, _ in engine.statements]
+    assert statements[0] == 'CREATE INDEX IF NOT EXISTS "idx_bordo_geometry" ON "catasto"."bordo" USING GIST ("geometry")'
+    assert "(comune, foglio, codice)" in statements[1]
+    assert statements[2] == 'ANALYZE "catasto"."bordo"'
+
+
+def test_create_table_without_spatial_index(exporter, engine, monkeypatch):
+    created = []
+    monkeypatch.setattr(pd.DataFrame, "to_sql", lambda frame, **kwargs: created.append((frame, kwargs)))
+    monkeypatch.setattr(postgis_base, "inspect", lambda con: type("Inspector", (), {"has_table": lambda *a, **k: False}))
+    layer = bordo([("101", (0, 0, 10, 10))], crs="EPSG:6875")
+
+    exporter._create_table(engine, "bordo", layer)
+    frame, kwargs = created[0]
+    assert frame.empty and list(frame.columns) == list(layer.columns)
+    geometry = kwargs["dtype"]["geometry"]
+    assert (geometry.geometry_type, geometry.srid, geometry.spatial_index) == ("POLYGON", 6875, False)
+
+    # Tabella già presente (es. lotto successivo): nessuna nuova creazione
+    monkeypatch.setattr(postgis_base, "inspect", lambda con: type("Inspector", (), {"has_table": lambda *a, **k: True}))
+    exporter._create_table(engine, "bordo", layer)
+    assert len(created) == 1
+
+
+def test_create_table_mixed_geometries(exporter, engine, monkeypatch):
+    created = []
+    monkeypatch.setattr(pd.DataFrame, "to_sql", lambda frame, **kwargs: created.append(kwargs))
+    monkeypatch.setattr(postgis_base, "inspect", lambda con: type("Inspector", (), {"has_table": lambda *a, **k: False}))
+    layer = bordo([("101", (0, 0, 10, 10)), ("102", (20, 0, 30, 10))], crs="EPSG:6875")
+    layer.loc[1, "geometry"] = shapely.MultiPolygon([shapely.box(20, 0, 30, 10), shapely.box(40, 0, 50, 10)])
+
+    exporter._create_table(engine, "bordo", layer)
+    assert created[0]["dtype"]["geometry"].geometry_type == "GEOMETRY"
+
+
+def test_index_tables_skips_indexed(exporter, engine):
+    engine.responses = {"geometry_columns": [("bordo", "geometry"), ("testo", "geometry")]}
+    exporter._indexed.add("testo")
+    exporter._index_tables()
+    assert [sql for sql, _ in engine.executed("USING GIST")] == [
+        'CREATE INDEX IF NOT EXISTS "idx_bordo_geometry" ON "catasto"."bordo" USING GIST ("geometry")'
+    ]
+
+
+def test_write_concurrent_stops_at_first_failure(exporter, engine, monkeypatch):
+    failed = threading.Event()
+    produced = []
+
+    def merge_sources(sources, target_epsg):
+        for table_name in ("bordo", "testo", "simbolo"):
+            produced.append(table_name)
+            yield table_name, None
+            # Il caricamento del primo layer fallisce prima che sia pronto il successivo
+            failed.wait(5)
+            time.sleep(0.1)
+
+    def load_table(table_name, merged_gdf):
+        failed.set()
+        raise RuntimeError(f"caricamento {table_name} fallito")
+
+    monkeypatch.setattr(exporter, "_merge_sources", merge_sources)
+    monkeypatch.setattr(exporter, "_load_table", load_table)
+    with pytest.raises(RuntimeError, match="bordo"):
+        exporter.write_concurrent([], "EPSG:6875")
+    # L'errore interrompe la preparazione dei layer successivi
+    assert "simbolo" not in produced
+
+
+def test_export_failure_restores_archived_schema(exporter, engine, monkeypatch):
+    def prepare_schema(target_schema):
+        exporter._archived = ("catasto_archived_2026_01_01", "production")
+
+    def write_concurrent(sources, target_epsg):
+        raise RuntimeError("scrittura fallita")
+
+    finished = []
+    monkeypatch.setattr(exporter, "prepare_schema", prepare_schema)
+    monkeypatch.setattr(exporter, "write_concurrent", write_concurrent)
+    monkeypatch.setattr(exporter, "finish", finished.append)
+    with pytest.raises(RuntimeError, match="scrittura fallita"):
+        exporter.export(type("Project", (), {"sources": []})(), "EPSG:6875")
+
+    statements = [sql for sql, _ in engine.statements]
+    assert statements[0] == 'DROP SCHEMA IF EXISTS "catasto" CASCADE'
+    assert statements[1].startswith("DELETE FROM public.")
+    assert statements[2] == 'ALTER SCHEMA "catasto_archived_2026_01_01" RENAME TO "catasto"'
+    assert engine.statements[3][1] == {"s": "catasto", "status": "production", "a": "catasto_archived_2026_01_01"}
+    assert not finished
+    assert exporter._archived is None
+
+
+def test_restore_schema_without_archive(exporter, engine):
+    exporter.restore_schema()
+    assert len(engine.statements) == 2
+    assert not engine.executed("RENAME")
+
+
+def test_batch_token_committed(exporter, engine, monkeypatch):
+    monkeypatch.setattr(exporter, "_merge_sources", lambda sources, target_epsg: iter(()))
+    state = exporter.checkpoint()
+    exporter.write_batch([], "EPSG:6875")
+    assert engine.executed(f'CREATE TABLE IF NOT EXISTS "catasto"."{BATCH_TABLE}"')
+    assert engine.executed("INSERT INTO")[0][1] == {"lotto": state["lotto"]}
+    assert exporter._batch_token is None
+
+    # Nessuno stato registrato, oppure tabella dei lotti assente
+    assert exporter.committed(None) is False
+    assert exporter.committed({}) is False
+    assert exporter.committed(state) is False
+    engine.responses = {"to_regclass": f"catasto.{BATCH_TABLE}", "EXISTS": True}
+    assert exporter.committed(state) is True
+
+
+def test_cli_rejects_empty_pool(monkeypatch, capsys):
+    monkeypatch.setattr(sys, "argv", [
+        "cxf2gis", "postgis", "input", "postgresql://localhost/db", "-i", "EPSG:3003", "--pool-size", "0",
+    ])
+    with pytest.raises(SystemExit) as error:
+        cli.main()
+    assert error.value.code == 2
+    assert "--pool-size must be at least 1" in capsys.readouterr().err
@@ -0,0 +1,51 @@
+import numpy as np
+import pyogrio
+import pytest
+import shapely
+
+from cxf2gis.exporters.base import BaseExporter, merge_layers, reduce_precision
+from cxf2gis.exporters.geopackage.base import GPKGExporter
+
+from conftest import TARGET_EPSG, bordo
+
+
+def test_reduce_precision():
+    gdf = bordo([('101', (0.123456, 0.0, 10.987654, 10.0))])
+    rounded = reduce_precision(gdf, precision=0.01)
+    assert set(shapely.get_coordinates(rounded.geometry.values)[:, 0].tolist()) == {0.12, 10.99}
+    # Il layer originale non viene modificato
+    assert 0.123456 in shapely.get_coordinates(gdf.geometry.values)[:, 0]
+    assert reduce_precision(gdf) is gdf
+
+
+def test_drop_repeated_points():
+    gdf = bordo([('101', (0, 0, 10, 10))])
+    gdf.loc[0, 'geometry'] = shapely.Polygon([(0, 0), (10, 0), (10, 0), (10, 10), (0, 10), (0, 0)])
+    assert shapely.get_num_coordinates(reduce_precision(gdf, drop_repeated_points=True).geometry.values)[0] == 5
+
+
+def test_configure():
+    exporter = GPKGExporter("unused.gpkg").configure(precision=0.01, drop_repeated_points=True)
+    assert exporter.precision == 0.01 and exporter.drop_repeated_points
+    # Le opzioni restano per istanza
+    assert BaseExporter.precision is None
+    with pytest.raises(TypeError):
+        exporter.configure(export=None)
+    with pytest.raises(TypeError):
+        exporter.configure(precisione=0.01)
+
+
+def test_precision_applied_after_reprojection(project):
+    project.parse()
+    layers = dict(merge_layers(project.sources, TARGET_EPSG, precision=0.01))
+    coords = shapely.get_coordinates(layers['bordo'].geometry.values)
+    assert layers['bordo'].crs == TARGET_EPSG
+    assert np.allclose(coords, np.round(coords, 2), rtol=0, atol=1e-6)
+
+
+def test_export_with_precision(project, tmp_path):
+    output = tmp_path / "out.gpkg"
+    project.parse()
+    project.export(GPKGExporter(output, engine='native').configure(precision=0.01), TARGET_EPSG)
+    coords = shapely.get_coordinates(pyogrio.read_dataframe(output, layer='bordo').geometry.values)
+    assert np.allclose(coords, np.round(coords, 2), rtol=0, atol=1e-6)
@@ -0,0 +1,53 @@
+import geopandas as gpd
+import numpy as np
+import pytest
+import shapely
+
+from cxf2gis.exporters.base import merge_layers
+from cxf2gis.exporters.projtools import parallel
+from cxf2gis.exporters.projtools.parallel import parallel_to_crs
+
+from conftest import INPUT_EPSG, TARGET_EPSG
+
+
+@pytest.fixture
+def always_parallel(monkeypatch):
+    # Anche i layer piccoli dei test passano dal pool di processi
+    monkeypatch.setattr(parallel, 'MIN_PARALLEL_COORDINATES', 0)
+
+
+def _layer(n=500):
+    rng = np.random.default_rng(0)
+    x = 1500000 + rng.uniform(0, 5000, n)
+    y = 5000000 + rng.uniform(0, 5000, n)
+    geoms = np.concatenate([shapely.box(x[:-2], y[:-2], x[:-2] + 10, y[:-2] + 10), [shapely.Point(x[-2], y[-2]), None]])
+    return gpd.GeoDataFrame({'codice': [str(i) for i in range(n)]}, geometry=geoms, crs=INPUT_EPSG)
+
+
+def test_parallel_to_crs_matches_to_crs(always_parallel):
+    gdf = _layer()
+    result = parallel_to_crs(gdf, TARGET_EPSG, max_workers=2, chunk_size=300)
+    expected = gdf.to_crs(TARGET_EPSG)
+    assert result.crs == expected.crs
+    assert result['codice'].tolist() == gdf['codice'].tolist()
+    assert result.geometry.iloc[-1] is None
+    assert shapely.equals_exact(result.geometry.values[:-1], expected.geometry.values[:-1], tolerance=1e-6).all()
+    # Il layer di ingresso resta nel CRS di origine
+    assert gdf.crs == INPUT_EPSG and gdf.geometry.iloc[0].bounds[0] > 1_000_000
+
+
+def test_parallel_to_crs_shortcuts():
+    gdf = _layer(10)
+    assert parallel_to_crs(gdf, INPUT_EPSG) is gdf
+    with pytest.raises(ValueError):
+        parallel_to_crs(gdf.set_crs(None, allow_override=True), TARGET_EPSG)
+
+
+def test_merge_layers_with_reproject_workers(project, always_parallel):
+    project.parse()
+    serial = dict(merge_layers(project.sources, TARGET_EPSG))
+    concurrent = dict(merge_layers(project.sources, TARGET_EPSG, reproject_workers=2))
+    assert serial.keys() == concurrent.keys()
+    for name, gdf in serial.items():
+        assert concurrent[name].crs == gdf.crs
+        assert shapely.equals_exact(concurrent[name].geometry.values, gdf.geometry.values, tolerance=1e-6).all()
@@ -0,0 +1,61 @@
+import os
+
+import pytest
+
+from cxf2gis.scheduler import MemoryScheduler, parse_memory
+
+
+class Source:
+    def __init__(self, file_path):
+        self.file_path = file_path
+
+
+@pytest.fixture
+def sources(tmp_path):
+    result = []
+    for name, size in [('a', 100), ('b', 400), ('c', 300), ('d', 200)]:
+        path = tmp_path / f"{name}.cxf"
+        path.write_bytes(b'x' * size)
+        result.append(Source(str(path)))
+    return result
+
+
+def test_parse_memory():
+    assert parse_memory('512M') == 512 * 1024 ** 2
+    assert parse_memory('4GB') == 4 * 1024 ** 3
+    assert parse_memory('1.5k') == 1536
+    assert parse_memory(1500000) == 1500000
+
+
+def _names(batches):
+    return [[os.path.basename(s.file_path)[0] for s in batch] for batch in batches]
+
+
+def test_batches_first_fit_decreasing(sources):
+    scheduler = MemoryScheduler(5000, bytes_per_byte=10)
+    # Stime: b 4000, c 3000, d 2000, a 1000
+    assert _names(scheduler.batches(sources)) == [['b', 'a'], ['c', 'd']]
+
+
+def test_batches_oversized_source_alone(sources, capsys):
+    scheduler = MemoryScheduler(2500, bytes_per_byte=10)
+    assert _names(scheduler.batches(sources)) == [['b'], ['c'], ['d'], ['a']]
+    assert 'b.cxf supera da solo il limite' in capsys.readouterr().out
+
+
+def test_batches_use_calibration(sources):
+    scheduler = MemoryScheduler(5000, bytes_per_byte=10)
+    batches = scheduler.batches(sources)
+    assert _names([next(batches)]) == [['b', 'a']]
+    # Dopo il primo lotto la stima si dimezza: le sorgenti rimaste stanno in un solo lotto
+    scheduler.bytes_per_byte = 5
+    assert _names(batches) == [['c', 'd']]
+
+
+def test_files_stat_once(sources, monkeypatch):
+    calls = []
+    getsize = os.path.getsize
+    monkeypatch.setattr(os.path, 'getsize', lambda path: calls.append(path) or getsize(path))
+    scheduler = MemoryScheduler(1000, bytes_per_byte=10)
+    list(scheduler.batches(sources))
+    assert sorted(calls) == sorted(s.file_path for s in sources)
@@ -0,0 +1,79 @@
+import json
+from http import HTTPStatus
+
+import pytest
+
+from cxf2gis.index import CXFIndex
+from cxf2gis.server import FeatureService
+
+from conftest import bordo
+
+
+@pytest.fixture
+def service():
+    index = CXFIndex({'bordo': bordo([('101', (0, 0, 10, 10)), ('102', (10, 0, 20, 10)), ('103', (20, 0, 30, 10))])})
+    return FeatureService(index, cache_size=8)
+
+
+def _get(service, target):
+    status, content_type, body = service.handle(target)
+    return status, json.loads(body)
+
+
+def test_ok(service):
+    status, body = _get(service, '/layers')
+    assert status == HTTPStatus.OK
+    assert body['bordo']['features'] == 3
+
+    status, body = _get(service, '/parcel?comune=C660&foglio=1&codice=102')
+    assert status == HTTPStatus.OK
+    assert [f['properties']['codice'] for f in body['features']] == ['102']
+
+    status, body = _get(service, '/bbox?bbox=5,5,15,6&limit=1')
+    assert status == HTTPStatus.OK and len(body['features']) == 1
+
+    status, body = _get(service, '/point?x=25&y=5&format=wkb')
+    assert status == HTTPStatus.OK
+    assert [f['properties']['codice'] for f in body['features']] == ['103']
+
+
+@pytest.mark.parametrize('target', [
+    '/parcel?comune=C660&foglio=1',            # Parametro obbligatorio mancante
+    '/bbox?bbox=1,2,3',                         # bbox incompleto
+    '/bbox?bbox=0,0,10,10&limit=-1',            # limit negativo
+    '/bbox?bbox=0,0,10,10&limit=dieci',
+    '/point?x=a&y=1',
+    '/parcel?comune=C660&foglio=1&codice=101&format=csv',
+])
+def test_bad_request(service, target):
+    status, body = _get(service, target)
+    assert status == HTTPStatus.BAD_REQUEST
+    assert body['errore']
+
+
+@pytest.mark.parametrize('target', ['/particelle', '/bbox?bbox=0,0,10,10&layer=testo'])
+def test_not_found(service, target):
+    assert _get(service, target)[0] == HTTPStatus.NOT_FOUND
+
+
+def test_internal_error(service, monkeypatch, capsys):
+    def broken(*args, **kwargs):
+        raise RuntimeError("indice danneggiato")
+
+    monkeypatch.setattr(service.index, 'in_bbox', broken)
+    status, body = _get(service, '/bbox?bbox=0,0,10,10')
+    assert status == HTTPStatus.INTERNAL_SERVER_ERROR
+    assert 'indice danneggiato' in body['errore']
+    assert 'indice danneggiato' in capsys.readouterr().err
+
+
+def test_metrics_and_cache(service):
+    for _ in range(3):
+        service.handle('/parcel?codice=101&foglio=1&comune=C660')
+    service.handle('/parcel?comune=C660&foglio=1&codice=101')
+    service.handle('/sconosciuto')
+    status, body = _get(service, '/metrics')
+    assert status == HTTPStatus.OK
+    assert body['cache']['hits'] == 3 and body['cache']['misses'] == 1
+    assert body['endpoints']['/parcel']['richieste'] == 4
+    assert body['endpoints']['*']['errori'] == 1
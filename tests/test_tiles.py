@@ -0,0 +1,85 @@
+import gzip
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import shapely
+
+from cxf2gis.exporters.tiles.base import WEB_MERCATOR, VectorTilesExporter, bounded_map, tile_bounds, tile_range
+
+mapbox_vector_tile = pytest.importorskip("mapbox_vector_tile")
+
+ZOOMS = dict(min_zoom=14, max_zoom=15, max_workers=1)
+
+
+def test_tile_range_covers_tile_bounds():
+    minx, miny, maxx, maxy = tile_bounds(15, 17000, 11000)
+    assert maxx - minx == pytest.approx(maxy - miny)
+    # Un bbox interno alla tile ricade solo in quella tile
+    inner = (minx + 1, miny + 1, maxx - 1, maxy - 1)
+    assert tile_range(inner, 15) == (17000, 17000, 11000, 11000)
+    assert tile_range(inner, 14) == (8500, 8500, 5500, 5500)
+
+
+def test_bounded_map_keeps_order_and_bounds_pending():
+    submitted = []
+
+    def tasks():
+        for i in range(20):
+            submitted.append(i)
+            yield i
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        results = bounded_map(pool, lambda chunk: [i * 10 for i in chunk], tasks(), max_pending=2, chunk_size=3)
+        assert next(results) == 0
+        # Al primo risultato sono stati generati solo i due blocchi in attesa
+        assert len(submitted) == 2 * 3
+        assert [0, *results] == [i * 10 for i in range(20)]
+
+
+def _decode(data):
+    return mapbox_vector_tile.decode(gzip.decompress(data))
+
+
+def test_mbtiles_export(project, tmp_path):
+    output = tmp_path / "catasto.mbtiles"
+    project.parse()
+    VectorTilesExporter(output, **ZOOMS).export(project)
+    extent = shapely.box(*project.index.layers['bordo'].to_crs(WEB_MERCATOR).total_bounds)
+
+    conn = sqlite3.connect(output)
+    try:
+        metadata = dict(conn.execute("SELECT name, value FROM metadata"))
+        tiles = conn.execute("SELECT zoom_level, tile_column, tile_row, tile_data FROM tiles").fetchall()
+    finally:
+        conn.close()
+    assert metadata['format'] == 'pbf' and metadata['minzoom'] == '14' and metadata['maxzoom'] == '15'
+    assert {z for z, *_ in tiles} == {14, 15}
+
+    # Tutte le particelle compaiono in almeno una tile; le righe sono in schema TMS
+    codici = set()
+    for z, x, row, data in tiles:
+        layers = _decode(data)
+        assert set(layers) <= {'particelle', 'fabbricati', 'testo', 'linee'}
+        if z == 15 and 'particelle' in layers:
+            codici |= {f['properties']['codice'] for f in layers['particelle']['features']}
+        # Riga TMS: la tile XYZ corrispondente interseca i dati
+        assert shapely.box(*tile_bounds(z, x, 2 ** z - 1 - row)).intersects(extent)
+    assert codici == {str(k) for k in range(1, 26)}
+
+
+def test_pmtiles_export(project, tmp_path):
+    reader = pytest.importorskip("pmtiles.reader")
+    output = tmp_path / "catasto.pmtiles"
+    project.parse()
+    VectorTilesExporter(output, **ZOOMS).export(project)
+
+    with open(output, 'rb') as f:
+        source = reader.MmapSource(f)
+        header = reader.Reader(source).header()
+        tiles = list(reader.all_tiles(source))
+    # Tile scritte in ordine di tile id: archivio clusterizzato
+    assert header['clustered'] is True
+    assert header['min_zoom'] == 14 and header['max_zoom'] == 15
+    assert len(tiles) == header['addressed_tiles_count'] > 0
+    assert all(_decode(data) for _, data in tiles)
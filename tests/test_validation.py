@@ -0,0 +1,70 @@
+import geopandas as gpd
+import numpy as np
+import shapely
+
+from cxf2gis.validation import validate_layer, validate_layers
+
+from conftest import INPUT_EPSG, bordo
+
+# Poligono "a farfalla": anello autointersecante, valido solo come MultiPolygon di due triangoli
+BOWTIE = shapely.Polygon([(0, 0), (10, 10), (10, 0), (0, 10), (0, 0)])
+
+
+def _with_bowtie(area_grafica):
+    gdf = bordo([('101', (20, 0, 30, 10)), ('102', (0, 0, 1, 1)), ('103', (0, 0, 1, 1))])
+    gdf.loc[1, 'geometry'] = BOWTIE
+    gdf.loc[2, 'geometry'] = BOWTIE
+    gdf['area_grafica'] = area_grafica
+    return gdf
+
+
+def test_validate_layer_repairs_and_reports():
+    gdf = _with_bowtie([100.0, 0.0, np.nan])
+    fixed, report, n_fixed = validate_layer(gdf, 'BORDO')
+
+    assert n_fixed == 2
+    assert shapely.is_valid(fixed.geometry.values).all()
+    assert fixed.geometry.iloc[1].geom_type == 'MultiPolygon'
+    assert fixed.geometry.iloc[1].area == 50
+    # Area grafica ricalcolata solo dove era valorizzata (NaN: nessuna corrispondenza nel SUP)
+    assert fixed['area_grafica'].iloc[:2].tolist() == [100.0, 50.0]
+    assert np.isnan(fixed['area_grafica'].iloc[2])
+
+    assert report['codice'].tolist() == ['102', '103']
+    assert report['riparata'].tolist() == [True, True]
+    assert report['layer'].unique().tolist() == ['bordo']
+    assert report['motivo'].str.startswith('Self-intersection').all()
+    # Il report conserva le geometrie originali; il layer di ingresso non viene modificato
+    assert report.geometry.iloc[0].equals(BOWTIE)
+    assert gdf.geometry.iloc[1].equals(BOWTIE)
+
+
+def test_validate_layer_keeps_polygonal_parts():
+    # Anello con uno "spike": make_valid restituisce poligono più linea, il BORDO resta poligonale
+    spike = shapely.Polygon([(0, 0), (10, 0), (10, 10), (10, 20), (10, 10), (0, 10), (0, 0)])
+    gdf = bordo([('101', (0, 0, 1, 1))])
+    gdf.loc[0, 'geometry'] = spike
+    fixed, report, _ = validate_layer(gdf, 'BORDO')
+    assert fixed.geometry.iloc[0].geom_type in ('Polygon', 'MultiPolygon')
+    assert fixed.geometry.iloc[0].area == 100
+
+
+def test_validate_layer_without_invalid_geometries():
+    gdf = bordo([('101', (0, 0, 10, 10))])
+    fixed, report, n_fixed = validate_layer(gdf, 'BORDO')
+    assert fixed is gdf and report is None and n_fixed == 0
+
+
+def test_validate_layers():
+    testo = gpd.GeoDataFrame({'testo': ['101']}, geometry=shapely.points([(5, 5)]), crs=INPUT_EPSG)
+    layers, report, stats = validate_layers({'BORDO': _with_bowtie([1.0, 1.0, 1.0]), 'TESTO': testo, 'LINEA': None})
+    assert stats == {'geometrie_invalide': 2, 'geometrie_riparate': 2}
+    assert len(report) == 2
+    assert layers['TESTO'] is testo and layers['LINEA'] is None
+
+
+def test_project_validate_geometries(project):
+    project.parse()
+    stats = project.validate_geometries(max_workers=1)
+    assert stats['geometrie_invalide'] == 0
+    assert all(source.invalid_geometries is None for source in project.sources)